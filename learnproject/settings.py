@@ -16,6 +16,7 @@ from pathlib import Path
 from dotenv import load_dotenv
 import requests
 import dj_database_url 
+from celery.schedules import crontab
 
 
 # Base directory of your Django project
@@ -30,6 +31,11 @@ else:
     print(f"⚠️ .env not found at: {dotenv_path}")
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
+
+# Public base URL encoded in certificate QR codes (verification endpoint)
+CERTIFICATE_VERIFY_BASE_URL = os.getenv("CERTIFICATE_VERIFY_BASE_URL", "http://localhost:8000")
+# Processes used to rasterise certificate PDFs (1 = render inline)
+CERTIFICATE_RENDER_WORKERS = int(os.getenv("CERTIFICATE_RENDER_WORKERS", os.cpu_count() or 1))
 print("✅ Loaded YouTube API Key:", bool(YOUTUBE_API_KEY))
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -221,6 +227,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 RAZOR_KEY_ID = "rzp_test_X5OfG2jiWrAzSj"
 RAZOR_KEY_SECRET = "SsCovWWZSwB1TGd1rSoIiwF3"
+# Dotted path of the Razorpay client class (myapp.utils.payments.FakeRazorpayClient offline)
+RAZORPAY_CLIENT_CLASS = os.getenv("RAZORPAY_CLIENT_CLASS", "razorpay.Client")
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET", "")
 
 
 ZOOM_ACCOUNT_ID = os.getenv("ZOOM_ACCOUNT_ID")
@@ -245,4 +254,42 @@ CHANNEL_LAYERS = {
 }
 
 
+# Shared cache (catalog pages, versions). Redis when REDIS_URL is set so every
+# worker sees the same invalidations; per-process memory otherwise.
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+
 CELERY_WORKER_POOL = "solo"
+
+CELERY_BEAT_SCHEDULE = {
+    "rollup-course-analytics": {
+        "task": "myapp.tasks.rollup_course_analytics",
+        "schedule": crontab(hour=2, minute=30),
+    },
+    "sweep-expired-enrollments": {
+        "task": "myapp.tasks.sweep_expired_enrollments",
+        "schedule": crontab(minute="*/15"),
+    },
+    "reconcile-pending-payments": {
+        "task": "myapp.tasks.reconcile_pending_payments",
+        "schedule": crontab(minute="*/10"),
+    },
+    "relay-outbox": {  # safety net; the relay_outbox command is the main publisher
+        "task": "myapp.tasks.relay_outbox",
+        "schedule": crontab(),
+    },
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Course, Enrollment, DailyTask, TaskSubmission, Offer, Feedback, Payment, Certificate, Profile,Module,Lesson
+from .models import User, Course, CourseAnalytics, CourseStats, Enrollment, DailyTask, TaskSubmission, Offer, Feedback, Payment, PaymentWebhookEvent, OutboxEvent, Certificate, Profile,Module,Lesson
 
 
 @admin.register(User)
@@ -18,12 +18,16 @@ class UserAdmin(admin.ModelAdmin):
     approve_instructors.short_description = "Approve selected instructors"
 
 admin.site.register(Course)
+admin.site.register(CourseStats)
+admin.site.register(CourseAnalytics)
 admin.site.register(Enrollment)
 admin.site.register(DailyTask)
 admin.site.register(TaskSubmission)
 admin.site.register(Offer)
 admin.site.register(Feedback)
 admin.site.register(Payment)
+admin.site.register(PaymentWebhookEvent)
+admin.site.register(OutboxEvent)
 admin.site.register(Certificate)
 admin.site.register(Profile)
 admin.site.register(Module)
@@ -0,0 +1,81 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from myapp.utils.images import IMAGE_TARGETS, needs_variants, process_image, refresh_cached_documents
+
+
+def _init_worker():
+    # Under "spawn" the child starts blank; under "fork" it must not reuse
+    # the parent's database connections.
+    import django
+
+    django.setup()
+    connections.close_all()
+
+
+def _process(job):
+    target, pk = job
+    try:
+        return target, pk, process_image(target, pk, refresh=False), None
+    except Exception as exc:  # one corrupt upload must not stop the backfill
+        return target, pk, False, f"{type(exc).__name__}: {exc}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate thumb/card/hero WebP+JPEG variants for existing course images and "
+        "profile pictures that have none (or outdated ones), in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=sorted(IMAGE_TARGETS), action="append",
+                            help="Limit to course or user images (repeatable; default: both)")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Worker processes (1 = run inline)")
+
+    def pending_jobs(self, targets):
+        for target in targets:
+            model_label, image_field, variants_field = IMAGE_TARGETS[target]
+            model = apps.get_model(model_label)
+            rows = model.objects.exclude(**{image_field: ""}).exclude(**{f"{image_field}__isnull": True})
+            for obj in rows.only(image_field, variants_field).iterator():
+                if needs_variants(getattr(obj, image_field), getattr(obj, variants_field)):
+                    yield target, obj.pk
+
+    def handle(self, *args, **options):
+        targets = options["target"] or sorted(IMAGE_TARGETS)
+        jobs = list(self.pending_jobs(targets))
+        if not jobs:
+            self.stdout.write("All images already have variants.")
+            return
+
+        if options["workers"] <= 1:
+            results = map(_process, jobs)
+        else:
+            connections.close_all()  # never hand an open connection to forked children
+            pool = ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker)
+            results = (future.result() for future in as_completed([pool.submit(_process, job) for job in jobs]))
+
+        done = {target: [] for target in targets}
+        failed = 0
+        try:
+            for target, pk, written, error in results:
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{target} {pk}: {error}")
+                elif written:
+                    done[target].append(pk)
+        finally:
+            if options["workers"] > 1:
+                pool.shutdown()
+
+        for target, pks in done.items():
+            if pks:
+                refresh_cached_documents(target, pks)
+
+        written = sum(len(pks) for pks in done.values())
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {written} image(s), {failed} failed."))
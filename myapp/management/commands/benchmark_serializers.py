@@ -0,0 +1,87 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from myapp.models import Course, Enrollment, User
+from myapp.serializers import CourseSerializer, EnrollmentSerializer
+from myapp.utils.offers import OfferContext
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare payload size, serialization time and query count for the course catalog "
+        "and enrollment list with and without ?fields=. Synthetic rows are rolled back."
+    )
+
+    variants = {
+        "catalog": [
+            ("full", ""),
+            ("mobile list", "fields=id,title,image,price"),
+            ("omit offers", "omit=has_offer,discount_price,offer_expires,description"),
+        ],
+        "enrollments": [
+            ("full", ""),
+            ("course summary", "fields=id,progress,course.id,course.title,course.image"),
+            ("no course", "omit=course"),
+        ],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options["courses"], options["repeat"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _run(self, course_count, repeat):
+        student = User.objects.create_user(username="__bench_student__", password="x")
+        Course.objects.bulk_create(
+            Course(title=f"Bench course {i}", description="lorem ipsum " * 60, price=Decimal("999.00"))
+            for i in range(course_count)
+        )
+        courses = Course.objects.filter(title__startswith="Bench course ").select_related("instructor", "stats")
+        Enrollment.objects.bulk_create(Enrollment(student=student, course=c) for c in courses)
+        enrollments = Enrollment.objects.filter(student=student).select_related(
+            "student", "course", "course__instructor", "course__stats"
+        )
+
+        targets = {
+            "catalog": (CourseSerializer, courses),
+            "enrollments": (EnrollmentSerializer, enrollments),
+        }
+        factory = APIRequestFactory()
+
+        self.stdout.write(f"{'list':<12} {'variant':<16} {'bytes':>10} {'ms/run':>9} {'queries':>8}")
+        for name, (serializer_class, queryset) in targets.items():
+            rows = list(queryset)
+            for label, query in self.variants[name]:
+                timings, size, queries = [], 0, 0
+                for _ in range(repeat):
+                    request = Request(factory.get(f"/?{query}"))
+                    request.user = student
+                    context = {"request": request, "offer_context": OfferContext.for_request(request)}
+
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = time.perf_counter()
+                        data = serializer_class(rows, many=True, context=context).data
+                        timings.append(time.perf_counter() - started)
+                    size = len(JSONRenderer().render(data))
+                    queries = len(ctx.captured_queries)
+
+                best_ms = min(timings) * 1000
+                self.stdout.write(f"{name:<12} {label:<16} {size:>10,} {best_ms:>9.2f} {queries:>8}")
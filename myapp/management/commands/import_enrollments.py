@@ -0,0 +1,70 @@
+import csv
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utils.bulk_import import ERROR, IMPORT_CHUNK_SIZE, EnrollmentImporter
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream a CSV of students (username,email[,password,first_name,last_name,course_id]) "
+        "into users + enrollments in chunks, hashing passwords in a process pool and queueing "
+        "welcome emails per chunk. Prints per-row errors and running totals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument("--course", type=int, help="Course for rows without a course_id column")
+        parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Password-hashing processes (1 = hash inline)")
+        parser.add_argument("--no-email", action="store_true", help="Don't queue welcome emails")
+
+    def handle(self, *args, **options):
+        pool = None
+        hash_passwords = None
+        if options["workers"] > 1:
+            pool = ProcessPoolExecutor(max_workers=options["workers"], initializer=_init_worker)
+            workers = options["workers"]
+
+            def hash_passwords(raws):
+                return pool.map(make_password, raws, chunksize=max(1, len(raws) // (workers * 4)))
+
+        importer = EnrollmentImporter(
+            course_id=options["course"],
+            chunk_size=options["chunk_size"],
+            hash_passwords=hash_passwords,
+            send_emails=not options["no_email"],
+        )
+
+        totals = Counter()
+        try:
+            with open(options["csv_path"], newline="", encoding="utf-8-sig") as handle:
+                for result in importer.run(csv.DictReader(handle)):
+                    totals[result["status"]] += 1
+                    if result["status"] == ERROR:
+                        self.stderr.write(f"line {result['line']} ({result['username']}): {result['detail']}")
+                    processed = sum(totals.values())
+                    if processed % options["chunk_size"] == 0:
+                        self.stdout.write(f"{processed} rows processed: {self._summary(totals)}")
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Done, {sum(totals.values())} rows: {self._summary(totals)}"))
+
+    @staticmethod
+    def _summary(totals):
+        return ", ".join(f"{count} {status.replace('_', ' ')}" for status, count in sorted(totals.items()))
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils.bulk_import import chunked
+from myapp.utils.certificates import (
+    completed_without_certificate, issue_certificates, pending_certificates, render_certificates, render_map,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Issue certificates for enrollments that already reached 100% and render every "
+        "certificate still missing its PDF, rasterising in a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", type=int, help="Limit to one course")
+        parser.add_argument("--chunk-size", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=settings.CERTIFICATE_RENDER_WORKERS,
+                            help="Rendering processes (1 = render inline)")
+
+    def handle(self, *args, **options):
+        course_id, chunk_size = options["course"], options["chunk_size"]
+
+        completed = completed_without_certificate(course_id).values_list("student_id", "course_id")
+        issued = 0
+        for pairs in chunked(completed.iterator(), chunk_size):
+            created, _ = issue_certificates(pairs)
+            issued += created
+        self.stdout.write(f"{issued} certificate(s) issued.")
+
+        pending = pending_certificates()
+        if course_id is not None:
+            pending = pending.filter(course_id=course_id)
+        pks = list(pending.order_by("pk").values_list("pk", flat=True))
+
+        # Rendering needs no database: workers only turn contexts into PDF bytes
+        rendered, failed = 0, 0
+        with render_map(options["workers"], jobs=len(pks)) as map_fn:
+            for chunk in chunked(pks, chunk_size):
+                done, errors = render_certificates(chunk, map_fn=map_fn)
+                rendered += done
+                failed += len(errors)
+                for certificate_id, error in errors:
+                    self.stderr.write(f"{certificate_id}: {error}")
+                self.stdout.write(f"{rendered}/{len(pks)} PDF(s) rendered")
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} certificate PDF(s), {failed} failed."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from myapp.utils.course_stats import rebuild_course_stats
+from myapp.utils.progress import rebuild_progress_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute CourseStats counters (enrollments, reviews, rating histogram, lesson/task totals) "
+        "and per-enrollment progress counters from the source tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_ids", nargs="*", type=int, help="Only these courses (default: all)")
+
+    def handle(self, *args, **options):
+        course_ids = options["course_ids"] or None
+        count = rebuild_course_stats(course_ids)
+        enrollments = rebuild_progress_counters(course_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {count} course(s) and progress for {enrollments} enrollment(s)."
+        ))
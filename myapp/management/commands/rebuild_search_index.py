@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myapp.search import memory_index, refresh_search_vectors, uses_postgres
+
+
+class Command(BaseCommand):
+    help = "Recompute Course.search_vector for every course (PostgreSQL) or reset the in-process index."
+
+    def handle(self, *args, **options):
+        if uses_postgres():
+            refresh_search_vectors()
+            self.stdout.write(self.style.SUCCESS("Course search vectors rebuilt."))
+        else:
+            memory_index.version = None
+            memory_index.ensure_current()
+            self.stdout.write(self.style.SUCCESS(f"In-process index rebuilt ({len(memory_index.terms)} terms)."))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapp.utils.outbox import OUTBOX_BATCH_SIZE, relay_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish committed outbox events (payment succeeded, enrollment created, task assigned, ...) "
+        "to Celery in batches. Runs continuously unless --once is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument("--interval", type=float, default=1.0,
+                            help="Seconds to sleep when the outbox is empty")
+        parser.add_argument("--once", action="store_true", help="Drain the outbox once and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            published, failed = relay_outbox(batch_size=options["batch_size"])
+            if published or failed:
+                self.stdout.write(f"{published} event(s) published, {failed} failed.")
+            if options["once"]:
+                break
+            if not published:
+                time.sleep(options["interval"])
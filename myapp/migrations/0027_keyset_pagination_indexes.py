@@ -0,0 +1,41 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0026_message_is_read'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-created_at', '-id'], name='course_created_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', '-enrolled_on', '-id'], name='enroll_student_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', '-enrolled_on', '-id'], name='enroll_course_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['course', '-created_at', '-id'], name='feedback_course_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='tasksubmission',
+            index=models.Index(fields=['student', '-submitted_on', '-id'], name='submission_student_keyset'),
+        ),
+        migrations.AddIndex(
+            model_name='tasksubmission',
+            index=models.Index(fields=['task', '-submitted_on', '-id'], name='submission_task_keyset'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:09
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return  # SQLite uses the in-process index in myapp.search
+
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS course_search_vector_gin "
+        "ON myapp_course USING GIN (search_vector)"
+    )
+    schema_editor.execute(
+        """
+        UPDATE myapp_course c SET search_vector =
+            setweight(to_tsvector('simple', coalesce(c.title, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(u.username, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(c.description, '')), 'C')
+        FROM myapp_course c2 LEFT JOIN myapp_user u ON u.id = c2.instructor_id
+        WHERE c2.id = c.id
+        """
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS course_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0027_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
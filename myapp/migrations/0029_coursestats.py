@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_course_stats(apps, schema_editor):
+    Course = apps.get_model('myapp', 'Course')
+    CourseStats = apps.get_model('myapp', 'CourseStats')
+    Enrollment = apps.get_model('myapp', 'Enrollment')
+    Feedback = apps.get_model('myapp', 'Feedback')
+
+    rows = {pk: CourseStats(course_id=pk) for pk in Course.objects.values_list('pk', flat=True)}
+    for course_id, in Enrollment.objects.values_list('course_id'):
+        rows[course_id].enrollment_count += 1
+    for course_id, rating in Feedback.objects.values_list('course_id', 'rating'):
+        stats = rows[course_id]
+        stats.review_count += 1
+        stats.rating_sum += rating or 0
+        bucket = min(max(rating or 0, 1), 5)
+        setattr(stats, f'rating_{bucket}', getattr(stats, f'rating_{bucket}') + 1)
+    CourseStats.objects.bulk_create(rows.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0028_course_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseStats',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='myapp.course')),
+                ('enrollment_count', models.IntegerField(default=0)),
+                ('review_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_1', models.IntegerField(default=0)),
+                ('rating_2', models.IntegerField(default=0)),
+                ('rating_3', models.IntegerField(default=0)),
+                ('rating_4', models.IntegerField(default=0)),
+                ('rating_5', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_course_stats, migrations.RunPython.noop),
+    ]
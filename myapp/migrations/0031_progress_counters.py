@@ -0,0 +1,84 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:20
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def backfill_progress_counters(apps, schema_editor):
+    CourseStats = apps.get_model('myapp', 'CourseStats')
+    DailyTask = apps.get_model('myapp', 'DailyTask')
+    Enrollment = apps.get_model('myapp', 'Enrollment')
+    Lesson = apps.get_model('myapp', 'Lesson')
+    LessonCompletion = apps.get_model('myapp', 'LessonCompletion')
+    TaskSubmission = apps.get_model('myapp', 'TaskSubmission')
+
+    # a lesson's course is its own course, else its module's course
+    lesson_course = {
+        pk: course_id or module_course_id
+        for pk, course_id, module_course_id in Lesson.objects.values_list('pk', 'course_id', 'module__course_id')
+    }
+    lessons_per_course = Counter(c for c in lesson_course.values() if c)
+    tasks_per_course = Counter(DailyTask.objects.values_list('course_id', flat=True))
+    for stats in CourseStats.objects.all():
+        stats.lesson_count = lessons_per_course[stats.course_id]
+        stats.task_count = tasks_per_course[stats.course_id]
+        stats.save(update_fields=['lesson_count', 'task_count'])
+
+    completed = Counter(
+        (student_id, lesson_course.get(lesson_id))
+        for student_id, lesson_id in LessonCompletion.objects.values_list('student_id', 'lesson_id')
+    )
+    graded = Counter(
+        (student_id, course_id, status)
+        for student_id, course_id, status in TaskSubmission.objects.values_list('student_id', 'task__course_id', 'status')
+    )
+
+    enrollments = list(Enrollment.objects.all())
+    for e in enrollments:
+        e.completed_lessons = completed[(e.student_id, e.course_id)]
+        e.approved_tasks = graded[(e.student_id, e.course_id, 'approved')]
+        e.rejected_tasks = graded[(e.student_id, e.course_id, 'rejected')]
+        lesson_total, task_total = lessons_per_course[e.course_id], tasks_per_course[e.course_id]
+        lesson_pct = e.completed_lessons * 100 / lesson_total if lesson_total else 0
+        task_pct = e.approved_tasks * 100 / task_total if task_total else 0
+        e.progress = round(min((lesson_pct + task_pct) / 2, 100), 2)
+    Enrollment.objects.bulk_update(
+        enrollments, ['completed_lessons', 'approved_tasks', 'rejected_tasks', 'progress'], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0030_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursestats',
+            name='lesson_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='coursestats',
+            name='task_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='approved_tasks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_lessons',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='rejected_tasks',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
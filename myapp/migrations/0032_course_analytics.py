@@ -0,0 +1,25 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0031_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseAnalytics',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='analytics', serialize=False, to='myapp.course')),
+                ('enrollment_count', models.IntegerField(default=0)),
+                ('progress_histogram', models.JSONField(default=list)),
+                ('module_funnel', models.JSONField(default=list)),
+                ('task_stats', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
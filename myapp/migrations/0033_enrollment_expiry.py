@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0032_course_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='is_expired',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notif_type',
+            field=models.CharField(choices=[('task', 'Task'), ('live', 'Live Class'), ('expiry', 'Course Expiry'), ('generic', 'Generic')], default='generic', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(condition=models.Q(('is_expired', False)), fields=['expires_on'], name='enroll_expiry_pending'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0033_enrollment_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lessoncompletion',
+            name='completed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
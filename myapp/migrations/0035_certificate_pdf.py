@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0034_lesson_completion_client_time'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='pdf',
+            field=models.FileField(blank=True, null=True, upload_to='certificates/'),
+        ),
+        migrations.AddConstraint(
+            model_name='certificate',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='certificate_once_per_course'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 13:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('myapp', '0038_outbox_event'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_approved', True), ('role', 'instructor')), fields=['-date_joined', '-id'], name='instructor_joined_keyset'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 import uuid
 from django.utils import timezone
@@ -24,6 +25,18 @@ class User(AbstractUser):
     qualification = models.CharField(max_length=200, blank=True, null=True)
     is_approved = models.BooleanField(default=False)  # Admin approval
 
+    # Resized WebP/JPEG renditions of profile_picture (myapp.utils.images)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # keyset pagination of the instructor directory: (date_joined, id) newest first
+            models.Index(
+                fields=['-date_joined', '-id'], condition=models.Q(role='instructor', is_approved=True),
+                name='instructor_joined_keyset',
+            ),
+        ]
+
     def __str__(self):
         status = "✅" if self.is_approved else "⏳"
         return f"{self.username} ({self.role}) {status}"
@@ -56,6 +69,19 @@ class Course(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Weighted title/instructor/description tsvector, kept in sync by
+    # myapp.search (GIN index created in migration 0028, PostgreSQL only)
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    # thumb/card/hero renditions of image, written by the image pipeline
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # keyset pagination: (created_at, id) newest first
+            models.Index(fields=['-created_at', '-id'], name='course_created_keyset'),
+        ]
+
     @property
     def enrolled_students(self):
         return [enrollment.student for enrollment in self.enrollments.all()]
@@ -64,42 +90,62 @@ class Course(models.Model):
         return self.title
     
     def get_final_price(self, user=None):
-        from myapp.models import Enrollment
-        from django.utils import timezone
-        from datetime import timedelta
-        from decimal import Decimal
-
-        # If no user → no offer
-        if not user or not user.is_authenticated:
-            return self.price
-
-        # If user already enrolled in THIS course → no offer
-        if Enrollment.objects.filter(student=user, course=self).exists():
-            return self.price
+        from myapp.utils.offers import OfferContext
+
+        # ✅ One pricing path (myapp.utils.offers): 7-day first-enrollment
+        # discount or the active site-wide Offer, whichever is larger, in Decimal
+        return OfferContext(user).final_price(self)
+
+
+
+class CourseStats(models.Model):
+    """
+    Denormalized per-course counters, maintained with F() updates by the
+    Enrollment/Feedback/Lesson/DailyTask signals (see myapp.utils.course_stats
+    and myapp.utils.progress) and rebuilt from scratch by
+    `manage.py rebuild_course_stats`.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    enrollment_count = models.IntegerField(default=0)
+    review_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    lesson_count = models.IntegerField(default=0)
+    task_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
-        # Get user's first-ever enrollment date
-        first_enrolled = (
-            Enrollment.objects
-            .filter(student=user)
-            .order_by('enrolled_on')
-            .values_list('enrolled_on', flat=True)
-            .first()
-        )
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return 0
+        return round(self.rating_sum / self.review_count, 2)
 
-        # If user has no previous enrollments → no offer
-        if not first_enrolled:
-            return self.price
+    @property
+    def histogram(self):
+        return {str(star): getattr(self, f"rating_{star}") for star in range(1, 6)}
 
-        # Offer valid for 7 days
-        offer_end = first_enrolled + timedelta(days=7)
+    def __str__(self):
+        return f"Stats - {self.course.title}"
 
-        if timezone.now() <= offer_end:
-            # Apply 20% discount
-            discounted = self.price * Decimal("0.80")
-            return discounted.quantize(Decimal("0.01"))
 
-        return self.price
+class CourseAnalytics(models.Model):
+    """
+    Cohort rollup for the instructor analytics endpoint, recomputed nightly
+    and on demand by myapp.utils.analytics (never on read).
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='analytics')
+    enrollment_count = models.IntegerField(default=0)
+    progress_histogram = models.JSONField(default=list)  # [{"from": 0, "to": 10, "students": n}, ...]
+    module_funnel = models.JSONField(default=list)
+    task_stats = models.JSONField(default=dict)
+    computed_at = models.DateTimeField(auto_now=True)
 
+    def __str__(self):
+        return f"Analytics - {self.course.title}"
 
 
 class Enrollment(models.Model):
@@ -107,10 +153,23 @@ class Enrollment(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='enrollments')
     enrolled_on = models.DateTimeField(auto_now_add=True)
     expires_on = models.DateTimeField(null=True, blank=True)
+    is_expired = models.BooleanField(default=False)  # set by the expiry sweeper
     progress = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
 
+    # Incremental progress counters (myapp.utils.progress); `progress` is
+    # rewritten from these whenever they or the course totals change.
+    completed_lessons = models.IntegerField(default=0)
+    approved_tasks = models.IntegerField(default=0)
+    rejected_tasks = models.IntegerField(default=0)
+
     class Meta:
         unique_together = ('student', 'course')
+        indexes = [
+            models.Index(fields=['student', '-enrolled_on', '-id'], name='enroll_student_keyset'),
+            models.Index(fields=['course', '-enrolled_on', '-id'], name='enroll_course_keyset'),
+            # only rows the sweeper still has to visit
+            models.Index(fields=['expires_on'], name='enroll_expiry_pending', condition=models.Q(is_expired=False)),
+        ]
 
     def __str__(self):
         return f"{self.student.username} → {self.course.title}"
@@ -143,6 +202,12 @@ class TaskSubmission(models.Model):
     # keep history / allow resubmission: link to previous submission
     previous_submission = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='resubmissions')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', '-submitted_on', '-id'], name='submission_student_keyset'),
+            models.Index(fields=['task', '-submitted_on', '-id'], name='submission_task_keyset'),
+        ]
+
     def __str__(self):
         return f"{self.student.username} - {self.task.title} ({self.status})"
 
@@ -164,6 +229,11 @@ class Feedback(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', '-created_at', '-id'], name='feedback_course_keyset'),
+        ]
+
     def __str__(self):
         return f"{self.student.username} → {self.course.title}"
 
@@ -172,7 +242,7 @@ class Payment(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=8, decimal_places=2)
-    order_id = models.CharField(max_length=100, null=True, blank=True)  # Razorpay order_id
+    order_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)  # Razorpay order_id
     payment_id = models.CharField(max_length=100, null=True, blank=True)  # Razorpay payment_id
     transaction_id = models.CharField(max_length=100, unique=True, default=uuid.uuid4)
     status = models.CharField(
@@ -181,12 +251,68 @@ class Payment(models.Model):
         default="pending"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # (student, course, amount, claim time) hash, sent as the order receipt — see myapp.utils.payments
+    idempotency_key = models.CharField(max_length=40, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(status='pending'), name='payment_pending_created'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.course.title} ({self.status})"
 
 
 
+class PaymentWebhookEvent(models.Model):
+    """
+    A Razorpay webhook delivery, stored verbatim on receipt and processed
+    asynchronously by myapp.utils.payments.process_webhook_event.
+    """
+    STATUS_CHOICES = [
+        ("received", "Received"),
+        ("processed", "Processed"),
+        ("duplicate", "Duplicate"),
+        ("ignored", "Ignored"),
+        ("failed", "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)  # X-Razorpay-Event-Id
+    event = models.CharField(max_length=50)
+    order_id = models.CharField(max_length=100, blank=True, default="")
+    payment_id = models.CharField(max_length=100, blank=True, default="", db_index=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="received")
+    error = models.TextField(blank=True, default="")
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event} {self.payment_id or self.order_id} ({self.status})"
+
+
+class OutboxEvent(models.Model):
+    """
+    A side effect recorded in the same transaction as the change that
+    caused it; myapp.utils.outbox.relay_outbox hands it to Celery after
+    commit.
+    """
+    topic = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(published_at__isnull=True), name='outbox_unpublished'),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk} ({'published' if self.published_at else 'pending'})"
+
+
 class Certificate(models.Model):
     student = models.ForeignKey(
         User,
@@ -196,6 +322,13 @@ class Certificate(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     issue_date = models.DateField(auto_now_add=True)
     certificate_id = models.CharField(max_length=50, unique=True)
+    # Rendered by myapp.utils.certificates once the enrollment reaches 100%
+    pdf = models.FileField(upload_to='certificates/', null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='certificate_once_per_course'),
+        ]
 
     def __str__(self):
         return f"Certificate - {self.student.username} - {self.course.title}"
@@ -312,6 +445,7 @@ class Notification(models.Model):
     NOTIF_TYPES = [
         ('task', 'Task'),
         ('live', 'Live Class'),
+        ('expiry', 'Course Expiry'),
         ('generic', 'Generic'),
     ]
     recipient = models.ForeignKey(User, related_name='notifications', on_delete=models.CASCADE)
@@ -325,13 +459,16 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_keyset'),
+        ]
 
 
 
 class LessonCompletion(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE)
-    completed_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(default=timezone.now)  # offline sync sends the client's time
 
     class Meta:
         unique_together = ('student', 'lesson')  # ✅ prevent duplicate completions
@@ -0,0 +1,119 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a (timestamp, id) pair.
+
+    Every page is a single ``WHERE (ts, id) < (:ts, :id) ORDER BY ts DESC,
+    id DESC LIMIT n`` — no OFFSET, so page 1000 costs the same as page 1
+    when a matching composite index exists.
+
+    Subclasses pick the key via ``ordering`` (default: newest first on
+    ``created_at``). Clients that still expect a bare list can opt in with
+    ``?bare=1``; the next cursor is then sent in the ``Link`` header.
+    """
+
+    ordering = ("-created_at", "-id")
+    default_page_size = 50
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    bare_query_param = "bare"
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.default_page_size))
+        except (TypeError, ValueError):
+            size = self.default_page_size
+        return max(1, min(size, self.max_page_size))
+
+    def is_bare(self, request):
+        return request.query_params.get(self.bare_query_param, "").lower() in ("1", "true", "yes")
+
+    def encode_cursor(self, value, pk):
+        raw = f"{value.isoformat()}|{pk}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        try:
+            value, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split("|")
+            return datetime.fromisoformat(value), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        key, tiebreak = (field.lstrip("-") for field in self.ordering)
+        lookup = "lt" if self.ordering[0].startswith("-") else "gt"
+
+        self.request = request
+        self.key = key
+        self.page_size = self.get_page_size(request)
+        self.bare = self.is_bare(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            value, pk = self.decode_cursor(encoded)
+            queryset = queryset.filter(
+                Q(**{f"{key}__{lookup}": value})
+                | Q(**{key: value, f"{tiebreak}__{lookup}": pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last = rows[-1] if rows else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(getattr(self.last, self.key), self.last.pk)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_payload(self, data):
+        if self.bare:
+            return data
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_headers(self):
+        next_link = self.get_next_link()
+        if not next_link:
+            return {}
+        return {"Link": f'<{next_link}>; rel="next"'}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_payload(data), headers=self.get_headers())
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class EnrollmentKeysetPagination(KeysetPagination):
+    ordering = ("-enrolled_on", "-id")
+
+
+class SubmissionKeysetPagination(KeysetPagination):
+    ordering = ("-submitted_on", "-id")
+
+
+class InstructorKeysetPagination(KeysetPagination):
+    ordering = ("-date_joined", "-id")
+    default_page_size = 20
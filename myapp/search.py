@@ -0,0 +1,303 @@
+"""
+Ranked course search.
+
+PostgreSQL: a ``tsvector`` column on Course (GIN-indexed, weighted
+title A > instructor B > description C) queried with prefix tsqueries and
+ordered by ``ts_rank``.
+
+Other databases (SQLite in local dev/tests): an in-process inverted index
+with the same weights and prefix semantics, rebuilt lazily whenever the
+search version changes.
+
+The search version (``SEARCH_VERSION_KEY``) is bumped only when something
+these indexes hold changes — a course's title, description or instructor,
+a course deletion, an instructor rename — not on every catalog change.
+
+Typeahead (``SuggestIndex``): a sorted in-process array of title and
+instructor-name keys answered with bisect, shared by every thread.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import F
+
+
+SEARCH_VERSION_KEY = "search:version"
+SEARCH_CONFIG = "simple"  # no stemming, so prefix matches behave like typeahead
+MAX_RESULTS = 100
+
+# Same relative weights PostgreSQL's ts_rank uses for A/B/C.
+WEIGHTS = {"title": 1.0, "instructor": 0.4, "description": 0.2}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def uses_postgres():
+    return connection.vendor == "postgresql"
+
+
+def get_search_version():
+    from .utils.catalog import get_version
+
+    return get_version(SEARCH_VERSION_KEY)
+
+
+def bump_search_version():
+    """Make every process rebuild its in-memory search and suggest indexes."""
+    from .utils.catalog import bump_version
+
+    return bump_version(SEARCH_VERSION_KEY)
+
+
+# =======================================
+# PostgreSQL backend
+# =======================================
+
+def course_search_vector():
+    """
+    The weighted vector as one expression over a Course row (title A,
+    instructor name B, description C), so any number of courses can be
+    refreshed by a single UPDATE.
+    """
+    from django.contrib.postgres.search import SearchVector
+    from django.db.models import OuterRef, Subquery
+
+    from .models import User
+
+    # UPDATE can't join, so the instructor's name comes from a correlated subquery
+    instructor_name = Subquery(User.objects.filter(pk=OuterRef("instructor_id")).values("username")[:1])
+    return (
+        SearchVector("title", weight="A", config=SEARCH_CONFIG)
+        + SearchVector(instructor_name, weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(course_ids=None):
+    """
+    Recompute ``Course.search_vector`` in one set-based UPDATE (PostgreSQL
+    only; no-op elsewhere). ``course_ids`` may be ids or a pk queryset.
+    """
+    if not uses_postgres():
+        return
+
+    from .models import Course
+
+    rows = Course.objects.all()
+    if course_ids is not None:
+        rows = rows.filter(pk__in=course_ids)
+    rows.update(search_vector=course_search_vector())
+
+
+def _postgres_search(queryset, tokens):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    # 'pyt & djan' → 'pyt:* & djan:*' (tokens are \w+ only, so this is safe raw syntax)
+    query = SearchQuery(" & ".join(f"{t}:*" for t in tokens), search_type="raw", config=SEARCH_CONFIG)
+    return (
+        queryset
+        .filter(search_vector=query)
+        .annotate(rank=SearchRank(F("search_vector"), query))
+        .order_by("-rank", "-created_at")
+    )
+
+
+# =======================================
+# In-process fallback
+# =======================================
+
+class InvertedIndex:
+    """term → {course_id: score}, plus a sorted term list for prefix lookups."""
+
+    def __init__(self):
+        self.version = None
+        self.postings = {}
+        self.terms = []
+        self.lock = threading.Lock()
+
+    def build(self, rows):
+        postings = defaultdict(lambda: defaultdict(float))
+        for pk, title, description, instructor_name in rows:
+            for field, text in (("title", title), ("instructor", instructor_name), ("description", description)):
+                for token in tokenize(text):
+                    postings[token][pk] += WEIGHTS[field]
+        self.postings = {term: dict(scores) for term, scores in postings.items()}
+        self.terms = sorted(self.postings)
+
+    def ensure_current(self):
+        from .models import Course
+
+        version = get_search_version()
+        if self.version == version:
+            return
+        with self.lock:
+            if self.version != version:
+                self.build(Course.objects.values_list("pk", "title", "description", "instructor__username"))
+                self.version = version
+
+    def _prefix_scores(self, prefix):
+        scores = defaultdict(float)
+        start = bisect.bisect_left(self.terms, prefix)
+        for term in self.terms[start:]:
+            if not term.startswith(prefix):
+                break
+            for pk, score in self.postings[term].items():
+                scores[pk] += score
+        return scores
+
+    def search(self, tokens, limit=MAX_RESULTS):
+        """Ids of courses matching ALL tokens (as prefixes), best first."""
+        self.ensure_current()
+        total = None
+        for token in tokens:
+            scores = self._prefix_scores(token)
+            if total is None:
+                total = scores
+            else:
+                total = {pk: total[pk] + s for pk, s in scores.items() if pk in total}
+            if not total:
+                return []
+        ranked = sorted(total.items(), key=lambda item: (-item[1], -item[0]))
+        return [pk for pk, _ in ranked[:limit]]
+
+
+memory_index = InvertedIndex()
+
+
+# =======================================
+# Typeahead
+# =======================================
+
+SUGGEST_TITLE, SUGGEST_TITLE_WORD, SUGGEST_INSTRUCTOR = 0, 1, 2
+
+
+class SuggestIndex:
+    """
+    Prefix index over course titles and instructor names.
+
+    ``snapshot`` is ``(keys, courses)``: ``keys`` a sorted tuple of
+    (normalized text, rank, course id) where the text is the full title,
+    every word-boundary suffix of it ("django rest", "rest") and the
+    instructor's name; ``courses`` id → (title, instructor name). A lookup is
+    one bisect plus a short scan. Writers build a new pair and swap the one
+    attribute; readers read it once, so keys and courses always match
+    without a lock on the read path.
+
+    This process patches the index from Course signals immediately; other
+    processes notice the search version change within ``recheck_seconds``.
+    """
+
+    recheck_seconds = 5
+    max_scan = 2000  # bound the work for one-letter prefixes
+
+    def __init__(self):
+        self.snapshot = ((), {})
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(text):
+        return " ".join(tokenize(text))
+
+    def _entries(self, pk, title, instructor_name):
+        words = tokenize(title)
+        for i in range(len(words)):
+            yield (" ".join(words[i:]), SUGGEST_TITLE if i == 0 else SUGGEST_TITLE_WORD, pk)
+        if instructor_name:
+            yield (self._normalize(instructor_name), SUGGEST_INSTRUCTOR, pk)
+
+    def _publish(self, courses):
+        keys = sorted(
+            entry
+            for pk, (title, instructor_name) in courses.items()
+            for entry in self._entries(pk, title, instructor_name)
+        )
+        self.snapshot = (tuple(keys), courses)  # never mutated after this
+
+    def rebuild(self):
+        from .models import Course
+
+        with self.lock:
+            version = get_search_version()
+            rows = Course.objects.values_list("pk", "title", "instructor__username")
+            self._publish({pk: (title, instructor_name) for pk, title, instructor_name in rows})
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def ensure_current(self):
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < self.recheck_seconds:
+            return
+
+        self.checked_at = now
+        if self.version != get_search_version():
+            self.rebuild()
+
+    def upsert(self, pk, title, instructor_name):
+        if self.version is None:
+            return  # never built in this process; the first lookup will build it
+        with self.lock:
+            courses = dict(self.snapshot[1])
+            courses[pk] = (title, instructor_name)
+            self._publish(courses)
+
+    def remove(self, pk):
+        if self.version is None:
+            return
+        with self.lock:
+            courses = dict(self.snapshot[1])
+            courses.pop(pk, None)
+            self._publish(courses)
+
+    def suggest(self, text, limit=8):
+        """Top ``limit`` courses as [{"id", "title"}], best match first."""
+        self.ensure_current()
+        prefix = self._normalize(text)
+        if not prefix:
+            return []
+
+        keys, courses = self.snapshot  # one read: keys and courses from the same publish
+        best = {}
+        i = bisect.bisect_left(keys, (prefix,))
+        end = min(len(keys), i + self.max_scan)
+        while i < end and keys[i][0].startswith(prefix):
+            _, rank, pk = keys[i]
+            if rank < best.get(pk, SUGGEST_INSTRUCTOR + 1):
+                best[pk] = rank
+            i += 1
+
+        ranked = sorted(best, key=lambda pk: (best[pk], courses[pk][0].lower(), pk))
+        return [{"id": pk, "title": courses[pk][0]} for pk in ranked[:limit]]
+
+
+suggest_index = SuggestIndex()
+
+
+# =======================================
+# Public entry point
+# =======================================
+
+def search_courses(queryset, text, limit=MAX_RESULTS):
+    """
+    Rank ``queryset`` (a Course queryset) against ``text``. Returns a list of
+    at most ``limit`` courses, best match first.
+    """
+    tokens = tokenize(text)[:10]
+    if not tokens:
+        return list(queryset.order_by("-created_at")[:limit])
+
+    if uses_postgres():
+        return list(_postgres_search(queryset, tokens)[:limit])
+
+    ids = memory_index.search(tokens, limit=limit)
+    by_id = queryset.in_bulk(ids)
+    return [by_id[pk] for pk in ids if pk in by_id]
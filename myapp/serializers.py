@@ -3,18 +3,52 @@ from decimal import Decimal, ROUND_HALF_UP
 from rest_framework import serializers
 from django.utils import timezone
 from .models import (
-    LessonCompletion, Notification, Option, Question, StudentQuizAttempt, User, Course, Enrollment, DailyTask, TaskSubmission, Offer, Feedback, Payment,Profile,
+    CourseAnalytics, LessonCompletion, Notification, Option, Question, StudentQuizAttempt, User, Course, Enrollment, DailyTask, TaskSubmission, Offer, Feedback, Payment,Profile,
     Certificate, Module, Lesson, Quiz, LiveSession, ChatMessage, Message, ChatRoom
 )
 from django.contrib.auth import get_user_model
+from .utils.course_stats import get_stats
+from .utils.images import srcset
+from .utils.offers import OfferContext
 
 UserModel = get_user_model()
 
 
 class UserSerializer(serializers.ModelSerializer):
+    profile_picture_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'role', 'profile_picture', "certificate", 'bio', 'phone', 'experience', 'qualification', 'is_approved']
+        fields = ['id', 'username', 'email', 'role', 'profile_picture', 'profile_picture_srcset', "certificate", 'bio', 'phone', 'experience', 'qualification', 'is_approved']
+
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj.profile_picture, obj.profile_picture_variants, self.context.get("request"))
+
+
+class InstructorDirectorySerializer(serializers.ModelSerializer):
+    """
+    Public instructor card. Counts come from annotations added by
+    ``InstructorListView`` (one query per page, summed from CourseStats).
+    """
+    course_count = serializers.IntegerField(read_only=True)
+    student_count = serializers.IntegerField(read_only=True)
+    avg_rating = serializers.SerializerMethodField()
+    profile_picture_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = [
+            'id', 'username', 'profile_picture', 'profile_picture_srcset', 'bio', 'experience', 'qualification',
+            'course_count', 'student_count', 'avg_rating',
+        ]
+
+    def get_profile_picture_srcset(self, obj):
+        return srcset(obj.profile_picture, obj.profile_picture_variants, self.context.get("request"))
+
+    def get_avg_rating(self, obj):
+        if not obj.review_total:
+            return None
+        return round(obj.rating_total / obj.review_total, 2)
 
 
 class ProfileSerializer(serializers.ModelSerializer):
@@ -56,83 +90,132 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class CourseSerializer(serializers.ModelSerializer):
+def _split_fieldset(raw):
+    """
+    "id,title,course.price" → ({"id", "title", "course"}, {"course": ["price"]})
+    """
+    if raw is None:
+        return None, {}
+    if isinstance(raw, str):
+        raw = raw.split(",")
+
+    top, nested = set(), {}
+    for name in (n.strip() for n in raw):
+        if not name:
+            continue
+        head, _, rest = name.partition(".")
+        top.add(head)
+        if rest:
+            nested.setdefault(head, []).append(rest)
+    return top, nested
+
+
+def visible_fields(serializer_class, query_params):
+    """Top-level fields of ``serializer_class`` that ?fields=/omit= leave in, in declaration order."""
+    keep, _ = _split_fieldset(query_params.get("fields"))
+    drop, nested_omit = _split_fieldset(query_params.get("omit"))
+    return [
+        name for name in serializer_class.Meta.fields
+        if (keep is None or name in keep) and not (drop and name in drop and name not in nested_omit)
+    ]
+
+
+class SparseFieldsetsMixin:
+    """
+    ?fields=a,b / ?omit=c trim the serializer *before* serialization, so
+    SerializerMethodFields that are left out are never evaluated (and their
+    queries never run). Nested serializers take dotted names, e.g.
+    ?fields=id,progress,course.title.
+
+    Passing fields=/omit= explicitly (as nested serializers do) disables the
+    query-string lookup.
+    """
+
+    def __init__(self, *args, **kwargs):
+        explicit = "fields" in kwargs or "omit" in kwargs
+        fields = kwargs.pop("fields", None)
+        omit = kwargs.pop("omit", None)
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get("request")
+        if not explicit and request is not None:
+            fields = request.query_params.get("fields")
+            omit = request.query_params.get("omit")
+
+        keep, self.nested_fields = _split_fieldset(fields)
+        drop, self.nested_omit = _split_fieldset(omit)
+
+        for name in list(self.fields):
+            if keep is not None and name not in keep:
+                self.fields.pop(name)
+            elif drop and name in drop and name not in self.nested_omit:
+                self.fields.pop(name)
+
+
+class CourseSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     instructor_name = serializers.CharField(source='instructor.username', read_only=True)
 
     has_offer = serializers.SerializerMethodField()
     discount_price = serializers.SerializerMethodField()
     offer_expires = serializers.SerializerMethodField()
 
+    # ✅ read from the CourseStats counters (select_related("stats")), never aggregated
+    average_rating = serializers.SerializerMethodField()
+    review_count = serializers.SerializerMethodField()
+
+    # ✅ resized WebP/JPEG URLs per size; null until the pipeline has run
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Course
         fields = [
-            'id', 'title', 'description', 'price', 'image','course_duration_months', 
+            'id', 'title', 'description', 'price', 'image', 'image_srcset', 'course_duration_months', 
             'instructor', 'instructor_name', 'created_at',
-            'has_offer', 'discount_price', 'offer_expires'
+            'has_offer', 'discount_price', 'offer_expires',
+            'average_rating', 'review_count',
         ]
         read_only_fields = ['created_at', 'instructor_name']
 
-    # ✅ Get the date the user FIRST enrolled in ANY course
-    def _first_enrollment_date(self, user):
-        if not user or not user.is_authenticated:
-            return None
+    def get_image_srcset(self, course):
+        return srcset(course.image, course.image_variants, self.context.get("request"))
 
-        return (
-            Enrollment.objects
-            .filter(student=user)
-            .order_by('enrolled_on')
-            .values_list('enrolled_on', flat=True)
-            .first()
-        )
+    def get_average_rating(self, course):
+        return get_stats(course).average_rating
 
-    # ✅ NEW: Check that user is NOT enrolled in this course
-    def _is_user_enrolled_in_this_course(self, user, course):
-        if not user or not user.is_authenticated:
-            return False
+    def get_review_count(self, course):
+        return get_stats(course).review_count
 
-        return Enrollment.objects.filter(student=user, course=course).exists()
+    # ✅ One OfferContext per request: the user's enrollments are loaded once
+    # and every course's offer is resolved from memory.
+    def _offer_context(self):
+        context = self.context.get("offer_context")
+        if context is None:
+            context = OfferContext.for_request(self.context.get("request"))
+        return context
 
     # ✅ MAIN OFFER LOGIC
     def get_has_offer(self, course):
-        request = self.context.get("request")
-        user = getattr(request, "user", None)
-
-        # ❌ user has no enrollment → no offer anywhere
-        first_enrolled_at = self._first_enrollment_date(user)
-        if not first_enrolled_at:
-            return False
-
-        # ✅ user enrolled in THIS exact course → NO OFFER
-        if self._is_user_enrolled_in_this_course(user, course):
-            return False
-
-        # ✅ offer window: 7 days after first enrollment
-        offer_end = first_enrolled_at + timedelta(days=7)
-        return timezone.now() <= offer_end
+        return self._offer_context().has_offer(course)
 
     def get_discount_price(self, course):
-        if not self.get_has_offer(course):
+        discounted = self._offer_context().discount_price(course)
+        if discounted is None:
             return None
-
-        discounted = (course.price * Decimal("0.80")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
         return f"{discounted}"
 
     def get_offer_expires(self, course):
-        request = self.context.get("request")
-        user = getattr(request, "user", None)
-
-        first_enrolled_at = self._first_enrollment_date(user)
-        if not first_enrolled_at:
-            return None
+        return self._offer_context().offer_expires()
 
-        return (first_enrolled_at + timedelta(days=7)).isoformat()
 
-        
+class CourseAnalyticsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CourseAnalytics
+        fields = ['course', 'enrollment_count', 'progress_histogram', 'module_funnel', 'task_stats', 'computed_at']
 
 
 # serializers.py (replace only the EnrollmentSerializer with this)
 
-class EnrollmentSerializer(serializers.ModelSerializer):
+class EnrollmentSerializer(SparseFieldsetsMixin, serializers.ModelSerializer):
     student = serializers.CharField(source='student.username', read_only=True)
     email = serializers.EmailField(source='student.email', read_only=True)
     # remove: course = CourseSerializer(read_only=True)
@@ -144,8 +227,20 @@ class EnrollmentSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        # ✅ forward the same context (so CourseSerializer can see request.user)
-        rep['course'] = CourseSerializer(instance.course, context=self.context).data
+        if 'course' not in rep:
+            return rep  # ?fields=/omit= left the course out: don't serialize it at all
+
+        # ✅ forward the same context (so CourseSerializer can see request.user
+        # and reuses the request's OfferContext instead of querying per row).
+        # One CourseSerializer is built per list and reused for every row.
+        course_serializer = getattr(self, '_course_serializer', None)
+        if course_serializer is None:
+            course_serializer = self._course_serializer = CourseSerializer(
+                context=self.context,
+                fields=self.nested_fields.get('course'),
+                omit=self.nested_omit.get('course'),
+            )
+        rep['course'] = course_serializer.to_representation(instance.course)
         return rep
 
 
@@ -192,7 +287,10 @@ class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
-        read_only_fields = ['created_at']
+        # ✅ Clients only pick the course; price, status and gateway ids are server-side
+        read_only_fields = [
+            'student', 'amount', 'status', 'order_id', 'payment_id', 'transaction_id', 'idempotency_key', 'created_at',
+        ]
 
 
 class CertificateSerializer(serializers.ModelSerializer):
@@ -289,6 +387,15 @@ class LessonCompletionSerializer(serializers.ModelSerializer):
         read_only_fields = ["student", "completed_at"]
 
 
+class CompletionSyncItemSerializer(serializers.Serializer):
+    lesson = serializers.IntegerField(min_value=1)
+    completed_at = serializers.DateTimeField(required=False)  # when the client recorded it offline
+
+
+class LessonCompletionSyncSerializer(serializers.Serializer):
+    completions = CompletionSyncItemSerializer(many=True, allow_empty=False, max_length=500)
+
+
 
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
@@ -1,9 +1,26 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.core.mail import EmailMultiAlternatives
+from django.utils import timezone
 from django.utils.html import strip_tags
 from django.conf import settings
-from .models import DailyTask, LiveSession, Notification, User, Course
+from .models import (
+    Certificate, DailyTask, Offer, Enrollment, Feedback, Lesson, LessonCompletion, LiveSession, Module, Notification, User, Course,
+    CourseStats, TaskSubmission,
+)
+from .search import bump_search_version, refresh_search_vectors, suggest_index
+from .utils.catalog import bump_catalog_version
+from .utils.certificates import forget_certificate
+from .utils.course_stats import apply_stats_delta, review_delta
+from .utils.entitlements import invalidate_entitlements
+from .utils.images import needs_variants
+from .utils.offers import forget_active_offer
+from .utils.outbox import publish
+from .utils.outline import drop_course_outline, rebuild_course_outline
+from .utils.progress import (
+    apply_course_total_delta, apply_progress_delta, lesson_course_id, task_status_delta,
+)
 
 
 @receiver(post_save, sender=User)
@@ -197,17 +214,8 @@ def send_instructor_course_assignment_email(sender, instance, created, **kwargs)
 @receiver(post_save, sender=DailyTask)
 def create_task_notification(sender, instance, created, **kwargs):
     if created:
-        course = instance.course
-        students = course.enrolled_students  # ✅ correct (already a list)
-        for student in students:
-            Notification.objects.create(
-                recipient=student,
-                actor=course.instructor,
-                title=f"New Task: {instance.title}",
-                message=f"A new task has been added in {course.title}",
-                notif_type='task',
-                url=f"/student/course/{course.id}/task/{instance.id}"
-            )
+        # ✅ fan-out happens in notify_task_assigned, after commit (outbox)
+        publish("task.assigned", task_id=instance.pk)
 
 @receiver(post_save, sender=LiveSession)
 def create_live_notification(sender, instance, created, **kwargs):
@@ -222,4 +230,410 @@ def create_live_notification(sender, instance, created, **kwargs):
                 message=f"Live class for {course.title} starts at {instance.start_time}",
                 notif_type='live',
                 url=f"/student/course/{course.id}/live"
-            )
\ No newline at end of file
+            )
+
+
+# =======================================
+# Catalog cache invalidation
+# =======================================
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Feedback)  # review_count / average_rating
+def invalidate_catalog_on_course_change(sender, instance, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_catalog_on_instructor_change(sender, instance, **kwargs):
+    """Instructor names are part of every catalog row (instructor_name)."""
+    if instance.role != "instructor":
+        return
+
+    update_fields = kwargs.get("update_fields")
+    if update_fields and "username" not in update_fields:
+        return  # e.g. last_login updates on every login
+
+    transaction.on_commit(bump_catalog_version)
+
+
+# =======================================
+# Search vectors (PostgreSQL)
+# =======================================
+
+SEARCHED_COURSE_FIELDS = ("title", "description", "instructor_id")
+
+
+@receiver(pre_save, sender=Course)
+def remember_searched_fields(sender, instance, **kwargs):
+    instance._searched = None
+    if instance.pk:
+        instance._searched = Course.objects.filter(pk=instance.pk).values(*SEARCHED_COURSE_FIELDS).first()
+
+
+@receiver(post_save, sender=Course)
+def reindex_course(sender, instance, created, **kwargs):
+    # ✅ price/image/duration saves leave the search indexes alone
+    previous = getattr(instance, "_searched", None)
+    if not created and previous is not None and all(
+        previous[field] == getattr(instance, field) for field in SEARCHED_COURSE_FIELDS
+    ):
+        return
+
+    refresh_search_vectors([instance.pk])
+    pk, title = instance.pk, instance.title
+    instructor_name = instance.instructor.username if instance.instructor_id else None
+    transaction.on_commit(lambda: suggest_index.upsert(pk, title, instructor_name))
+    transaction.on_commit(bump_search_version)
+
+
+@receiver(post_delete, sender=Course)
+def unindex_course(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.remove(pk))
+    transaction.on_commit(bump_search_version)
+
+
+@receiver(pre_save, sender=User)
+def remember_instructor_username(sender, instance, **kwargs):
+    instance._indexed_username = None
+    update_fields = kwargs.get("update_fields")
+    if instance.pk and instance.role == "instructor" and (update_fields is None or "username" in update_fields):
+        instance._indexed_username = User.objects.filter(pk=instance.pk).values_list("username", flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def refresh_instructor_search_vectors(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_indexed_username", None)
+    if created or previous is None or previous == instance.username:
+        return
+
+    refresh_search_vectors(Course.objects.filter(instructor=instance).values("pk"))
+    transaction.on_commit(bump_search_version)
+
+
+# =======================================
+# Materialized course pages
+# =======================================
+
+def schedule_course_page_rebuild(course_id):
+    # ✅ via the outbox: a broker outage after commit can't drop the rebuild
+    if course_id:
+        publish("course.changed", course_id=course_id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def rebuild_page_on_course_change(sender, instance, **kwargs):
+    schedule_course_page_rebuild(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=Feedback)
+def rebuild_page_on_child_change(sender, instance, **kwargs):
+    schedule_course_page_rebuild(instance.course_id)
+
+
+# only creates/deletes move enrollment_count
+@receiver(post_save, sender=Enrollment)
+def publish_enrollment_created(sender, instance, created, **kwargs):
+    if created:
+        publish("enrollment.created", course_id=instance.course_id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def rebuild_page_on_enrollment_delete(sender, instance, **kwargs):
+    schedule_course_page_rebuild(instance.course_id)
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def rebuild_page_on_lesson_change(sender, instance, **kwargs):
+    course_id = instance.course_id
+    if not course_id and instance.module_id:
+        course_id = Module.objects.filter(pk=instance.module_id).values_list("course_id", flat=True).first()
+    schedule_course_page_rebuild(course_id)
+
+
+@receiver(post_save, sender=User)
+def rebuild_pages_on_instructor_rename(sender, instance, created, **kwargs):
+    if created or instance.role != "instructor":
+        return
+
+    update_fields = kwargs.get("update_fields")
+    if update_fields and "username" not in update_fields:
+        return
+
+    for course_id in Course.objects.filter(instructor=instance).values_list("pk", flat=True):
+        schedule_course_page_rebuild(course_id)
+
+
+# =======================================
+# Course statistics counters
+# =======================================
+
+@receiver(post_save, sender=Course)
+def create_course_stats(sender, instance, created, **kwargs):
+    if created:
+        CourseStats.objects.get_or_create(course=instance)
+
+
+@receiver(pre_save, sender=Enrollment)
+@receiver(pre_save, sender=Feedback)
+def remember_counted_state(sender, instance, **kwargs):
+    """Snapshot what the counters currently include for this row."""
+    instance._counted = None
+    fields = ["course_id", "rating"] if sender is Feedback else ["course_id"]
+
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and not {"course", "course_id", *fields} & set(update_fields):
+        return  # e.g. progress/expiry saves can't move the counters
+
+    if instance.pk:
+        instance._counted = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Enrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_counted", None)
+    if created:
+        apply_stats_delta(instance.course_id, enrollment_count=1)
+    elif previous and previous["course_id"] != instance.course_id:
+        apply_stats_delta(previous["course_id"], enrollment_count=-1)
+        apply_stats_delta(instance.course_id, enrollment_count=1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    apply_stats_delta(instance.course_id, enrollment_count=-1)
+
+
+@receiver(post_save, sender=Feedback)
+def count_review(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_counted", None)
+    if created:
+        apply_stats_delta(instance.course_id, **review_delta(instance.rating, +1))
+    elif previous and (previous["course_id"], previous["rating"]) != (instance.course_id, instance.rating):
+        apply_stats_delta(previous["course_id"], **review_delta(previous["rating"], -1))
+        apply_stats_delta(instance.course_id, **review_delta(instance.rating, +1))
+
+
+@receiver(post_delete, sender=Feedback)
+def uncount_review(sender, instance, **kwargs):
+    apply_stats_delta(instance.course_id, **review_delta(instance.rating, -1))
+
+
+# =======================================
+# Responsive image variants
+# =======================================
+
+def schedule_image_variants(target, pk):
+    from .tasks import generate_image_variants
+
+    transaction.on_commit(lambda: generate_image_variants.delay(target, pk))
+
+
+@receiver(post_save, sender=Course)
+def queue_course_image_variants(sender, instance, **kwargs):
+    if needs_variants(instance.image, instance.image_variants):
+        schedule_image_variants("course", instance.pk)
+
+
+@receiver(post_save, sender=User)
+def queue_profile_picture_variants(sender, instance, **kwargs):
+    if needs_variants(instance.profile_picture, instance.profile_picture_variants):
+        schedule_image_variants("user", instance.pk)
+
+
+# =======================================
+# Progress counters
+# =======================================
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_course(sender, instance, **kwargs):
+    instance._counted_course_id = None
+    if instance.pk:
+        previous = Lesson.objects.filter(pk=instance.pk).first()
+        instance._counted_course_id = lesson_course_id(previous) if previous else None
+
+
+@receiver(post_save, sender=Lesson)
+def count_lesson(sender, instance, created, **kwargs):
+    course_id = lesson_course_id(instance)
+    previous = None if created else getattr(instance, "_counted_course_id", None)
+    if created:
+        apply_course_total_delta(course_id, lesson_count=1)
+    elif previous != course_id:
+        apply_course_total_delta(previous, lesson_count=-1)
+        apply_course_total_delta(course_id, lesson_count=1)
+
+
+@receiver(pre_delete, sender=Lesson)
+@receiver(pre_delete, sender=LessonCompletion)
+def remember_deleted_lesson_course(sender, instance, **kwargs):
+    # Resolved before the cascade removes the module/lesson rows it needs.
+    lesson = instance if sender is Lesson else Lesson.objects.filter(pk=instance.lesson_id).first()
+    instance._counted_course_id = lesson_course_id(lesson) if lesson else None
+
+
+@receiver(post_delete, sender=Lesson)
+def uncount_lesson(sender, instance, **kwargs):
+    apply_course_total_delta(getattr(instance, "_counted_course_id", None), lesson_count=-1)
+
+
+@receiver(post_save, sender=LessonCompletion)
+def count_lesson_completion(sender, instance, created, **kwargs):
+    if created:
+        apply_progress_delta(instance.student_id, lesson_course_id(instance.lesson), completed_lessons=1)
+
+
+@receiver(post_delete, sender=LessonCompletion)
+def uncount_lesson_completion(sender, instance, **kwargs):
+    apply_progress_delta(instance.student_id, getattr(instance, "_counted_course_id", None), completed_lessons=-1)
+
+
+@receiver(post_save, sender=DailyTask)
+def count_task(sender, instance, created, **kwargs):
+    if created:
+        apply_course_total_delta(instance.course_id, task_count=1)
+
+
+@receiver(post_delete, sender=DailyTask)
+def uncount_task(sender, instance, **kwargs):
+    apply_course_total_delta(instance.course_id, task_count=-1)
+
+
+@receiver(pre_save, sender=TaskSubmission)
+def remember_submission_status(sender, instance, **kwargs):
+    instance._counted = None
+    if instance.pk:
+        instance._counted = TaskSubmission.objects.filter(pk=instance.pk).values(
+            "student_id", "status", "task__course_id"
+        ).first()
+
+
+@receiver(post_save, sender=TaskSubmission)
+def count_submission_status(sender, instance, created, **kwargs):
+    previous = None if created else getattr(instance, "_counted", None)
+    if not previous and not task_status_delta(instance.status, +1):
+        return  # a new pending submission moves no counter
+
+    course_id = DailyTask.objects.filter(pk=instance.task_id).values_list("course_id", flat=True).first()
+
+    if previous and (previous["student_id"], previous["task__course_id"], previous["status"]) == (
+        instance.student_id, course_id, instance.status
+    ):
+        return
+    if previous:
+        apply_progress_delta(
+            previous["student_id"], previous["task__course_id"], **task_status_delta(previous["status"], -1)
+        )
+    apply_progress_delta(instance.student_id, course_id, **task_status_delta(instance.status, +1))
+
+
+@receiver(pre_delete, sender=TaskSubmission)
+def remember_deleted_submission_course(sender, instance, **kwargs):
+    instance._counted_course_id = DailyTask.objects.filter(pk=instance.task_id).values_list(
+        "course_id", flat=True
+    ).first()
+
+
+@receiver(post_delete, sender=TaskSubmission)
+def uncount_submission_status(sender, instance, **kwargs):
+    apply_progress_delta(
+        instance.student_id, getattr(instance, "_counted_course_id", None), **task_status_delta(instance.status, -1)
+    )
+
+
+# =======================================
+# Enrollment expiry
+# =======================================
+
+@receiver(pre_save, sender=Enrollment)
+def clear_expired_flag_on_renewal(sender, instance, **kwargs):
+    """A renewal pushes expires_on into the future; the sweeper's flag must go."""
+    if instance.is_expired and (instance.expires_on is None or instance.expires_on > timezone.now()):
+        instance.is_expired = False
+
+
+# =======================================
+# Entitlement cache
+# =======================================
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def invalidate_student_entitlements(sender, instance, **kwargs):
+    # Now, for the rest of this transaction, and again after commit so a
+    # concurrent reader can't re-cache the pre-commit state.
+    student_id = instance.student_id
+    invalidate_entitlements(student_id)
+    transaction.on_commit(lambda: invalidate_entitlements(student_id))
+
+
+
+# =======================================
+# Course outline (lesson navigation)
+# =======================================
+
+def schedule_outline_rebuild(*course_ids):
+    # Drop now so reads inside this transaction rebuild from its own state,
+    # then rebuild once the change is visible to everyone.
+    for course_id in {course_id for course_id in course_ids if course_id}:
+        drop_course_outline(course_id)
+        transaction.on_commit(lambda course_id=course_id: rebuild_course_outline(course_id))
+
+
+@receiver(pre_save, sender=Module)
+def remember_module_course(sender, instance, **kwargs):
+    instance._outline_course_id = None
+    if instance.pk:
+        instance._outline_course_id = Module.objects.filter(pk=instance.pk).values_list("course_id", flat=True).first()
+
+
+@receiver(post_save, sender=Module)
+def rebuild_outline_on_module_save(sender, instance, **kwargs):
+    schedule_outline_rebuild(instance.course_id, getattr(instance, "_outline_course_id", None))
+
+
+@receiver(post_delete, sender=Module)
+def rebuild_outline_on_module_delete(sender, instance, **kwargs):
+    schedule_outline_rebuild(instance.course_id)
+
+
+@receiver(post_save, sender=Lesson)
+def rebuild_outline_on_lesson_save(sender, instance, created, **kwargs):
+    # _counted_course_id: the course before this save (remember_lesson_course)
+    previous = None if created else getattr(instance, "_counted_course_id", None)
+    schedule_outline_rebuild(lesson_course_id(instance), previous)
+
+
+@receiver(post_delete, sender=Lesson)
+def rebuild_outline_on_lesson_delete(sender, instance, **kwargs):
+    schedule_outline_rebuild(getattr(instance, "_counted_course_id", None))
+
+
+@receiver(post_delete, sender=Course)
+def drop_outline_on_course_delete(sender, instance, **kwargs):
+    # Registered after the cascade's rebuilds, so this runs last on commit.
+    course_id = instance.pk
+    drop_course_outline(course_id)
+    transaction.on_commit(lambda: drop_course_outline(course_id))
+
+
+# =======================================
+# Certificate verification cache
+# =======================================
+
+@receiver([post_save, post_delete], sender=Certificate)
+def forget_certificate_verification(sender, instance, **kwargs):
+    certificate_id = instance.certificate_id
+    forget_certificate(certificate_id)
+    transaction.on_commit(lambda: forget_certificate(certificate_id))
+
+
+# =======================================
+# Pricing (site-wide offers)
+# =======================================
+
+@receiver([post_save, post_delete], sender=Offer)
+def reprice_on_offer_change(sender, instance, **kwargs):
+    # The cached active offer, and the anonymous catalog priced with it
+    forget_active_offer()
+    transaction.on_commit(forget_active_offer)
+    transaction.on_commit(bump_catalog_version)
@@ -1,14 +1,9 @@
 from celery import shared_task
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.utils.html import strip_tags
 from django.conf import settings
 
-@shared_task
-def send_student_welcome_email(*args, **kwargs):
-    username = kwargs.get("username")
-    email = kwargs.get("email")
-    raw_password = kwargs.get("raw_password")
-
+def build_student_welcome_email(username, email, raw_password):
     subject = "Welcome to CodiFi 🎉"
 
     html_content = f"""
@@ -81,11 +76,31 @@ def send_student_welcome_email(*args, **kwargs):
         [email],
     )
     msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    return msg
+
+
+@shared_task
+def send_student_welcome_email(*args, **kwargs):
+    build_student_welcome_email(
+        kwargs.get("username"), kwargs.get("email"), kwargs.get("raw_password")
+    ).send()
 
     return "Email sent successfully"
 
 
+@shared_task
+def send_student_welcome_emails(recipients):
+    """Batch variant for bulk imports: one SMTP connection for the whole chunk."""
+    messages = [
+        build_student_welcome_email(r["username"], r["email"], r["raw_password"])
+        for r in recipients
+    ]
+    with get_connection() as connection:
+        sent = connection.send_messages(messages)
+
+    return f"{sent} welcome email(s) sent."
+
+
 
 @shared_task
 def send_payment_success_email(username, email, course_title, transaction_id, amount, payment_date):
@@ -151,3 +166,99 @@ def send_payment_success_email(username, email, course_title, transaction_id, am
 
     return "Payment confirmation email sent."
 
+
+@shared_task
+def refresh_course_page(course_id):
+    from .utils.course_page import rebuild_course_page
+
+    rebuild_course_page(course_id)
+    return f"Course page {course_id} rebuilt."
+
+
+@shared_task
+def generate_image_variants(target, pk):
+    from .utils.images import process_image
+
+    written = process_image(target, pk)
+    return f"Image variants for {target} {pk}: {'written' if written else 'up to date'}."
+
+
+@shared_task
+def rollup_course_analytics(course_id=None):
+    from .utils.analytics import compute_course_analytics, rollup_all_course_analytics
+
+    if course_id is not None:
+        compute_course_analytics(course_id)
+        return f"Analytics for course {course_id} rolled up."
+    return f"Analytics for {rollup_all_course_analytics()} course(s) rolled up."
+
+
+@shared_task
+def sweep_expired_enrollments():
+    from .utils.access import sweep_expired_enrollments as sweep
+
+    return f"{sweep()} enrollment(s) marked expired."
+
+
+@shared_task
+def issue_course_certificates(course_id, student_ids):
+    from .utils.certificates import issue_certificates, render_certificates, render_map
+
+    _, pks = issue_certificates((student_id, course_id) for student_id in student_ids)
+    with render_map(jobs=len(pks)) as map_fn:
+        rendered, errors = render_certificates(pks, map_fn=map_fn)
+    return f"{rendered} certificate(s) issued for course {course_id}, {len(errors)} failed."
+
+
+@shared_task
+def process_payment_webhook(event_pk):
+    from .utils.payments import process_webhook_event
+
+    return f"Webhook event {event_pk}: {process_webhook_event(event_pk)}."
+
+
+@shared_task
+def reconcile_pending_payments():
+    from .utils.payments import reconcile_pending_payments as reconcile
+
+    totals = reconcile()
+    return (
+        f"{totals['checked']} pending payment(s) checked: {totals['succeeded']} succeeded, "
+        f"{totals['failed']} failed, {totals['errors']} error(s) in {totals['seconds']}s."
+    )
+
+
+@shared_task
+def notify_task_assigned(task_id):
+    from .models import DailyTask, Notification
+
+    task = DailyTask.objects.select_related("course").filter(pk=task_id).first()
+    if task is None:
+        return f"Task {task_id} no longer exists."
+
+    course = task.course
+    notifications = Notification.objects.bulk_create(
+        Notification(
+            recipient_id=student_id,
+            actor_id=course.instructor_id,
+            title=f"New Task: {task.title}",
+            message=f"A new task has been added in {course.title}",
+            notif_type="task",
+            url=f"/student/course/{course.id}/task/{task.id}",
+        )
+        for student_id in course.enrollments.values_list("student_id", flat=True)
+    )
+    return f"{len(notifications)} student(s) notified of task {task_id}."
+
+
+@shared_task
+def relay_outbox():
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .utils.outbox import purge_outbox, relay_outbox as relay
+
+    published, failed = relay()
+    purged = purge_outbox(timezone.now() - timedelta(days=7))
+    return f"Outbox: {published} published, {failed} failed, {purged} purged."
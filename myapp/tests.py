@@ -1,3 +1,1252 @@
-from django.test import TestCase
+import csv
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from learnproject.celery import app as celery_app
+
+from .models import (
+    Certificate, Course, CourseStats, DailyTask, Enrollment, Feedback, Lesson, LessonCompletion, Module, Notification,
+    Offer, OutboxEvent, Payment, PaymentWebhookEvent, TaskSubmission, User,
+)
+from .search import SuggestIndex, get_search_version, suggest_index
+from .tasks import issue_course_certificates
+from .utils.access import sweep_expired_enrollments
+from .utils.bulk_import import EnrollmentImporter
+from .utils.catalog import get_catalog_version
+from .utils.images import refresh_cached_documents
+from .utils import entitlements as entitlements_module
+from .utils.entitlements import get_entitlements, invalidate_entitlements, local_entitlements
+from .utils.offers import get_active_offer
+from .utils.outbox import relay_outbox
+from .utils.outline import course_outline_key, get_course_outline
+from .utils.payments import (
+    ORDER_REUSE_WINDOW, FakeWebhookSender, get_or_create_order, get_razorpay_client, reconcile_pending_payments,
+)
+
+celery_app.conf.task_always_eager = True  # no broker in tests: run .delay() inline
+
+
+class CourseCatalogQueryCountTests(TestCase):
+    """The catalog must cost the same number of queries for 3 or 30 courses."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            username="teacher", password="pass", role="instructor", is_approved=True
+        )
+        self.student = User.objects.create_user(username="student", password="pass")
+
+    def _add_courses(self, count):
+        for i in range(count):
+            Course.objects.create(
+                title=f"Course {i}", description="d", price=Decimal("100.00"), instructor=self.instructor
+            )
+
+    def _catalog_queries(self):
+        cache.clear()  # measure the uncached serialization path
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/courses/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_logged_in_catalog_is_constant(self):
+        self._add_courses(1)
+        Enrollment.objects.create(student=self.student, course=Course.objects.first())
+        self.client.force_authenticate(self.student)
+
+        self._add_courses(2)
+        small = self._catalog_queries()
+        self._add_courses(27)
+        large = self._catalog_queries()
+
+        self.assertEqual(small, large)
+
+    def test_offer_fields_resolved_from_memory(self):
+        self._add_courses(2)
+        enrolled, other = Course.objects.order_by("id")
+        Enrollment.objects.create(student=self.student, course=enrolled)
+        self.client.force_authenticate(self.student)
+
+        data = {c["id"]: c for c in self.client.get("/api/courses/").json()["results"]}
+
+        self.assertFalse(data[enrolled.id]["has_offer"])
+        self.assertTrue(data[other.id]["has_offer"])
+        self.assertEqual(data[other.id]["discount_price"], "80.00")
+        self.assertIsNotNone(data[other.id]["offer_expires"])
+
+
+class CourseCatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            username="teacher", password="pass", role="instructor", is_approved=True
+        )
+        self.course = Course.objects.create(
+            title="Python", description="d", price=Decimal("100.00"), instructor=self.instructor
+        )
+
+    def test_anonymous_catalog_answers_if_none_match(self):
+        first = self.client.get("/api/courses/")
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 304)
+
+    def test_course_and_instructor_writes_bump_the_catalog(self):
+        etag = self.client.get("/api/courses/")["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.title = "Python 2"
+            self.course.save()
+        response = self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["title"], "Python 2")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instructor.username = "renamed"
+            self.instructor.save()
+        self.assertEqual(self.client.get("/api/courses/").json()["results"][0]["instructor_name"], "renamed")
+
+    def test_authenticated_users_get_their_offer_overlay(self):
+        student = User.objects.create_user(username="student", password="pass")
+        other = Course.objects.create(title="Django", description="d", price=Decimal("50.00"))
+        Enrollment.objects.create(student=student, course=self.course)
+        self.client.get("/api/courses/")  # warm the anonymous base payload
+
+        self.client.force_authenticate(student)
+        data = {c["id"]: c for c in self.client.get("/api/courses/").json()["results"]}
+
+        self.assertFalse(data[self.course.id]["has_offer"])
+        self.assertEqual(data[other.id]["discount_price"], "40.00")
+
+    def test_offer_overlay_when_fields_trim_id_or_price(self):
+        student = User.objects.create_user(username="student", password="pass")
+        other = Course.objects.create(title="Django", description="d", price=Decimal("50.00"))
+        Enrollment.objects.create(student=student, course=self.course)
+        self.client.force_authenticate(student)
+
+        rows = self.client.get("/api/courses/", {"fields": "title,has_offer"}).json()["results"]
+        self.assertEqual(rows, [{"title": "Django", "has_offer": True}, {"title": "Python", "has_offer": False}])
+
+        rows = self.client.get("/api/courses/", {"fields": "id,discount_price"}).json()["results"]
+        self.assertEqual(rows, [{"id": other.id, "discount_price": "40.00"}, {"id": self.course.id, "discount_price": None}])
+
+        rows = self.client.get("/api/courses/", {"omit": "id,price"}).json()["results"]
+        self.assertEqual([(row["title"], row["discount_price"]) for row in rows], [("Django", "40.00"), ("Python", None)])
+        self.assertFalse({"id", "price"} & set(rows[0]))
+
+        detail = self.client.get(f"/api/courses/{other.id}/detail/", {"fields": "title,has_offer"}).json()
+        self.assertEqual(detail["course"]["discount_price"], "40.00")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="student", password="pass")
+        self.client.force_authenticate(self.user)
+        for i in range(5):
+            Notification.objects.create(recipient=self.user, title=f"n{i}")
+
+    def test_cursor_walks_every_row_without_offset(self):
+        seen, url = [], "/api/notifications/?page_size=2"
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                data = self.client.get(url).json()
+                seen += [n["title"] for n in data["results"]]
+                url = data["next"]
+
+        self.assertEqual(seen, [f"n{i}" for i in reversed(range(5))])
+        self.assertFalse(any("OFFSET" in q["sql"].upper() for q in ctx.captured_queries))
+
+    def test_bare_mode_returns_a_list_with_link_header(self):
+        response = self.client.get("/api/notifications/?page_size=2&bare=1")
+
+        self.assertEqual(len(response.json()), 2)
+        self.assertIn('rel="next"', response["Link"])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get("/api/notifications/?cursor=nope").status_code, 404)
+
+
+class CourseSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            username="guido", password="pass", role="instructor", is_approved=True
+        )
+        self.title_hit = Course.objects.create(title="Python Basics", description="intro", price=Decimal("10"))
+        self.desc_hit = Course.objects.create(
+            title="Web Apps", description="uses python a lot", price=Decimal("10"), instructor=self.instructor
+        )
+        Course.objects.create(title="Rust", description="systems", price=Decimal("10"))
+
+    def _titles(self, query):
+        return [c["title"] for c in self.client.get("/api/courses/search/", {"search": query}).json()]
+
+    def test_prefix_match_ranks_title_above_description(self):
+        self.assertEqual(self._titles("pyth"), ["Python Basics", "Web Apps"])
+
+    def test_instructor_name_and_multiple_terms(self):
+        self.assertEqual(self._titles("gui"), ["Web Apps"])
+        self.assertEqual(self._titles("web pyt"), ["Web Apps"])
+        self.assertEqual(self._titles("nothing"), [])
+
+
+class CourseDetailDocumentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.student = User.objects.create_user(username="student", password="pass")
+        self.course = Course.objects.create(title="Python", description="d", price=Decimal("100.00"))
+        module = Module.objects.create(course=self.course, title="M1", order=1)
+        Lesson.objects.create(module=module, title="L2", order=2)
+        Lesson.objects.create(module=module, title="L1", order=1)
+
+    def test_page_view_is_served_from_the_document(self):
+        url = f"/api/courses/{self.course.pk}/detail/"
+        first = self.client.get(url).json()
+        self.assertEqual([l["title"] for l in first["modules"][0]["lessons"]], ["L1", "L2"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_feedback_write_rebuilds_the_document(self):
+        url = f"/api/courses/{self.course.pk}/detail/"
+        self.assertEqual(self.client.get(url).json()["rating"]["count"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Feedback.objects.create(course=self.course, student=self.student, rating=4)
+        self.assertTrue(OutboxEvent.objects.filter(topic="course.changed", payload={"course_id": self.course.pk}).exists())
+        relay_outbox()  # the rebuild is an outbox event, published by the relay
+
+        data = self.client.get(url).json()
+        self.assertEqual(data["rating"]["average"], 4.0)
+        self.assertEqual(data["rating"]["histogram"]["4"], 1)
+        self.assertEqual(data["reviews"][0]["student"], "student")
+
+    def test_missing_course_is_404(self):
+        self.assertEqual(self.client.get("/api/courses/999/detail/").status_code, 404)
+
+
+class CourseStatsCounterTests(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(title="Python", description="d", price=Decimal("10"))
+        self.alice = User.objects.create_user(username="alice", password="pass")
+        self.bob = User.objects.create_user(username="bob", password="pass")
+
+    def stats(self):
+        return CourseStats.objects.get(course=self.course)
+
+    def test_counters_follow_creates_updates_and_deletes(self):
+        Enrollment.objects.create(student=self.alice, course=self.course)
+        bob = Enrollment.objects.create(student=self.bob, course=self.course)
+        review = Feedback.objects.create(course=self.course, student=self.alice, rating=5)
+        Feedback.objects.create(course=self.course, student=self.bob, rating=3)
+
+        review.rating = 4
+        review.save()
+        bob.delete()
+
+        stats = self.stats()
+        self.assertEqual(stats.enrollment_count, 1)
+        self.assertEqual((stats.review_count, stats.rating_sum), (2, 7))
+        self.assertEqual(stats.histogram, {"1": 0, "2": 0, "3": 1, "4": 1, "5": 0})
+        self.assertEqual(stats.average_rating, 3.5)
+
+    def test_rebuild_command_fixes_drift(self):
+        Enrollment.objects.create(student=self.alice, course=self.course)
+        Feedback.objects.create(course=self.course, student=self.alice, rating=2)
+        CourseStats.objects.filter(course=self.course).update(enrollment_count=99, rating_sum=0)
+
+        call_command("rebuild_course_stats", stdout=StringIO())
+
+        stats = self.stats()
+        self.assertEqual((stats.enrollment_count, stats.rating_sum, stats.rating_2), (1, 2, 1))
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.student = User.objects.create_user(username="student", password="pass")
+        self.course = Course.objects.create(title="Python", description="d", price=Decimal("100.00"))
+        Enrollment.objects.create(student=self.student, course=self.course)
+        self.client.force_authenticate(self.student)
+
+    def test_catalog_fields_trim_the_payload(self):
+        rows = self.client.get("/api/courses/", {"fields": "id,title,image,price"}).json()["results"]
+        self.assertEqual(set(rows[0]), {"id", "title", "image", "price"})
+
+    def test_enrollment_nested_fields_and_omit(self):
+        rows = self.client.get("/api/enrollments/", {"fields": "id,progress,course.title"}).json()["results"]
+        self.assertEqual(rows[0], {"id": rows[0]["id"], "progress": "0.00", "course": {"title": "Python"}})
+
+        rows = self.client.get("/api/enrollments/", {"omit": "course,email"}).json()["results"]
+        self.assertNotIn("course", rows[0])
+        self.assertNotIn("email", rows[0])
+
+    def test_unrequested_offer_fields_skip_the_offer_query(self):
+        get_active_offer()  # site-wide offer: cached once per Offer change, not per request
+        with CaptureQueriesContext(connection) as full:
+            self.client.get("/api/enrollments/")
+        with CaptureQueriesContext(connection) as trimmed:
+            self.client.get("/api/enrollments/", {"omit": "course.has_offer,course.discount_price,course.offer_expires"})
+        self.assertEqual(len(trimmed), len(full) - 1)
+
+
+class CourseSuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        suggest_index.version = None  # process-global: rebuild from this test's rows
+        self.client = APIClient()
+        instructor = User.objects.create_user(username="django_dan", password="pass", role="instructor")
+        self.rest = Course.objects.create(title="Django REST Framework", description="d", price=Decimal("1"))
+        self.intro = Course.objects.create(title="Intro to Django", description="d", price=Decimal("1"))
+        self.taught = Course.objects.create(title="Flask", description="d", price=Decimal("1"), instructor=instructor)
+
+    def _suggest(self, q):
+        return [r["id"] for r in self.client.get("/api/courses/suggest/", {"q": q}).json()["results"]]
+
+    def test_title_start_beats_inner_word_beats_instructor(self):
+        self.assertEqual(self._suggest("djan"), [self.rest.pk, self.intro.pk, self.taught.pk])
+        self.assertEqual(self._suggest("rest fr"), [self.rest.pk])
+        self.assertEqual(self._suggest(""), [])
+
+    def test_course_signals_patch_the_index_without_queries(self):
+        self._suggest("x")  # build
+        with self.captureOnCommitCallbacks(execute=True):
+            added = Course.objects.create(title="Xamarin", description="d", price=Decimal("1"))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._suggest("xam"), [added.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added.delete()
+        self.assertEqual(self._suggest("xam"), [])
+
+    def test_only_searched_fields_bump_the_search_version(self):
+        version = get_search_version()
+        student = User.objects.create_user(username="reviewer", password="pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rest.price = Decimal("2")
+            self.rest.save()
+            Feedback.objects.create(course=self.rest, student=student, rating=5, comment="great")
+            Offer.objects.create(title="Sale", discount_percent=10)
+        self.assertEqual(get_search_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rest.title = "Django REST"
+            self.rest.save()
+        self.assertNotEqual(get_search_version(), version)
+
+        version = get_search_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.taught.instructor.username = "flask_fay"
+            self.taught.instructor.save()
+        self.assertNotEqual(get_search_version(), version)
+
+    def test_writes_publish_a_new_snapshot_and_leave_the_old_one_whole(self):
+        index = SuggestIndex()
+        index.rebuild()
+        before = index.snapshot
+
+        index.remove(self.rest.pk)
+        keys, courses = before  # what a reader mid-lookup still holds
+        self.assertIn(self.rest.pk, courses)
+        self.assertTrue(all(pk in courses for _, _, pk in keys))
+
+        keys, courses = index.snapshot
+        self.assertNotIn(self.rest.pk, courses)
+        self.assertTrue(all(pk in courses for _, _, pk in keys))
+
+
+class InstructorDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.instructor = User.objects.create_user(
+            username="teacher", password="pass", role="instructor", is_approved=True, phone="555",
+        )
+        User.objects.create_user(username="pending", password="pass", role="instructor")
+        student = User.objects.create_user(username="learner", password="pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course = Course.objects.create(
+                title="Django", description="d", price=Decimal("1"), instructor=self.instructor,
+            )
+            Enrollment.objects.create(student=student, course=self.course)
+            Feedback.objects.create(student=student, course=self.course, rating=4, comment="ok")
+
+    def test_compact_cards_with_totals(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/instructors/")
+        [card] = response.json()["results"]
+        self.assertNotIn("phone", card)
+        self.assertNotIn("certificate", card)
+        self.assertEqual(
+            (card["username"], card["course_count"], card["student_count"], card["avg_rating"]),
+            ("teacher", 1, 1, 4.0),
+        )
+
+        with self.assertNumQueries(0):
+            cached = self.client.get("/api/instructors/")
+        self.assertEqual(cached.json(), response.json())
+
+    def test_course_assignment_invalidates_directory(self):
+        self.client.get("/api/instructors/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title="Flask", description="d", price=Decimal("1"), instructor=self.instructor)
+        [card] = self.client.get("/api/instructors/").json()["results"]
+        self.assertEqual(card["course_count"], 2)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _upload(self, size=(2000, 1000)):
+        buffer = BytesIO()
+        Image.new("RGBA", size, (200, 30, 30, 128)).save(buffer, "PNG")
+        return SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+
+    def test_upload_generates_variants_exposed_as_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = Course.objects.create(title="Art", description="d", price=Decimal("1"), image=self._upload())
+
+        course.refresh_from_db()
+        self.assertEqual(course.image_variants["source"], course.image.name)
+        self.assertEqual(course.image_variants["card"]["width"], 480)
+        for variant in ("thumb", "card", "hero"):
+            for fmt in ("webp", "jpeg"):
+                self.assertTrue(default_storage.exists(course.image_variants[variant][fmt]))
+
+        [row] = APIClient().get("/api/courses/").json()["results"]
+        self.assertTrue(row["image_srcset"]["hero"]["webp"].startswith("http://testserver/media/courses/"))
+        self.assertEqual(row["image_srcset"]["hero"]["width"], 1280)
+
+    def test_backfill_command_fills_missing_variants(self):
+        course = Course.objects.create(title="Art", description="d", price=Decimal("1"), image=self._upload((300, 300)))
+        self.assertEqual(course.image_variants, {})  # on_commit never ran
+
+        out = StringIO()
+        call_command("backfill_image_variants", "--workers", "1", stdout=out)
+        course.refresh_from_db()
+        self.assertEqual(course.image_variants["hero"]["width"], 300)  # never upscaled
+        self.assertIn("Generated variants for 1 image(s)", out.getvalue())
+
+    def test_only_instructor_avatars_invalidate_the_catalog(self):
+        student = User.objects.create_user(username="learner", password="pass")
+        instructor = User.objects.create_user(username="teacher", password="pass", role="instructor")
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.profile_picture = self._upload((300, 300))
+            student.save()
+        student.refresh_from_db()
+        self.assertEqual(student.profile_picture_variants["source"], student.profile_picture.name)
+        self.assertEqual(get_catalog_version(), version)
+
+        refresh_cached_documents("user", [student.pk, instructor.pk])  # the directory shows instructor avatars
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class ProgressCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.student = User.objects.create_user(username="learner", password="pass")
+        self.client.force_authenticate(self.student)
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+        module = Module.objects.create(course=self.course, title="M1")
+        # one lesson linked directly, one only through its module
+        self.lessons = [
+            Lesson.objects.create(course=self.course, module=module, title="L1"),
+            Lesson.objects.create(module=module, title="L2"),
+        ]
+        self.tasks = [DailyTask.objects.create(course=self.course, title=f"T{i}", description="d") for i in range(4)]
+        get_entitlements(self.student.pk)  # warm: _progress() measures the counter read only
+
+    def _progress(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/courses/{self.course.pk}/progress/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counters_follow_completions_and_grading(self):
+        self.client.post(f"/api/lessons/{self.lessons[1].pk}/complete/")
+        submission = TaskSubmission.objects.create(task=self.tasks[0], student=self.student, submission_file="t.txt")
+        submission.status = "approved"
+        submission.save()
+        rejected = TaskSubmission.objects.create(task=self.tasks[1], student=self.student, submission_file="t.txt")
+        rejected.status = "rejected"
+        rejected.save()
+
+        data = self._progress()
+        self.assertEqual(
+            (data["completed_lessons"], data["total_lessons"], data["completed_tasks"],
+             data["rejected_tasks"], data["pending_tasks"], data["course_progress"]),
+            (1, 2, 1, 1, 2, 37.5),
+        )
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress, Decimal("37.50"))
+
+        # regrading moves the counter, and new lessons dilute everyone's %
+        rejected.status = "approved"
+        rejected.save()
+        Lesson.objects.create(course=self.course, title="L3")
+        data = self._progress()
+        self.assertEqual((data["completed_tasks"], data["rejected_tasks"], data["total_lessons"]), (2, 0, 3))
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.progress, Decimal("41.67"))
+
+    def test_deletes_and_rebuild_agree_with_source_tables(self):
+        LessonCompletion.objects.create(student=self.student, lesson=self.lessons[0])
+        LessonCompletion.objects.create(student=self.student, lesson=self.lessons[1])
+        self.lessons[1].module.delete()  # cascades both lessons and their completions
+        self.tasks[3].delete()
+
+        live = self._progress()
+        self.assertEqual((live["completed_lessons"], live["total_lessons"], live["total_tasks"]), (0, 0, 3))
+
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_lessons=9, approved_tasks=9)
+        call_command("rebuild_course_stats", stdout=StringIO())
+        self.assertEqual(self._progress(), live)
+
+        self.course.delete()  # cascading decrements must not resurrect the stats row
+        self.assertFalse(CourseStats.objects.exists())
+
+
+
+class ProgressOverviewTests(TestCase):
+    def test_one_query_for_any_number_of_courses(self):
+        student = User.objects.create_user(username="learner", password="pass")
+        client = APIClient()
+        client.force_authenticate(student)
+
+        for i in range(3):
+            course = Course.objects.create(title=f"C{i}", description="d", price=Decimal("1"))
+            DailyTask.objects.create(course=course, title="T", description="d")
+            lesson = Lesson.objects.create(course=course, title="L")
+            Enrollment.objects.create(student=student, course=course)
+            if i == 0:
+                LessonCompletion.objects.create(student=student, lesson=lesson)
+
+        with self.assertNumQueries(1):
+            rows = client.get("/api/courses/progress/").json()
+
+        self.assertEqual(len(rows), 3)
+        by_title = {row["course_title"]: row for row in rows}
+        self.assertEqual(by_title["C0"]["course_progress"], 50.0)
+        self.assertEqual((by_title["C1"]["pending_tasks"], by_title["C1"]["expired"]), (1, False))
+
+
+class CourseAnalyticsTests(TestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username="teacher", password="pass", role="instructor")
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"), instructor=self.instructor)
+
+        intro = Module.objects.create(course=self.course, title="Intro", order=1)
+        deep = Module.objects.create(course=self.course, title="Deep dive", order=2)
+        intro_lessons = [Lesson.objects.create(module=intro, title=f"I{i}") for i in range(2)]
+        deep_lesson = Lesson.objects.create(module=deep, title="D1")
+        task = DailyTask.objects.create(course=self.course, title="T", description="d")
+
+        students = [User.objects.create_user(username=f"s{i}", password="pass") for i in range(4)]
+        for student in students:
+            Enrollment.objects.create(student=student, course=self.course)
+        # s0 finishes everything, s1 finishes the intro, s2 starts it, s3 does nothing
+        for student, lessons in ((students[0], [*intro_lessons, deep_lesson]), (students[1], intro_lessons), (students[2], intro_lessons[:1])):
+            for lesson in lessons:
+                LessonCompletion.objects.create(student=student, lesson=lesson)
+        for student, status in ((students[0], "approved"), (students[1], "rejected"), (students[2], "pending")):
+            TaskSubmission.objects.create(task=task, student=student, submission_file="t.txt", status=status)
+
+    def test_rollup_funnel_histogram_and_approval_rate(self):
+        data = self.client.post(f"/api/instructor/courses/{self.course.pk}/analytics/").json()
+
+        self.assertEqual(
+            [(m["title"], m["students_started"], m["students_completed"]) for m in data["module_funnel"]],
+            [("Intro", 3, 2), ("Deep dive", 1, 1)],
+        )
+        self.assertEqual(sum(b["students"] for b in data["progress_histogram"]), 4)
+        self.assertEqual(data["progress_histogram"][-1]["students"], 1)  # s0 at 100%
+        self.assertEqual((data["task_stats"]["submissions"], data["task_stats"]["approval_rate"]), (3, 50.0))
+
+        with self.assertNumQueries(2):  # course ownership, stored rollup
+            cached = self.client.get(f"/api/instructor/courses/{self.course.pk}/analytics/")
+        self.assertEqual(cached.json()["module_funnel"], data["module_funnel"])
+
+    def test_other_instructors_courses_are_hidden(self):
+        other = User.objects.create_user(username="other", password="pass", role="instructor")
+        self.client.force_authenticate(other)
+        response = self.client.get(f"/api/instructor/courses/{self.course.pk}/analytics/")
+        self.assertEqual(response.status_code, 404)
+
+
+class EnrollmentExpiryTests(TestCase):
+    def setUp(self):
+        self.student = User.objects.create_user(username="learner", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        self.lesson = Lesson.objects.create(course=self.course, title="L1")
+
+    def test_sweeper_flags_in_batches_and_notifies_once(self):
+        past = timezone.now() - timedelta(days=1)
+        expired = Enrollment.objects.create(student=self.student, course=self.course, expires_on=past)
+        for i in range(4):
+            other = Course.objects.create(title=f"C{i}", description="d", price=Decimal("1"))
+            Enrollment.objects.create(student=self.student, course=other, expires_on=past)
+        Enrollment.objects.create(
+            student=User.objects.create_user(username="fresh", password="pass"),
+            course=self.course, expires_on=timezone.now() + timedelta(days=30),
+        )
+
+        self.assertEqual(sweep_expired_enrollments(batch_size=2), 5)
+        self.assertEqual(sweep_expired_enrollments(batch_size=2), 0)
+        self.assertEqual(Notification.objects.filter(notif_type="expiry").count(), 5)
+
+        response = self.client.post(f"/api/lessons/{self.lesson.pk}/complete/")
+        self.assertEqual(response.status_code, 403)
+
+        # renewal clears the flag
+        expired.refresh_from_db()
+        expired.expires_on = timezone.now() + timedelta(days=30)
+        expired.save()
+        self.assertFalse(Enrollment.objects.get(pk=expired.pk).is_expired)
+        self.assertEqual(self.client.post(f"/api/lessons/{self.lesson.pk}/complete/").status_code, 200)
+
+    def test_unswept_expiry_is_still_enforced(self):
+        Enrollment.objects.create(
+            student=self.student, course=self.course, expires_on=timezone.now() - timedelta(minutes=1)
+        )
+        response = self.client.get(f"/api/courses/{self.course.pk}/progress/")
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(response.json()["expired"])
+
+
+class EntitlementCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username="learner", password="pass")
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+
+    def test_warm_checks_skip_the_database_and_enrollment_changes_invalidate(self):
+        self.assertFalse(get_entitlements(self.student.pk).is_enrolled(self.course.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(get_entitlements(self.student.pk).is_enrolled(self.course.pk))
+
+        enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+        self.assertEqual(get_entitlements(self.student.pk).state(self.course.pk), "active")
+
+        # another process: local tier empty, shared tier still valid
+        local_entitlements.pop(self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(get_entitlements(self.student.pk).has_access(self.course.pk))
+
+        enrollment.expires_on = timezone.now() - timedelta(minutes=1)
+        enrollment.save()
+        self.assertEqual(get_entitlements(self.student.pk).state(self.course.pk), "expired")
+
+        enrollment.delete()
+        self.assertEqual(get_entitlements(self.student.pk).state(self.course.pk), "none")
+
+    def test_sweeper_flag_reaches_the_cache(self):
+        Enrollment.objects.create(
+            student=self.student, course=self.course, expires_on=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual(get_entitlements(self.student.pk).state(self.course.pk), "active")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sweep_expired_enrollments(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(get_entitlements(self.student.pk).courses[self.course.pk][1], 0.0)
+
+    def test_invalidation_during_a_cold_load_is_not_lost(self):
+        real_load = entitlements_module._load
+
+        def load_then_enroll(user_id):
+            loaded = real_load(user_id)  # reads "not enrolled"...
+            Enrollment.objects.create(student=self.student, course=self.course)
+            invalidate_entitlements(user_id)  # ...while a purchase commits
+            return loaded
+
+        with mock.patch.object(entitlements_module, "_load", side_effect=load_then_enroll):
+            self.assertFalse(get_entitlements(self.student.pk).is_enrolled(self.course.pk))
+        self.assertTrue(get_entitlements(self.student.pk).is_enrolled(self.course.pk))
+
+
+
+class LessonCompletionSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username="learner", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        module = Module.objects.create(course=self.course, title="M")
+        self.lessons = [Lesson.objects.create(module=module, title=f"L{i}") for i in range(4)]
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+        self.locked = Lesson.objects.create(
+            course=Course.objects.create(title="Other", description="d", price=Decimal("1")), title="X"
+        )
+
+    def test_bulk_insert_recounts_once_and_reports_refusals(self):
+        LessonCompletion.objects.create(student=self.student, lesson=self.lessons[0])
+        offline_at = timezone.now() - timedelta(hours=3)
+
+        payload = {"completions": [
+            {"lesson": self.lessons[0].pk},  # already synced
+            {"lesson": self.lessons[1].pk, "completed_at": offline_at.isoformat()},
+            {"lesson": self.lessons[2].pk},
+            {"lesson": self.locked.pk},
+            {"lesson": 999999},
+        ]}
+        data = self.client.post("/api/lessons/complete/batch/", payload, format="json").json()
+
+        self.assertEqual(
+            sorted((r["lesson"], r["reason"]) for r in data["rejected"]),
+            [(self.locked.pk, "not_enrolled"), (999999, "not_found")],
+        )
+        [progress] = data["progress"]
+        self.assertEqual((progress["completed_lessons"], progress["lesson_progress"]), (3, 75.0))
+        self.assertEqual(
+            LessonCompletion.objects.get(student=self.student, lesson=self.lessons[1]).completed_at, offline_at
+        )
+        self.assertEqual(Enrollment.objects.get(student=self.student).progress, Decimal("37.50"))
+
+    def test_rejects_empty_batches(self):
+        response = self.client.post("/api/lessons/complete/batch/", {"completions": []}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CompletionBitmapTests(TestCase):
+    def test_bitmap_follows_outline_order_in_one_query(self):
+        cache.clear()
+        student = User.objects.create_user(username="learner", password="pass")
+        client = APIClient()
+        client.force_authenticate(student)
+
+        course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        second = Module.objects.create(course=course, title="B", order=2)
+        first = Module.objects.create(course=course, title="A", order=1)
+        b1 = Lesson.objects.create(module=second, title="B1", order=1)
+        a2 = Lesson.objects.create(module=first, title="A2", order=2)
+        a1 = Lesson.objects.create(module=first, title="A1", order=1)
+        extra = Lesson.objects.create(course=course, title="Bonus")
+        Enrollment.objects.create(student=student, course=course)
+        for lesson in (a2, extra):
+            LessonCompletion.objects.create(student=student, lesson=lesson)
+
+        get_entitlements(student.pk)
+        with self.assertNumQueries(1):
+            data = client.get(f"/api/courses/{course.pk}/completions/").json()
+
+        self.assertEqual(data["lessons"], [a1.pk, a2.pk, b1.pk, extra.pk])
+        self.assertEqual((data["completed"], data["completed_count"]), ("0101", 2))
+
+        outsider = APIClient()
+        outsider.force_authenticate(User.objects.create_user(username="other", password="pass"))
+        self.assertEqual(outsider.get(f"/api/courses/{course.pk}/completions/").status_code, 403)
+
+
+class BulkEnrollmentImportTests(TestCase):
+    def test_streams_rows_into_users_and_enrollments(self):
+        cache.clear()
+        course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        other = Course.objects.create(title="Flask", description="d", price=Decimal("1"))
+        existing = User.objects.create_user(username="old", email="old@corp.com", password="pass")
+        Enrollment.objects.create(student=existing, course=course)
+        User.objects.create_user(username="taken", email="taken@corp.com", password="pass")
+
+        path = tempfile.mktemp(suffix=".csv")
+        self.addCleanup(os.remove, path)
+        with open(path, "w", newline="") as handle:
+            writer = csv.writer(handle)
+            writer.writerow(["username", "email", "password", "course_id"])
+            writer.writerows([
+                ["ann", "ann@corp.com", "s3cret-pass", ""],
+                ["bob", "BOB@corp.com", "", ""],
+                ["ann", "ann@corp.com", "", str(other.pk)],  # same student, second course
+                ["old", "old@corp.com", "", ""],             # already enrolled
+                ["old", "old@corp.com", "", str(other.pk)],  # existing user, new course
+                ["eve", "taken@corp.com", "", ""],
+                ["bad name!", "x@corp.com", "", ""],
+                ["zed", "zed@corp.com", "", "999999"],
+            ])
+
+        out, err = StringIO(), StringIO()
+        with mock.patch("myapp.tasks.send_student_welcome_emails.delay") as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command("import_enrollments", path, "--course", str(course.pk),
+                             "--chunk-size", "3", "--workers", "1", stdout=out, stderr=err)
+
+        self.assertIn("Done, 8 rows: 1 already enrolled, 2 created, 2 enrolled, 3 error", out.getvalue())
+        self.assertEqual(err.getvalue().count("line "), 3)
+
+        ann = User.objects.get(username="ann")
+        self.assertTrue(ann.check_password("s3cret-pass"))
+        self.assertEqual(ann.role, "student")
+        self.assertEqual(
+            set(Enrollment.objects.filter(student=ann).values_list("course_id", flat=True)), {course.pk, other.pk}
+        )
+        self.assertTrue(Enrollment.objects.filter(student=existing, course=other).exists())
+        self.assertEqual(CourseStats.objects.get(course=course).enrollment_count, 3)
+
+        emailed = [r["username"] for call in send.call_args_list for r in call.args[0]]
+        self.assertEqual(sorted(emailed), ["ann", "bob"])
+
+    def test_duplicate_new_email_and_concurrent_username_fail_their_rows_only(self):
+        cache.clear()
+        course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        reader = csv.DictReader(StringIO(
+            "username,email\n"
+            "cat,dup@corp.com\n"
+            "dan,DUP@corp.com\n"  # second new user with the same email
+            "raced,raced@corp.com\n"
+            "fay,fay@corp.com\n"
+        ))
+
+        def hash_while_someone_registers(raws):
+            User.objects.create_user(username="raced", email="other@corp.com", password="pass")
+            return map(make_password, raws)
+
+        importer = EnrollmentImporter(
+            course_id=course.pk, hash_passwords=hash_while_someone_registers, send_emails=False
+        )
+        results = {r["username"]: (r["status"], r["detail"]) for r in importer.run(reader)}
+
+        self.assertEqual(results["dan"], ("error", "email already used by cat in this file"))
+        self.assertEqual(results["raced"][0], "error")
+        self.assertEqual((results["cat"][0], results["fay"][0]), ("created", "created"))
+        self.assertEqual(
+            set(Enrollment.objects.filter(course=course).values_list("student__username", flat=True)), {"cat", "fay"}
+        )
+
+
+class CourseOutlineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        self.first = Module.objects.create(course=self.course, title="A", order=1)
+        self.second = Module.objects.create(course=self.course, title="B", order=2)
+
+    def test_lesson_detail_returns_neighbours_from_outline(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            a1 = Lesson.objects.create(module=self.first, title="A1", order=1)
+            a2 = Lesson.objects.create(module=self.first, title="A2", order=2)
+            b1 = Lesson.objects.create(module=self.second, title="B1", order=1)
+
+        self.assertIsNotNone(cache.get(course_outline_key(self.course.pk)))
+        with self.assertNumQueries(1):
+            data = self.client.get(f"/api/lessons/{a2.pk}/").json()
+        self.assertEqual((data["previous"], data["next"]), (a1.pk, b1.pk))
+        self.assertEqual((data["position"], data["total"]), (2, 3))
+        self.assertEqual((data["module_position"], data["module_total"]), (2, 2))
+
+        # reordering modules rebuilds the outline
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.order = 0
+            self.second.save()
+        self.assertEqual(get_course_outline(self.course.pk)["lessons"], [b1.pk, a1.pk, a2.pk])
+        data = self.client.get(f"/api/lessons/{b1.pk}/").json()
+        self.assertEqual((data["previous"], data["next"], data["position"]), (None, a1.pk, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            a1.delete()
+        data = self.client.get(f"/api/lessons/{a2.pk}/").json()
+        self.assertEqual((data["previous"], data["next"], data["total"]), (b1.pk, None, 2))
+
+
+class CertificateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.student = User.objects.create_user(username="learner", password="pass", first_name="Ada", last_name="L")
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("1"))
+        self.lesson = Lesson.objects.create(course=self.course, title="L1")
+        self.task = DailyTask.objects.create(course=self.course, title="T1", description="d")
+        Enrollment.objects.create(student=self.student, course=self.course)
+
+    def test_reaching_full_progress_issues_a_verifiable_pdf(self):
+        client = APIClient()
+        client.force_authenticate(self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post(f"/api/lessons/{self.lesson.pk}/complete/")
+        self.assertFalse(Certificate.objects.exists())  # 50%: tasks still open
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submission = TaskSubmission.objects.create(task=self.task, student=self.student, submission_file="t.txt")
+            submission.status = "approved"
+            submission.save()
+
+        certificate = Certificate.objects.get(student=self.student, course=self.course)
+        with default_storage.open(certificate.pdf.name) as handle:
+            self.assertTrue(handle.read().startswith(b"%PDF"))
+
+        public = APIClient()
+        with self.assertNumQueries(1):
+            data = public.get(f"/api/certificates/verify/{certificate.certificate_id}/").json()
+        with self.assertNumQueries(0):
+            public.get(f"/api/certificates/verify/{certificate.certificate_id}/")
+        self.assertTrue(data["valid"])
+        self.assertEqual((data["student"], data["course_title"]), ("Ada L", "Django"))
+        self.assertTrue(data["pdf"].endswith(".pdf"))
+
+        self.assertEqual(public.get("/api/certificates/verify/CF-NOPE/").status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(public.get("/api/certificates/verify/CF-NOPE/").status_code, 404)
+
+    def test_backfill_command_issues_for_completed_enrollments(self):
+        Enrollment.objects.filter(student=self.student).update(progress=100)  # completed before this feature
+
+        out, again = StringIO(), StringIO()
+        call_command("issue_certificates", "--workers", "1", stdout=out)
+        call_command("issue_certificates", "--workers", "1", stdout=again)  # idempotent
+
+        certificate = Certificate.objects.get()
+        self.assertTrue(certificate.pdf.name.startswith("certificates/"))
+        self.assertIn("1 certificate(s) issued.", out.getvalue())
+        self.assertIn("Rendered 1 certificate PDF(s), 0 failed.", out.getvalue())
+        self.assertIn("0 certificate(s) issued.", again.getvalue())
+
+    @override_settings(CERTIFICATE_RENDER_WORKERS=2)
+    def test_completion_task_renders_through_the_pool(self):
+        other = User.objects.create_user(username="second", password="pass")
+        Enrollment.objects.create(student=other, course=self.course)
+        Enrollment.objects.filter(course=self.course).update(progress=100)
+
+        # threads stand in for processes so the test needs no fork
+        with mock.patch("myapp.utils.certificates.ProcessPoolExecutor", side_effect=ThreadPoolExecutor) as pool:
+            issue_course_certificates(self.course.pk, [self.student.pk, other.pk])
+
+        self.assertEqual(Certificate.objects.exclude(pdf="").count(), 2)
+        self.assertTrue(pool.called)
+
+
+@override_settings(RAZORPAY_CLIENT_CLASS="myapp.utils.payments.FakeRazorpayClient")
+class RazorpayOrderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.student = User.objects.create_user(username="buyer", password="pass", email="b@corp.com")
+        self.client.force_authenticate(self.student)
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("499.50"))
+
+    def test_retries_reuse_the_pending_order(self):
+        gateway = get_razorpay_client()
+        orders_before = len(gateway.orders)  # the fake client is shared across tests
+        first = self.client.post("/api/razorpay/create-order/", {"course_id": self.course.pk}).json()
+        again = self.client.post("/api/razorpay/create-order/", {"course_id": self.course.pk}).json()
+
+        self.assertEqual((first["reused"], again["reused"]), (False, True))
+        self.assertEqual(first["order_id"], again["order_id"])
+        self.assertEqual(first["amount"], 49950)
+        self.assertEqual(len(gateway.orders), orders_before + 1)
+        self.assertEqual(Payment.objects.filter(status="pending").count(), 1)
+
+        later = timezone.now() + ORDER_REUSE_WINDOW
+        with mock.patch("myapp.utils.payments.timezone.now", return_value=later):
+            expired = self.client.post("/api/razorpay/create-order/", {"course_id": self.course.pk}).json()
+        self.assertNotEqual(expired["order_id"], first["order_id"])
+
+        payment_id = "pay_fake1"
+        response = self.client.post("/api/razorpay/verify-payment/", {
+            "razorpay_order_id": first["order_id"],
+            "razorpay_payment_id": payment_id,
+            "razorpay_signature": gateway.sign(first["order_id"], payment_id),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+        self.assertEqual(Payment.objects.get(order_id=first["order_id"]).status, "success")
+
+    def test_retry_across_a_window_boundary_reuses_the_order(self):
+        gateway = get_razorpay_client()
+        orders_before = len(gateway.orders)
+        window = ORDER_REUSE_WINDOW.total_seconds()
+        boundary = datetime.fromtimestamp((timezone.now().timestamp() // window + 1) * window, tz=dt_timezone.utc)
+
+        with mock.patch("django.utils.timezone.now", return_value=boundary - timedelta(seconds=1)):
+            first, reused_first = get_or_create_order(self.student, self.course, self.course.price)
+        with mock.patch("django.utils.timezone.now", return_value=boundary + timedelta(seconds=1)):
+            again, reused_again = get_or_create_order(self.student, self.course, self.course.price)
+
+        self.assertEqual((reused_first, reused_again), (False, True))
+        self.assertEqual(again.order_id, first.order_id)
+        self.assertEqual(len(gateway.orders), orders_before + 1)
+
+    def test_gateway_call_runs_outside_the_claim_transaction(self):
+        gateway = get_razorpay_client()
+        savepoints = len(connection.savepoint_ids)  # the test case's own transaction
+        create = gateway.order.create
+        calls = []
+
+        def failing_create(data):
+            calls.append(len(connection.savepoint_ids))
+            raise ConnectionError("gateway down")
+
+        with mock.patch.object(gateway.order, "create", side_effect=failing_create):
+            with self.assertRaises(ConnectionError):
+                get_or_create_order(self.student, self.course, self.course.price)
+        self.assertEqual(calls, [savepoints])  # no claim transaction left open
+
+        claim = Payment.objects.get(student=self.student, status="pending")
+        self.assertIsNone(claim.order_id)  # committed, waiting for a retry
+
+        def racing_create(data):
+            order = create(data)
+            Payment.objects.filter(pk=claim.pk).update(order_id="order_winner")  # another request won
+            return order
+
+        with mock.patch.object(gateway.order, "create", side_effect=racing_create):
+            payment, reused = get_or_create_order(self.student, self.course, self.course.price)
+        self.assertEqual((payment.pk, payment.order_id, reused), (claim.pk, "order_winner", True))
+
+
+@override_settings(
+    RAZORPAY_CLIENT_CLASS="myapp.utils.payments.FakeRazorpayClient", RAZORPAY_WEBHOOK_SECRET="whsec-test",
+)
+class RazorpayWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username="buyer", password="pass", email="b@corp.com")
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("499"))
+        self.payment, _ = get_or_create_order(self.student, self.course, Decimal("499"))
+        self.sender = FakeWebhookSender()
+        self.client = APIClient()
+
+    def _deliver(self, payload, event_id=None, signature=None):
+        body, headers = self.sender.request(payload, event_id=event_id)
+        if signature:
+            headers["HTTP_X_RAZORPAY_SIGNATURE"] = signature
+        response = self.client.post("/api/razorpay/webhook/", body, content_type="application/json", **headers)
+        relay_outbox()  # what the relay process does after commit
+        return response
+
+    def test_captured_payment_enrolls_once(self):
+        captured = self.sender.payment_event("payment.captured", self.payment.order_id, "pay_1", 49900)
+        with mock.patch("myapp.tasks.send_payment_success_email.apply_async") as send:
+            response = self._deliver(captured, event_id="evt_1")
+            replay = self._deliver(captured, event_id="evt_1")
+            retried = self._deliver(captured, event_id="evt_2")  # same payment, new delivery
+
+        self.assertEqual((response.json()["status"], replay.json()["status"]), ("received", "duplicate"))
+        self.assertEqual(retried.status_code, 200)
+        self.assertEqual(
+            dict(PaymentWebhookEvent.objects.values_list("event_id", "status")),
+            {"evt_1": "processed", "evt_2": "duplicate"},
+        )
+        self.assertEqual(send.call_count, 1)
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.payment_id), ("success", "pay_1"))
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+
+    def test_rejects_bad_signatures_and_records_mismatches(self):
+        captured = self.sender.payment_event("payment.captured", self.payment.order_id, "pay_1", 100)
+        self.assertEqual(self._deliver(captured, signature="forged").status_code, 400)
+        self.assertFalse(PaymentWebhookEvent.objects.exists())
+
+        self._deliver(captured)  # amount does not match the order
+        event = PaymentWebhookEvent.objects.get()
+        self.assertEqual(event.status, "failed")
+        self.assertIn("does not match", event.error)
+        self.assertFalse(Enrollment.objects.exists())
+
+
+@override_settings(RAZORPAY_CLIENT_CLASS="myapp.utils.payments.FakeRazorpayClient")
+class PaymentReconciliationTests(TestCase):
+    def _order(self, title, age):
+        course = Course.objects.create(title=title, description="d", price=Decimal("100"))
+        payment, _ = get_or_create_order(self.student, course, Decimal("100"))
+        Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - age)
+        return payment
+
+    def setUp(self):
+        cache.clear()
+        self.student = User.objects.create_user(username="buyer", password="pass", email="b@corp.com")
+
+    def test_settles_stale_pending_payments_in_batches(self):
+        gateway = get_razorpay_client()
+        paid = self._order("Paid", timedelta(hours=1))
+        waiting = self._order("Waiting", timedelta(hours=1))
+        abandoned = self._order("Abandoned", timedelta(days=2))
+        fresh = self._order("Fresh", timedelta(minutes=5))
+        unknown = self._order("Unknown", timedelta(hours=2))
+        gateway.pay(paid.order_id)
+        gateway.pay(abandoned.order_id, status="failed")
+        Payment.objects.filter(pk=unknown.pk).update(order_id="order_missing")
+
+        with self.assertLogs("myapp.utils.payments", level="INFO") as logs:
+            totals = reconcile_pending_payments(batch_size=2, workers=2, rate=0)
+
+        self.assertEqual(
+            {key: totals[key] for key in ("batches", "checked", "succeeded", "failed", "pending", "errors")},
+            {"batches": 2, "checked": 4, "succeeded": 1, "failed": 1, "pending": 1, "errors": 1},
+        )
+        self.assertEqual(sum("reconcile batch" in line for line in logs.output), 2)
+        statuses = dict(Payment.objects.values_list("pk", "status"))
+        self.assertEqual(
+            [statuses[p.pk] for p in (paid, waiting, abandoned, fresh, unknown)],
+            ["success", "pending", "failed", "pending", "pending"],
+        )
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=paid.course).exists())
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username="teacher", password="pass", role="instructor")
+        self.course = Course.objects.create(
+            title="Django", description="d", price=Decimal("1"), instructor=self.instructor,
+        )
+        self.students = [User.objects.create_user(username=f"s{i}", password="pass") for i in range(3)]
+        for student in self.students:
+            Enrollment.objects.create(student=student, course=self.course)
+        relay_outbox()
+
+    def test_side_effects_wait_for_commit_and_the_relay(self):
+        task = DailyTask.objects.create(course=self.course, title="T1", description="d")
+        self.assertFalse(Notification.objects.filter(notif_type="task").exists())
+        self.assertEqual(list(OutboxEvent.objects.filter(published_at__isnull=True).values_list("topic", flat=True)),
+                         ["task.assigned"])
+
+        self.assertEqual(relay_outbox(), (1, 0))
+        self.assertEqual(relay_outbox(), (0, 0))
+        notified = Notification.objects.filter(notif_type="task", url__endswith=f"/task/{task.pk}")
+        self.assertEqual(set(notified.values_list("recipient_id", flat=True)), {s.pk for s in self.students})
+
+    def test_rolled_back_events_are_never_published_and_failures_retry(self):
+        try:
+            with transaction.atomic():
+                DailyTask.objects.create(course=self.course, title="T1", description="d")
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+        self.assertFalse(OutboxEvent.objects.filter(published_at__isnull=True).exists())
+
+        DailyTask.objects.create(course=self.course, title="T2", description="d")
+        with mock.patch("myapp.tasks.notify_task_assigned.apply_async", side_effect=ConnectionError("broker down")):
+            self.assertEqual(relay_outbox(), (0, 1))
+        event = OutboxEvent.objects.get(published_at__isnull=True)
+        self.assertEqual((event.attempts, event.last_error), (1, "ConnectionError: broker down"))
+
+        self.assertEqual(relay_outbox(), (1, 0))
+        self.assertEqual(Notification.objects.filter(notif_type="task").count(), 3)
+
+
+@override_settings(RAZORPAY_CLIENT_CLASS="myapp.utils.payments.FakeRazorpayClient")
+class PricingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.student = User.objects.create_user(username="buyer", password="pass")
+        self.owned = Course.objects.create(title="Owned", description="d", price=Decimal("100.00"))
+        self.course = Course.objects.create(title="Django", description="d", price=Decimal("99.99"))
+        Enrollment.objects.create(student=self.student, course=self.owned)
+        self.client.force_authenticate(self.student)
+
+    def _quotes(self, *course_ids):
+        response = self.client.get("/api/pricing/quotes/", {"course_ids": ",".join(map(str, course_ids))})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_batch_quotes_pick_the_larger_discount(self):
+        data = self._quotes(self.course.pk, self.owned.pk, 999999)
+        quotes = {q["course_id"]: q for q in data["quotes"]}
+        self.assertEqual(data["missing"], [999999])
+        self.assertEqual((quotes[self.course.pk]["final_price"], quotes[self.course.pk]["source"]),
+                         ("79.99", "first_enrollment"))
+        self.assertEqual((quotes[self.owned.pk]["final_price"], quotes[self.owned.pk]["source"]), ("100.00", None))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offer = Offer.objects.create(title="Diwali", discount_percent=35)
+        with self.assertNumQueries(2):  # course prices, active offer (then cached)
+            quotes = {q["course_id"]: q for q in self._quotes(self.course.pk, self.owned.pk)["quotes"]}
+        self.assertEqual((quotes[self.course.pk]["final_price"], quotes[self.course.pk]["offer_id"]), ("64.99", offer.pk))
+        self.assertEqual(quotes[self.owned.pk]["final_price"], "65.00")
+
+        anonymous = APIClient().get("/api/courses/").json()["results"]
+        self.assertEqual({row["discount_price"] for row in anonymous}, {"65.00", "64.99"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            offer.is_active = False
+            offer.save()
+        self.assertIsNone(get_active_offer())
+
+    def test_checkout_charges_the_quoted_price(self):
+        Offer.objects.create(title="Sale", discount_percent=10)
+        order = self.client.post("/api/razorpay/create-order/", {"course_id": self.course.pk}).json()
+        self.assertEqual((order["amount"], Decimal(str(order["final_price"]))), (7999, Decimal("79.99")))
+        self.assertEqual(self.course.get_final_price(user=self.student), Decimal("79.99"))
+        self.assertEqual(Payment.objects.get(order_id=order["order_id"]).amount, Decimal("79.99"))
+
+    def test_newest_active_offer_applies_not_the_largest(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Offer.objects.create(title="Big", discount_percent=50)
+            newest = Offer.objects.create(title="Small", discount_percent=10)
+        self.assertEqual(get_active_offer(), (newest.pk, "Small", 10))
+        [quote] = self._quotes(self.owned.pk)["quotes"]
+        self.assertEqual((quote["final_price"], quote["offer_id"]), ("90.00", newest.pk))
+
+    def test_fully_discounted_checkout_enrolls_without_razorpay(self):
+        Offer.objects.create(title="Free week", discount_percent=100)
+        gateway = get_razorpay_client()
+        orders_before = len(gateway.orders)
+
+        response = self.client.post("/api/razorpay/create-order/", {"course_id": self.course.pk})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["order_id"], data["amount"], data["enrolled"]), (None, 0, True))
+        self.assertEqual(len(gateway.orders), orders_before)
+        self.assertTrue(Enrollment.objects.filter(student=self.student, course=self.course).exists())
+        payment = Payment.objects.get(student=self.student, course=self.course)
+        self.assertEqual((payment.amount, payment.status), (Decimal("0.00"), "success"))
+
+    def test_payment_create_ignores_client_amount_status_and_gateway_ids(self):
+        response = self.client.post("/api/payments/", {
+            "course": self.course.pk, "amount": "1.00", "status": "success",
+            "order_id": "order_forged", "payment_id": "pay_forged", "idempotency_key": "k",
+        })
+        self.assertEqual(response.status_code, 201)
+
+        payment = Payment.objects.get(pk=response.json()["id"])
+        self.assertEqual((payment.amount, payment.status), (Decimal("79.99"), "pending"))
+        self.assertEqual((payment.order_id, payment.payment_id, payment.idempotency_key), (None, None, None))
+        self.assertFalse(Enrollment.objects.filter(student=self.student, course=self.course).exists())
@@ -4,24 +4,24 @@ from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     # Auth & Profile
     ChatRoomDetailAPI, ChatRoomListAPI, FeedbackDeleteView, GetOrCreateCourseChat, 
-    InstructorDashboardView, LessonCompletionStatusView, MarkLessonCompletedView, MarkMessagesReadAPI, 
+    InstructorDashboardView, CertificateVerifyView, CourseCompletionMapView, LessonCompletionStatusView, LessonCompletionSyncView, MarkLessonCompletedView, MarkMessagesReadAPI, 
     NotificationViewSet, QuestionDeleteView, QuestionUpdateView, QuizDeleteView, 
     QuizUpdateView, RegisterView, SendMessageAPI, StudentRegisterView, InstructorRegisterView,
     ProfileView, CustomTokenObtainPairView,
 
     # Course-related
-    CourseListView, CourseDetailView, CourseSearchView,
-    StudentTaskSubmissionListView,StudentCourseProgressView,LessonDetailView,
+    CourseListView, CourseDetailView, CourseSearchView, CourseSuggestView,
+    StudentTaskSubmissionListView,StudentCourseProgressView,StudentProgressOverviewView,LessonDetailView,
 
     # Enrollment & Payment
-    EnrollmentCreateView, PaymentCreateView,CreateRazorpayOrderView,VerifyRazorpayPaymentView,EnrollmentListView,
+    EnrollmentCreateView, PaymentCreateView,CreateRazorpayOrderView, PriceQuoteView, RazorpayWebhookView,VerifyRazorpayPaymentView,EnrollmentListView,
 
     # Feedback
     FeedbackCreateView,CourseFeedbackListView,FeedbackUpdateView,
 
 
     # Instructor-related
-    InstructorListView, InstructorCourseListView, InstructorEnrollmentListView,
+    InstructorListView, InstructorCourseListView, InstructorEnrollmentListView, InstructorCourseAnalyticsView,
     InstructorDailyTaskCreateView, TaskSubmissionReviewView, InstructorLiveSessionCreateView,
     TaskSubmissionListView,DailyTaskUpdateDeleteView,YouTubeSearchView,InstructorLessonCreateView,CourseLessonsListView,
     InstructorModuleListCreateView,CourseModulesWithLessonsView,YouTubeVideoDetailView,ZoomCreateMeetingView,InstructorLiveSessionListView,
@@ -62,9 +62,14 @@ urlpatterns = [
     # Courses (public)
     path('api/courses/', CourseListView.as_view(), name='course-list'),
     path('api/courses/search/', CourseSearchView.as_view(), name='course-search'),
+    path('api/courses/suggest/', CourseSuggestView.as_view(), name='course-suggest'),
+    path('api/pricing/quotes/', PriceQuoteView.as_view(), name='price-quotes'),
     path('api/courses/<int:pk>/detail/', CourseDetailView.as_view(), name='course-detail'),
     # path('api/courses/<int:pk>/lessons/', CourseLessonsView.as_view(), name='course-lessons'),
     path("api/courses/<int:course_id>/progress/", StudentCourseProgressView.as_view(), name="student-course-progress"),
+    path("api/courses/progress/", StudentProgressOverviewView.as_view(), name="student-progress-overview"),
+    path("api/courses/<int:course_id>/completions/", CourseCompletionMapView.as_view(), name="course-completion-map"),
+    path("api/certificates/verify/<str:certificate_id>/", CertificateVerifyView.as_view(), name="certificate-verify"),
 
     
     #Chat Section
@@ -85,6 +90,7 @@ urlpatterns = [
     # Razorpay Integration
     path("api/razorpay/create-order/", CreateRazorpayOrderView.as_view(), name="create_order"),
     path("api/razorpay/verify-payment/", VerifyRazorpayPaymentView.as_view(), name="verify_payment"),
+    path("api/razorpay/webhook/", RazorpayWebhookView.as_view(), name="razorpay_webhook"),
 
 
     # Feedback
@@ -112,6 +118,7 @@ urlpatterns = [
     path("api/instructor/lessons/create/", InstructorLessonCreateView.as_view(), name="instructor-lesson-create"),
     path("api/courses/<int:course_id>/lessons/", CourseLessonsListView.as_view(), name="course-lessons"),
     path("api/instructor/courses/<int:course_id>/modules/", InstructorModuleListCreateView.as_view(), name="instructor-modules"),
+    path("api/instructor/courses/<int:course_id>/analytics/", InstructorCourseAnalyticsView.as_view(), name="instructor-course-analytics"),
     path("api/courses/<int:course_id>/modules-with-lessons/", CourseModulesWithLessonsView.as_view()),
     # ZOOM
     path("api/instructor/courses/<int:course_id>/zoom/create/", ZoomCreateMeetingView.as_view(), name="zoom-create-meeting"),
@@ -125,6 +132,7 @@ urlpatterns = [
     path('api/student/submissions/', StudentTaskSubmissionListView.as_view()),
 
     #Lessons
+    path("api/lessons/complete/batch/", LessonCompletionSyncView.as_view(), name="lesson-completion-sync"),
     path("api/lessons/<int:lesson_id>/", LessonDetailView.as_view(), name="lesson-detail"),
     path("api/lessons/<int:lesson_id>/complete/", MarkLessonCompletedView.as_view()),
     path("api/lessons/<int:lesson_id>/complete-status/", LessonCompletionStatusView.as_view()),
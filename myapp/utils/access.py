@@ -0,0 +1,73 @@
+# myapp/utils/access.py
+from django.db import transaction
+from django.db.models import BooleanField, Case, Q, Value, When
+from django.utils import timezone
+
+
+ACCESS_NONE, ACCESS_ACTIVE, ACCESS_EXPIRED = "none", "active", "expired"
+SWEEP_BATCH_SIZE = 500
+
+
+def expired_condition(now=None):
+    """
+    Flagged by the sweeper, or past expiry and not swept yet. Evaluated by
+    the database, so callers never compare dates on a loaded row.
+    """
+    return Q(is_expired=True) | Q(expires_on__lte=now or timezone.now())
+
+
+def with_access_state(queryset, now=None):
+    """Annotate an Enrollment queryset with a boolean ``access_expired``."""
+    # CASE rather than a bare boolean expression: NULL expires_on must read as False
+    return queryset.annotate(
+        access_expired=Case(
+            When(expired_condition(now), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        )
+    )
+
+
+def sweep_expired_enrollments(batch_size=SWEEP_BATCH_SIZE, now=None):
+    """
+    Flag enrollments whose ``expires_on`` has passed and notify their
+    students, ``batch_size`` rows per transaction. Each batch is one
+    indexed SELECT (partial index on unflagged rows), one UPDATE and one
+    bulk INSERT of notifications. Returns the number of rows flagged.
+    """
+    from myapp.models import Enrollment, Notification
+
+    from .entitlements import invalidate_entitlements
+
+    now = now or timezone.now()
+    flagged = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Enrollment.objects.filter(is_expired=False, expires_on__lte=now)
+                .order_by("expires_on", "id")
+                .select_for_update(skip_locked=True, of=("self",))
+                .values_list("pk", "student_id", "course_id", "course__title")[:batch_size]
+            )
+            if not batch:
+                break
+
+            Enrollment.objects.filter(pk__in=[row[0] for row in batch]).update(is_expired=True)
+            Notification.objects.bulk_create(
+                Notification(
+                    recipient_id=student_id,
+                    title="Course access expired",
+                    message=f"Your access to {course_title} has expired. Renew to continue learning.",
+                    notif_type="expiry",
+                    url=f"/student/course/{course_id}",
+                    created_at=now,
+                )
+                for _, student_id, course_id, course_title in batch
+            )
+            # update() skips the Enrollment signals, so drop cached entitlements here
+            student_ids = {student_id for _, student_id, _, _ in batch}
+            transaction.on_commit(lambda ids=student_ids: invalidate_entitlements(*ids))
+        flagged += len(batch)
+        if len(batch) < batch_size:
+            break
+    return flagged
@@ -0,0 +1,117 @@
+# myapp/utils/analytics.py
+from django.db.models import Count, F, IntegerField, Q, Value
+from django.db.models.functions import Cast, Floor, Least
+
+
+HISTOGRAM_BUCKET = 10  # percentage points per progress bucket
+
+
+def _progress_histogram(enrollments):
+    rows = dict(
+        enrollments
+        .annotate(bucket=Least(Cast(Floor(F("progress") / HISTOGRAM_BUCKET), IntegerField()), Value(9)))
+        .values("bucket").annotate(n=Count("id"))
+        .values_list("bucket", "n")
+    )
+    return [
+        {"from": b * HISTOGRAM_BUCKET, "to": (b + 1) * HISTOGRAM_BUCKET, "students": rows.get(b, 0)}
+        for b in range(100 // HISTOGRAM_BUCKET)
+    ]
+
+
+def _module_funnel(course_id, student_ids):
+    """
+    Per module, in course order: how many enrolled students completed at
+    least one of its lessons, and how many completed all of them. Both are
+    grouped counts in the database (a HAVING subquery for "all").
+    """
+    from myapp.models import LessonCompletion, Module
+
+    modules = Module.objects.filter(course_id=course_id).annotate(lesson_count=Count("lessons")).order_by("order", "id")
+    funnel = []
+    for module in modules:
+        completions = LessonCompletion.objects.filter(lesson__module=module, student_id__in=student_ids)
+        per_student = completions.values("student_id").annotate(n=Count("lesson_id", distinct=True))
+        funnel.append({
+            "module_id": module.pk,
+            "title": module.title,
+            "order": module.order,
+            "lesson_count": module.lesson_count,
+            "students_started": per_student.count(),
+            "students_completed": per_student.filter(n__gte=module.lesson_count).count() if module.lesson_count else 0,
+        })
+    return funnel
+
+
+def _approval_rate(approved, rejected):
+    graded = approved + rejected
+    return round(approved / graded * 100, 2) if graded else None
+
+
+def _task_stats(course_id, student_ids):
+    from myapp.models import DailyTask, TaskSubmission
+
+    counters = {
+        "submissions": Count("id"),
+        "approved": Count("id", filter=Q(status="approved")),
+        "rejected": Count("id", filter=Q(status="rejected")),
+        "pending": Count("id", filter=Q(status="pending")),
+    }
+    submissions = TaskSubmission.objects.filter(task__course_id=course_id, student_id__in=student_ids)
+    totals = submissions.aggregate(**counters)
+    per_task = {
+        row["task_id"]: row
+        for row in submissions.values("task_id").annotate(**counters)
+    }
+
+    tasks = []
+    for pk, title in DailyTask.objects.filter(course_id=course_id).order_by("assigned_on", "id").values_list("pk", "title"):
+        row = per_task.get(pk, {})
+        approved, rejected = row.get("approved", 0), row.get("rejected", 0)
+        tasks.append({
+            "task_id": pk,
+            "title": title,
+            "submissions": row.get("submissions", 0),
+            "approved": approved,
+            "rejected": rejected,
+            "pending": row.get("pending", 0),
+            "approval_rate": _approval_rate(approved, rejected),
+        })
+
+    return {
+        **totals,
+        "approval_rate": _approval_rate(totals["approved"], totals["rejected"]),
+        "tasks": tasks,
+    }
+
+
+def compute_course_analytics(course_id):
+    """
+    Recompute and store the cohort rollup for one course. The query count
+    depends on the number of modules, not on the number of enrollments.
+    """
+    from myapp.models import CourseAnalytics, Enrollment
+
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    student_ids = enrollments.values("student_id")
+
+    analytics, _ = CourseAnalytics.objects.update_or_create(
+        course_id=course_id,
+        defaults={
+            "enrollment_count": enrollments.count(),
+            "progress_histogram": _progress_histogram(enrollments),
+            "module_funnel": _module_funnel(course_id, student_ids),
+            "task_stats": _task_stats(course_id, student_ids),
+        },
+    )
+    return analytics
+
+
+def rollup_all_course_analytics():
+    from myapp.models import Course
+
+    count = 0
+    for course_id in Course.objects.values_list("pk", flat=True).iterator():
+        compute_course_analytics(course_id)
+        count += 1
+    return count
@@ -0,0 +1,279 @@
+# myapp/utils/bulk_import.py
+import secrets
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+
+IMPORT_CHUNK_SIZE = 500
+REQUIRED_COLUMNS = {"username", "email"}
+
+CREATED, ENROLLED, ALREADY_ENROLLED, ERROR = "created", "enrolled", "already_enrolled", "error"
+
+
+def generate_password():
+    return secrets.token_urlsafe(9)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class EnrollmentImporter:
+    """
+    Create students and enroll them from CSV rows (``csv.DictReader``),
+    ``chunk_size`` rows at a time: one user lookup, one ``bulk_create`` for
+    new users, one for enrollments and one batched welcome-email job per
+    chunk. Only the current chunk is held in memory.
+
+    Columns: username, email, optional password / first_name / last_name /
+    course_id (``course_id`` falls back to the importer's ``course_id``).
+    ``hash_passwords`` maps raw passwords to hashes — pass a process pool's
+    ``map`` to spread the PBKDF2 work over several cores.
+
+    ``run()`` yields one result dict per row:
+    ``{"line", "username", "status", "detail"}``.
+    """
+
+    def __init__(self, course_id=None, chunk_size=IMPORT_CHUNK_SIZE, hash_passwords=None, send_emails=True):
+        self.course_id = course_id
+        self.chunk_size = chunk_size
+        self.hash_passwords = hash_passwords or (lambda raws: map(make_password, raws))
+        self.send_emails = send_emails
+        self.courses = {}  # id → course_duration_months, or None if missing
+        self.touched_course_ids = set()
+
+    def run(self, reader):
+        from .course_stats import rebuild_course_stats
+
+        missing = REQUIRED_COLUMNS - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"CSV is missing column(s): {', '.join(sorted(missing))}")
+
+        try:
+            rows = enumerate(reader, start=2)  # line 1 is the header
+            for chunk in chunked(rows, self.chunk_size):
+                yield from self._process_chunk(chunk)
+        finally:
+            # bulk_create skipped the Enrollment signals: refresh derived data once
+            if self.touched_course_ids:
+                from .course_page import rebuild_course_page
+
+                rebuild_course_stats(self.touched_course_ids)
+                for course_id in self.touched_course_ids:
+                    rebuild_course_page(course_id)
+
+    # ---------------------------------------------------------------
+    # Parsing
+    # ---------------------------------------------------------------
+
+    def _load_courses(self, course_ids):
+        from myapp.models import Course
+
+        unknown = {pk for pk in course_ids if pk not in self.courses}
+        if unknown:
+            found = dict(Course.objects.filter(pk__in=unknown).values_list("pk", "course_duration_months"))
+            for pk in unknown:
+                self.courses[pk] = found.get(pk)
+
+    def _parse(self, line, raw):
+        from myapp.models import User
+
+        username = (raw.get("username") or "").strip()
+        email = (raw.get("email") or "").strip().lower()
+        course_id = (raw.get("course_id") or "").strip() or self.course_id
+
+        if not username:
+            raise ValidationError("username is required")
+        User.username_validator(username)
+        if len(username) > 150:
+            raise ValidationError("username is longer than 150 characters")
+        validate_email(email)
+        try:
+            course_id = int(course_id)
+        except (TypeError, ValueError):
+            raise ValidationError("course_id is missing or not a number")
+
+        return {
+            "line": line,
+            "username": username,
+            "email": email,
+            "password": (raw.get("password") or "").strip(),
+            "first_name": (raw.get("first_name") or "").strip()[:150],
+            "last_name": (raw.get("last_name") or "").strip()[:150],
+            "course_id": course_id,
+        }
+
+    # ---------------------------------------------------------------
+    # One chunk
+    # ---------------------------------------------------------------
+
+    def _process_chunk(self, chunk):
+        from django.db.models import Q
+
+        from myapp.models import User
+        from myapp.tasks import send_student_welcome_emails
+
+        from .entitlements import invalidate_entitlements
+
+        results, rows = {}, []
+        for line, raw in chunk:
+            try:
+                rows.append(self._parse(line, raw))
+            except ValidationError as exc:
+                results[line] = self._result(line, raw.get("username"), ERROR, "; ".join(exc.messages))
+
+        self._load_courses({row["course_id"] for row in rows})
+        existing = User.objects.filter(
+            Q(username__in={row["username"] for row in rows}) | Q(email__in={row["email"] for row in rows})
+        ).values_list("pk", "username", "email")
+        by_username = {username: (pk, (email or "").lower()) for pk, username, email in existing}
+        by_email = {(email or "").lower(): username for _, username, email in existing if email}
+
+        new_users, new_emails, accepted = {}, {}, []
+        for row in rows:
+            line, username, email = row["line"], row["username"], row["email"]
+            if self.courses.get(row["course_id"]) is None:
+                results[line] = self._result(line, username, ERROR, f"course {row['course_id']} does not exist")
+            elif username in by_username and by_username[username][1] != email:
+                results[line] = self._result(line, username, ERROR, "username is registered with a different email")
+            elif username not in by_username and by_email.get(email, username) != username:
+                results[line] = self._result(line, username, ERROR, f"email already belongs to {by_email[email]}")
+            elif username in new_users and new_users[username]["email"] != email:
+                results[line] = self._result(line, username, ERROR, "same username with two emails in this file")
+            elif username not in by_username and new_emails.get(email, username) != username:
+                results[line] = self._result(line, username, ERROR, f"email already used by {new_emails[email]} in this file")
+            else:
+                if username not in by_username and username not in new_users:
+                    row["password"] = row["password"] or generate_password()
+                    new_users[username] = row
+                    new_emails[email] = username
+                accepted.append(row)
+
+        hashes = dict(zip(new_users, self.hash_passwords([row["password"] for row in new_users.values()])))
+        now = timezone.now()
+
+        try:
+            user_ids, pairs, already = self._write_chunk(accepted, new_users, hashes, now)
+            created_users = set(new_users)
+        except IntegrityError:
+            # A concurrent writer registered one of these usernames after the
+            # lookup: redo the chunk row by row so only the clashing rows fail.
+            user_ids, pairs, already, accepted, created_users = self._write_rows(
+                accepted, new_users, hashes, now, results
+            )
+
+        existing_ids = {pk for pk, _ in by_username.values()}
+        transaction.on_commit(lambda ids=existing_ids: invalidate_entitlements(*ids))
+        if self.send_emails and created_users:
+            recipients = [
+                {"username": row["username"], "email": row["email"], "raw_password": row["password"]}
+                for username, row in new_users.items() if username in created_users
+            ]
+            transaction.on_commit(lambda: send_student_welcome_emails.delay(recipients))
+
+        self.touched_course_ids |= {course_id for _, course_id in pairs - already}
+
+        created = set()
+        for row in accepted:
+            line, username = row["line"], row["username"]
+            if (user_ids[username], row["course_id"]) in already:
+                status = ALREADY_ENROLLED
+            elif username in created_users and username not in created:
+                status = CREATED
+                created.add(username)
+            else:
+                status = ENROLLED
+            results[line] = self._result(line, username, status, f"course {row['course_id']}")
+
+        for line, _ in chunk:
+            yield results[line]
+
+    # ---------------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------------
+
+    @staticmethod
+    def _new_user(row, password):
+        from myapp.models import User
+
+        return User(
+            username=row["username"], email=row["email"], password=password, role="student",
+            first_name=row["first_name"], last_name=row["last_name"],
+        )
+
+    def _enroll(self, pairs, now):
+        """Enroll the ``(student_id, course_id)`` pairs in one INSERT; returns those already enrolled."""
+        from myapp.models import Enrollment
+
+        already = set(
+            Enrollment.objects.filter(
+                student_id__in={student_id for student_id, _ in pairs},
+                course_id__in={course_id for _, course_id in pairs},
+            ).values_list("student_id", "course_id")
+        ) & pairs
+        Enrollment.objects.bulk_create(
+            [
+                Enrollment(
+                    student_id=student_id, course_id=course_id,
+                    expires_on=now + timedelta(days=self.courses[course_id] * 30),
+                )
+                for student_id, course_id in pairs - already
+            ],
+            ignore_conflicts=True,
+        )
+        return already
+
+    def _write_chunk(self, accepted, new_users, hashes, now):
+        """One INSERT for the new users, one for the enrollments. Returns ``(user_ids, pairs, already)``."""
+        from myapp.models import User
+
+        with transaction.atomic():
+            User.objects.bulk_create(self._new_user(row, hashes[username]) for username, row in new_users.items())
+            user_ids = dict(
+                User.objects.filter(username__in={row["username"] for row in accepted}).values_list("username", "pk")
+            )
+            pairs = {(user_ids[row["username"]], row["course_id"]) for row in accepted}
+            return user_ids, pairs, self._enroll(pairs, now)
+
+    def _write_rows(self, accepted, new_users, hashes, now, results):
+        """
+        Fallback for a chunk that hit an IntegrityError: one savepoint per
+        row, failures reported on their own line. Returns ``(user_ids,
+        pairs, already, written rows, created usernames)``.
+        """
+        from myapp.models import User
+
+        user_ids, pairs, already, written, created_users = {}, set(), set(), [], set()
+        for row in accepted:
+            line, username = row["line"], row["username"]
+            student_id, created = user_ids.get(username), False
+            try:
+                with transaction.atomic():
+                    if student_id is None and username in new_users:
+                        student_id = User.objects.bulk_create([self._new_user(row, hashes[username])])[0].pk
+                        created = True
+                    elif student_id is None:
+                        student_id = User.objects.values_list("pk", flat=True).get(username=username)
+                    pair = (student_id, row["course_id"])
+                    already |= self._enroll({pair}, now)
+            except (IntegrityError, User.DoesNotExist):
+                results[line] = self._result(line, username, ERROR, "username was taken by another writer during the import")
+                continue
+            user_ids[username] = student_id
+            if created:
+                created_users.add(username)
+            pairs.add(pair)
+            written.append(row)
+        return user_ids, pairs, already, written, created_users
+
+    @staticmethod
+    def _result(line, username, status, detail=""):
+        return {"line": line, "username": username or "", "status": status, "detail": detail}
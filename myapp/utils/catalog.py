@@ -0,0 +1,93 @@
+# myapp/utils/catalog.py
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATALOG_TTL = 60 * 60 * 24
+
+
+def _seed_version():
+    # Seeded from the clock so a version key lost to eviction/flush never
+    # comes back as a number that older cached pages were stored under.
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    """A cache-held version counter, created on first use."""
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _seed_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _seed_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog page at once. Old entries are never
+    deleted — they simply stop being addressed and expire on their own.
+    """
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def make_etag(*parts):
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH", "")
+    if not header:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates or "*" in candidates
+
+
+class CatalogEntry:
+    """Pre-rendered anonymous catalog body plus its ETag and extra headers."""
+
+    def __init__(self, body, etag, headers=None):
+        self.body = body
+        self.etag = etag
+        self.headers = headers or {}
+
+    def payload(self):
+        return json.loads(self.body)
+
+
+def get_catalog_entry(request, build, scope="", timeout=CATALOG_TTL):
+    """
+    Return the cached catalog for the current version, rendering it with
+    ``build()`` only on a miss. ``build()`` returns ``(data, headers)`` for
+    an anonymous user; ``scope`` distinguishes pages/query variants.
+    """
+    version = get_catalog_version()
+    scope_digest = hashlib.md5(f"{request.get_host()}|{scope}".encode()).hexdigest()
+    key = f"catalog:v{version}:{scope_digest}"
+
+    cached = cache.get(key)
+    if cached is not None:
+        return CatalogEntry(*cached)
+
+    data, headers = build()
+    body = JSONRenderer().render(data)
+    etag = make_etag(version, hashlib.md5(body).hexdigest())
+    cache.set(key, (body, etag, headers), timeout=timeout)
+    return CatalogEntry(body, etag, headers)
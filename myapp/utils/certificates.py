@@ -0,0 +1,259 @@
+# myapp/utils/certificates.py
+import io
+import multiprocessing
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef, Q
+from PIL import Image, ImageDraw, ImageFont
+
+
+PAGE_SIZE = (1754, 1240)  # A4 landscape at 150 dpi
+PAGE_DPI = 150
+QR_SIZE = 260
+COMPLETED_PROGRESS = 100
+
+VERIFY_TTL = 60 * 60 * 24
+VERIFY_MISS_TTL = 60  # unknown ids: short, so a fresh certificate shows up quickly
+_MISSING = "missing"
+
+
+def new_certificate_id():
+    return f"CF-{secrets.token_hex(6).upper()}"
+
+
+def verification_url(certificate_id):
+    return f"{settings.CERTIFICATE_VERIFY_BASE_URL.rstrip('/')}/api/certificates/verify/{certificate_id}/"
+
+
+def pdf_name(certificate_id):
+    return f"certificates/{certificate_id}.pdf"
+
+
+# ---------------------------------------------------------------
+# Rendering (no database access: safe to run in a process pool)
+# ---------------------------------------------------------------
+
+def _centered(draw, y, text, size, fill):
+    font = ImageFont.load_default(size=size)
+    width = draw.textlength(text, font=font)
+    draw.text(((PAGE_SIZE[0] - width) / 2, y), text, font=font, fill=fill)
+
+
+def render_certificate_pdf(context):
+    """
+    One-page PDF for a certificate ``context`` (see ``certificate_contexts``)
+    with a QR code pointing at its verification URL. Returns the PDF bytes.
+    """
+    page = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(page)
+    width, height = PAGE_SIZE
+
+    draw.rectangle((40, 40, width - 40, height - 40), outline="#2563eb", width=8)
+    draw.rectangle((64, 64, width - 64, height - 64), outline="#9333ea", width=3)
+
+    _centered(draw, 170, "CodiFi", 64, "#9333ea")
+    _centered(draw, 290, "Certificate of Completion", 80, "#111827")
+    _centered(draw, 440, "This certifies that", 36, "#374151")
+    _centered(draw, 510, context["student_name"], 72, "#1e3a8a")
+    _centered(draw, 640, "has successfully completed", 36, "#374151")
+    _centered(draw, 710, context["course_title"], 56, "#111827")
+    if context.get("instructor_name"):
+        _centered(draw, 810, f"Instructor: {context['instructor_name']}", 32, "#6b7280")
+
+    footer = ImageFont.load_default(size=28)
+    draw.text((140, height - 240), f"Issued on {context['issue_date']}", font=footer, fill="#374151")
+    draw.text((140, height - 190), f"Certificate ID: {context['certificate_id']}", font=footer, fill="#374151")
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=2)
+    qr.add_data(context["verify_url"])
+    qr.make(fit=True)
+    code = qr.make_image(fill_color="black", back_color="white").get_image().convert("RGB")
+    page.paste(code.resize((QR_SIZE, QR_SIZE), Image.NEAREST), (width - 140 - QR_SIZE, height - 140 - QR_SIZE))
+
+    buffer = io.BytesIO()
+    page.save(buffer, "PDF", resolution=PAGE_DPI)
+    return buffer.getvalue()
+
+
+def render_job(context):
+    """Pool entry point: ``(pk, pdf bytes or None, error or None)``."""
+    try:
+        return context["pk"], render_certificate_pdf(context), None
+    except Exception as exc:  # one bad row must not stop a batch
+        return context["pk"], None, f"{type(exc).__name__}: {exc}"
+
+
+# ---------------------------------------------------------------
+# Issuing
+# ---------------------------------------------------------------
+
+def completed_without_certificate(course_id=None, student_id=None):
+    """Enrollments at 100% whose student has no certificate for the course yet."""
+    from myapp.models import Certificate, Enrollment
+
+    enrollments = Enrollment.objects.filter(progress__gte=COMPLETED_PROGRESS).exclude(
+        Exists(Certificate.objects.filter(student_id=OuterRef("student_id"), course_id=OuterRef("course_id")))
+    )
+    if course_id is not None:
+        enrollments = enrollments.filter(course_id=course_id)
+    if student_id is not None:
+        enrollments = enrollments.filter(student_id=student_id)
+    return enrollments
+
+
+def issue_certificates(pairs):
+    """
+    Create the missing Certificate rows for ``(student_id, course_id)``
+    pairs in one INSERT. Returns ``(created, pks)``: how many rows were
+    actually inserted, and the pks of all their certificates that still
+    need a PDF.
+    """
+    from myapp.models import Certificate
+
+    pairs = set(pairs)
+    if not pairs:
+        return 0, []
+    certificates = [
+        Certificate(student_id=student_id, course_id=course_id, certificate_id=new_certificate_id())
+        for student_id, course_id in pairs
+    ]
+    Certificate.objects.bulk_create(certificates, ignore_conflicts=True)  # (student, course) is unique
+    # Skipped rows never got their fresh ids, so this counts real inserts
+    created = Certificate.objects.filter(
+        certificate_id__in=[certificate.certificate_id for certificate in certificates]
+    ).count()
+
+    match = Q()
+    for student_id, course_id in pairs:
+        match |= Q(student_id=student_id, course_id=course_id)
+    return created, list(pending_certificates().filter(match).values_list("pk", flat=True))
+
+
+def pending_certificates():
+    from myapp.models import Certificate
+
+    return Certificate.objects.filter(Q(pdf="") | Q(pdf__isnull=True))
+
+
+def certificate_contexts(pks):
+    from myapp.models import Certificate
+
+    rows = Certificate.objects.filter(pk__in=pks).values(
+        "pk", "certificate_id", "issue_date",
+        "student__username", "student__first_name", "student__last_name",
+        "course__title", "course__instructor__username",
+        "course__instructor__first_name", "course__instructor__last_name",
+    )
+    return [
+        {
+            "pk": row["pk"],
+            "certificate_id": row["certificate_id"],
+            "issue_date": row["issue_date"].strftime("%d %B %Y"),
+            "student_name": _full_name(row, "student__"),
+            "course_title": row["course__title"],
+            "instructor_name": _full_name(row, "course__instructor__"),
+            "verify_url": verification_url(row["certificate_id"]),
+        }
+        for row in rows
+    ]
+
+
+def _full_name(row, prefix):
+    name = f"{row[prefix + 'first_name'] or ''} {row[prefix + 'last_name'] or ''}".strip()
+    return name or row[prefix + "username"] or ""
+
+
+def save_certificate_pdf(pk, certificate_id, pdf):
+    from myapp.models import Certificate
+
+    name = default_storage.save(pdf_name(certificate_id), ContentFile(pdf))
+    Certificate.objects.filter(pk=pk).update(pdf=name)
+    forget_certificate(certificate_id)
+
+
+@contextmanager
+def render_map(workers=None, jobs=None):
+    """
+    The ``map_fn`` for ``render_certificates``: a process pool's ``map``
+    when more than one worker (and job) is useful, the builtin otherwise.
+    Daemonic processes (Celery's prefork children) may not start a pool of
+    their own, so they render inline.
+    """
+    workers = settings.CERTIFICATE_RENDER_WORKERS if workers is None else workers
+    if jobs is not None:
+        workers = min(workers, jobs)
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        yield map
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield pool.map
+
+
+def render_certificates(pks, map_fn=map):
+    """
+    Render and store PDFs for the given certificates. ``map_fn`` runs
+    ``render_job`` over the contexts — pass a process pool's ``map`` to
+    spread the rasterising over several cores. Returns ``(rendered, errors)``.
+    """
+    contexts = certificate_contexts(pks)
+    certificate_ids = {context["pk"]: context["certificate_id"] for context in contexts}
+
+    rendered, errors = 0, []
+    for pk, pdf, error in map_fn(render_job, contexts):
+        if error:
+            errors.append((certificate_ids[pk], error))
+            continue
+        save_certificate_pdf(pk, certificate_ids[pk], pdf)
+        rendered += 1
+    return rendered, errors
+
+
+# ---------------------------------------------------------------
+# Verification lookup
+# ---------------------------------------------------------------
+
+def _verify_key(certificate_id):
+    return f"certificate:{certificate_id}"
+
+
+def get_certificate_verification(certificate_id):
+    """The public verification record for a certificate id, or None. Cached, misses included."""
+    from myapp.models import Certificate
+
+    cached = cache.get(_verify_key(certificate_id))
+    if cached is not None:
+        return None if cached == _MISSING else cached
+
+    row = (
+        Certificate.objects.filter(certificate_id=certificate_id)
+        .values(
+            "certificate_id", "issue_date", "pdf",
+            "student__username", "student__first_name", "student__last_name", "course_id", "course__title",
+        )
+        .first()
+    )
+    if row is None:
+        cache.set(_verify_key(certificate_id), _MISSING, timeout=VERIFY_MISS_TTL)
+        return None
+
+    record = {
+        "certificate_id": row["certificate_id"],
+        "student": _full_name(row, "student__"),
+        "course_id": row["course_id"],
+        "course_title": row["course__title"],
+        "issue_date": row["issue_date"].isoformat(),
+        "pdf": default_storage.url(row["pdf"]) if row["pdf"] else None,
+    }
+    cache.set(_verify_key(certificate_id), record, timeout=VERIFY_TTL)
+    return record
+
+
+def forget_certificate(certificate_id):
+    cache.delete(_verify_key(certificate_id))
@@ -0,0 +1,97 @@
+# myapp/utils/course_page.py
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from myapp.utils.images import FORMATS
+
+
+COURSE_PAGE_TTL = 60 * 60 * 6  # safety net if a rebuild is ever missed
+REVIEWS_PAGE_SIZE = 10
+
+
+def course_page_key(course_id):
+    return f"course_page:{course_id}"
+
+
+def build_course_page(course_id):
+    """
+    Render the request-independent part of a course page: the course as an
+    anonymous user sees it, modules with their lessons in order, the rating
+    summary and the first page of reviews. Returns None if the course is gone.
+    """
+    from myapp.models import Course, Feedback, Lesson, Module
+    from myapp.pagination import KeysetPagination
+    from myapp.serializers import CourseSerializer, FeedbackSerializer, ModuleSerializer
+    from myapp.utils.course_stats import get_stats
+    from myapp.utils.offers import OfferContext
+
+    course = Course.objects.select_related("instructor", "stats").filter(pk=course_id).first()
+    if course is None:
+        return None
+
+    modules = (
+        Module.objects.filter(course=course)
+        .order_by("order")
+        .prefetch_related(Prefetch("lessons", queryset=Lesson.objects.order_by("order")))
+    )
+
+    reviews = list(
+        Feedback.objects.filter(course=course)
+        .select_related("student")
+        .order_by("-created_at", "-id")[:REVIEWS_PAGE_SIZE + 1]
+    )
+    next_cursor = None
+    if len(reviews) > REVIEWS_PAGE_SIZE:
+        reviews = reviews[:REVIEWS_PAGE_SIZE]
+        last = reviews[-1]
+        next_cursor = KeysetPagination().encode_cursor(last.created_at, last.pk)
+
+    stats = get_stats(course)
+
+    return {
+        "course": CourseSerializer(course, context={"offer_context": OfferContext()}).data,
+        "modules": ModuleSerializer(modules, many=True).data,
+        "rating": {
+            "average": stats.average_rating,
+            "count": stats.review_count,
+            "histogram": stats.histogram,
+        },
+        "enrollment_count": stats.enrollment_count,
+        "reviews": FeedbackSerializer(reviews, many=True).data,
+        "reviews_next_cursor": next_cursor,
+    }
+
+
+def rebuild_course_page(course_id):
+    document = build_course_page(course_id)
+    if document is None:
+        cache.delete(course_page_key(course_id))
+    else:
+        cache.set(course_page_key(course_id), document, timeout=COURSE_PAGE_TTL)
+    return document
+
+
+def get_course_page(course_id):
+    """One cache read; builds inline only on a cold miss."""
+    document = cache.get(course_page_key(course_id))
+    if document is None:
+        document = rebuild_course_page(course_id)
+    return document
+
+
+def absolutize_media(document, request):
+    """
+    Documents are built outside any request, so file fields hold relative
+    /media/ paths; turn them into absolute URLs for this request's host.
+    """
+    def absolute(url):
+        return request.build_absolute_uri(url) if url and url.startswith("/") else url
+
+    document["course"]["image"] = absolute(document["course"].get("image"))
+    for variant in (document["course"].get("image_srcset") or {}).values():
+        for fmt in FORMATS:
+            variant[fmt] = absolute(variant.get(fmt))
+    for module in document["modules"]:
+        for lesson in module["lessons"]:
+            lesson["pdf_file"] = absolute(lesson.get("pdf_file"))
+    return document
@@ -0,0 +1,94 @@
+# myapp/utils/course_stats.py
+from django.db.models import Count, F, Q, Sum
+
+
+def rating_bucket(rating):
+    """Histogram bucket (1–5) for a stored rating."""
+    return min(max(int(rating or 0), 1), 5)
+
+
+def apply_stats_delta(course_id, **deltas):
+    """
+    Atomically add ``deltas`` (field → +/-n) to a course's counters with a
+    single UPDATE ... SET f = f + n, creating the row on first use.
+    Pure decrements never create a row: during a course delete cascade the
+    stats row may already be gone, and recreating it would dangle.
+    """
+    from myapp.models import CourseStats
+
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not course_id or not updates:
+        return
+
+    if not CourseStats.objects.filter(course_id=course_id).update(**updates):
+        if all(delta < 0 for delta in deltas.values() if delta):
+            return
+        CourseStats.objects.get_or_create(course_id=course_id)
+        CourseStats.objects.filter(course_id=course_id).update(**updates)
+
+
+def review_delta(rating, sign):
+    return {
+        "review_count": sign,
+        "rating_sum": sign * int(rating or 0),
+        f"rating_{rating_bucket(rating)}": sign,
+    }
+
+
+def get_stats(course):
+    """The course's counters, or an unsaved zero row if none exist yet."""
+    from myapp.models import CourseStats
+
+    try:
+        return course.stats
+    except CourseStats.DoesNotExist:
+        return CourseStats(course=course)
+
+
+def rebuild_course_stats(course_ids=None):
+    """Recompute every counter from the source tables (fixes drift)."""
+    from myapp.models import Course, CourseStats, Enrollment, Feedback
+
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    ids = list(courses.values_list("pk", flat=True))
+
+    enrollments = dict(
+        Enrollment.objects.filter(course_id__in=ids)
+        .values("course_id").annotate(n=Count("id"))
+        .values_list("course_id", "n")
+    )
+    reviews = {
+        row["course_id"]: row
+        for row in Feedback.objects.filter(course_id__in=ids)
+        .values("course_id")
+        .annotate(
+            review_count=Count("id"),
+            rating_sum=Sum("rating"),
+            rating_1=Count("id", filter=Q(rating__lte=1)),
+            rating_2=Count("id", filter=Q(rating=2)),
+            rating_3=Count("id", filter=Q(rating=3)),
+            rating_4=Count("id", filter=Q(rating=4)),
+            rating_5=Count("id", filter=Q(rating__gte=5)),
+        )
+    }
+
+    counter_fields = ["review_count", "rating_sum"] + [f"rating_{star}" for star in range(1, 6)]
+    rows = []
+    for course_id in ids:
+        review_row = reviews.get(course_id, {})
+        rows.append(CourseStats(
+            course_id=course_id,
+            enrollment_count=enrollments.get(course_id, 0),
+            **{field: review_row.get(field) or 0 for field in counter_fields},
+        ))
+
+    CourseStats.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["course"],
+        update_fields=["enrollment_count"] + counter_fields,
+    )
+    return len(rows)
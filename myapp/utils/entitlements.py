@@ -0,0 +1,172 @@
+# myapp/utils/entitlements.py
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+
+from .access import ACCESS_ACTIVE, ACCESS_EXPIRED, ACCESS_NONE
+
+
+ENTITLEMENTS_TTL = 60 * 60
+LOCAL_MAX_USERS = 2048
+
+
+def _version_key(user_id):
+    return f"entitlements:{user_id}:version"
+
+
+def _data_key(user_id, version):
+    return f"entitlements:{user_id}:{version}"
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _timestamp(value):
+    return value.timestamp() if value else None
+
+
+class Entitlements:
+    """
+    What one user is enrolled in: course id → (enrolled_on, expires_on) as
+    epoch seconds. ``expires_on`` is None for lifetime access and 0 once
+    the expiry sweeper has flagged the enrollment.
+    """
+
+    def __init__(self, courses):
+        self.courses = courses
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls({
+            course_id: (_timestamp(enrolled_on), 0.0 if is_expired else _timestamp(expires_on))
+            for course_id, enrolled_on, expires_on, is_expired in rows
+        })
+
+    @classmethod
+    def for_request(cls, request):
+        """Resolve once per request; every later check is a dict lookup."""
+        user = getattr(request, "user", None)
+        if not user or not user.is_authenticated:
+            return cls({})
+
+        entitlements = getattr(request, "_entitlements", None)
+        if entitlements is None:
+            entitlements = get_entitlements(user.pk)
+            request._entitlements = entitlements
+        return entitlements
+
+    @property
+    def course_ids(self):
+        return self.courses.keys()
+
+    def is_enrolled(self, course_id):
+        return course_id in self.courses
+
+    def state(self, course_id, now=None):
+        entry = self.courses.get(course_id)
+        if entry is None:
+            return ACCESS_NONE
+        expires_at = entry[1]
+        if expires_at is not None and expires_at <= (now or time.time()):
+            return ACCESS_EXPIRED
+        return ACCESS_ACTIVE
+
+    def has_access(self, course_id):
+        return self.state(course_id) == ACCESS_ACTIVE
+
+    @property
+    def first_enrolled_at(self):
+        if not self.courses:
+            return None
+        earliest = min(enrolled_at for enrolled_at, _ in self.courses.values())
+        return datetime.fromtimestamp(earliest, tz=dt_timezone.utc)
+
+
+class LocalLRU:
+    """Small thread-safe LRU of user id → (version, Entitlements)."""
+
+    def __init__(self, max_size=LOCAL_MAX_USERS):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+local_entitlements = LocalLRU()
+
+
+def _load(user_id):
+    from myapp.models import Enrollment
+
+    return Entitlements.from_rows(
+        Enrollment.objects.filter(student_id=user_id)
+        .values_list("course_id", "enrolled_on", "expires_on", "is_expired")
+    )
+
+
+def get_entitlements(user_id):
+    """
+    Two tiers in front of one Enrollment query:
+
+    1. the shared cache holds a small per-user version stamp plus the data
+       stored under that version;
+    2. this process keeps the decoded data for recently seen users and
+       reuses it while the version stamp is unchanged.
+
+    A warm check is one tiny cache GET. Invalidation just replaces the
+    stamp, so every process sees it on its next check, and data written by
+    a racing reader under the old stamp is never read again.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is not None:
+        local = local_entitlements.get(user_id)
+        if local is not None and local[0] == version:
+            return local[1]
+
+        courses = cache.get(_data_key(user_id, version))
+        if courses is not None:
+            entitlements = Entitlements(courses)
+            local_entitlements.put(user_id, (version, entitlements))
+            return entitlements
+
+    if version is None:
+        # Stamp before loading: an invalidation during the load replaces
+        # this stamp, so what we store below is never read under it.
+        cache.add(_version_key(user_id), _new_version(), timeout=ENTITLEMENTS_TTL)
+        version = cache.get(_version_key(user_id))
+    entitlements = _load(user_id)
+    if version is not None:
+        cache.set(_data_key(user_id, version), entitlements.courses, timeout=ENTITLEMENTS_TTL)
+        local_entitlements.put(user_id, (version, entitlements))
+    return entitlements
+
+
+def invalidate_entitlements(*user_ids):
+    user_ids = [user_id for user_id in user_ids if user_id]
+    if not user_ids:
+        return
+    cache.set_many({_version_key(user_id): _new_version() for user_id in user_ids}, timeout=ENTITLEMENTS_TTL)
+    for user_id in user_ids:
+        local_entitlements.pop(user_id)
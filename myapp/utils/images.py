@@ -0,0 +1,152 @@
+# myapp/utils/images.py
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+# name → bounding box; images are only ever scaled down, aspect ratio kept
+VARIANTS = {
+    "thumb": (160, 160),
+    "card": (480, 270),
+    "hero": (1280, 720),
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+# target → (model label, image field, variants field)
+IMAGE_TARGETS = {
+    "course": ("myapp.Course", "image", "image_variants"),
+    "user": ("myapp.User", "profile_picture", "profile_picture_variants"),
+}
+
+
+def variant_name(name, variant, fmt):
+    """courses/intro.png → courses/intro__card.webp (stored next to the original)."""
+    root, _ = os.path.splitext(name)
+    return f"{root}__{variant}.{EXTENSIONS[fmt]}"
+
+
+def _encode(image, fmt):
+    pil_format, options = FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode != "RGB":
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Write every VARIANTS × FORMATS rendition of the stored image ``name`` and
+    return the map kept on the model:
+    ``{"source": name, "card": {"width": 480, "webp": "...", "jpeg": "..."}, ...}``.
+    """
+    with storage.open(name, "rb") as handle:
+        original = ImageOps.exif_transpose(Image.open(handle))
+        original.load()
+
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "transparency" in original.info else "RGB")
+
+    variants = {"source": name}
+    for variant, box in VARIANTS.items():
+        resized = original.copy()
+        resized.thumbnail(box, Image.Resampling.LANCZOS)
+        entry = {"width": resized.width}
+        for fmt in FORMATS:
+            target = variant_name(name, variant, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            entry[fmt] = storage.save(target, ContentFile(_encode(resized, fmt)))
+        variants[variant] = entry
+    return variants
+
+
+def delete_variants(variants, storage=default_storage):
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            name = (variants.get(variant) or {}).get(fmt)
+            if name and storage.exists(name):
+                storage.delete(name)
+
+
+def needs_variants(field_file, variants):
+    return bool(field_file) and (variants or {}).get("source") != field_file.name
+
+
+def process_image(target, pk, refresh=True):
+    """
+    (Re)generate variants for one row if its image changed since the last
+    run. Saves via ``update()`` so no post_save handlers fire again.
+    Returns True if variants were written; ``refresh=False`` leaves cached
+    catalog/course-page documents for the caller to refresh in bulk.
+    """
+    from django.apps import apps
+
+    model_label, image_field, variants_field = IMAGE_TARGETS[target]
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).only(image_field, variants_field).first()
+    if obj is None:
+        return False
+
+    field_file, previous = getattr(obj, image_field), getattr(obj, variants_field) or {}
+    if not needs_variants(field_file, previous):
+        return False
+
+    variants = generate_variants(field_file.name, storage=field_file.storage)
+    model.objects.filter(pk=pk, **{image_field: field_file.name}).update(**{variants_field: variants})
+    if previous.get("source"):
+        delete_variants(previous, storage=field_file.storage)
+
+    if refresh:
+        refresh_cached_documents(target, [pk])
+    return True
+
+
+def refresh_cached_documents(target, pks):
+    # srcset maps are part of the cached catalog, directory and course pages;
+    # student avatars appear in none of them, so they leave the caches alone
+    from myapp.models import User
+
+    from .catalog import bump_catalog_version
+    from .course_page import rebuild_course_page
+
+    if target == "course":
+        bump_catalog_version()
+        for pk in pks:
+            rebuild_course_page(pk)
+    elif User.objects.filter(pk__in=pks, role="instructor").exists():
+        bump_catalog_version()
+
+
+def srcset(field_file, variants, request=None):
+    """
+    ``{"thumb": {"width": 160, "webp": url, "jpeg": url}, ...}`` for the
+    current image, or None until its variants have been generated.
+    """
+    if not field_file or needs_variants(field_file, variants):
+        return None
+
+    storage = field_file.storage
+
+    def url(name):
+        value = storage.url(name)
+        return request.build_absolute_uri(value) if request is not None else value
+
+    return {
+        variant: {"width": variants[variant]["width"], **{fmt: url(variants[variant][fmt]) for fmt in FORMATS}}
+        for variant in VARIANTS
+        if variant in variants
+    }
@@ -0,0 +1,235 @@
+# myapp/utils/offers.py
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.core.cache import cache
+from django.utils import timezone
+
+
+OFFER_WINDOW = timedelta(days=7)
+FIRST_ENROLLMENT_PERCENT = 20
+OFFER_FIELDS = ("has_offer", "discount_price", "offer_expires")
+OFFER_BASE_FIELDS = ("id", "price")  # what apply_to reads from a row
+
+ACTIVE_OFFER_KEY = "pricing:active_offer"
+FIRST_ENROLLMENT, SITE_OFFER = "first_enrollment", "offer"
+CENT = Decimal("0.01")
+
+
+def apply_discount(price, percent):
+    """``price`` less ``percent`` %, in Decimal, rounded half-up to paise."""
+    price = Decimal(str(price))
+    return (price * (100 - Decimal(percent)) / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def get_active_offer():
+    """
+    The site-wide ``Offer`` that applies right now — the newest active one,
+    as before — as ``(id, title, percent)`` or None (also when that offer
+    is 0%). Cached until an Offer changes (see signals).
+    """
+    cached = cache.get(ACTIVE_OFFER_KEY)
+    if cached is None:
+        from myapp.models import Offer
+
+        row = (
+            Offer.objects.filter(is_active=True)
+            .order_by("-created_at", "-pk")
+            .values_list("pk", "title", "discount_percent")
+            .first()
+        )
+        cached = (row[0], row[1], min(row[2], 100)) if row and row[2] > 0 else ()
+        cache.set(ACTIVE_OFFER_KEY, cached, timeout=None)
+    return cached or None
+
+
+def forget_active_offer():
+    cache.delete(ACTIVE_OFFER_KEY)
+
+
+class Quote:
+    """The price one user pays for one course, and why."""
+
+    __slots__ = ("course_id", "price", "final_price", "discount_percent", "source", "offer_id", "offer_expires")
+
+    def __init__(self, course_id, price, final_price, discount_percent=0, source=None, offer_id=None, offer_expires=None):
+        self.course_id = course_id
+        self.price = price
+        self.final_price = final_price
+        self.discount_percent = discount_percent
+        self.source = source
+        self.offer_id = offer_id
+        self.offer_expires = offer_expires
+
+    @property
+    def discounted(self):
+        return self.source is not None
+
+    def as_dict(self):
+        return {
+            "course_id": self.course_id,
+            "price": f"{self.price}",
+            "final_price": f"{self.final_price}",
+            "discount_percent": self.discount_percent,
+            "source": self.source,
+            "offer_id": self.offer_id,
+            "offer_expires": self.offer_expires,
+        }
+
+
+class OfferContext:
+    """
+    Per-request pricing snapshot: everything a final price depends on.
+
+    The user's enrollments come from the entitlement cache (course ids +
+    the earliest enrolled_on) and the site-wide offer from
+    ``get_active_offer``, so pricing N courses costs no per-course query.
+    Both lookups run lazily, on the first price/offer check, so responses
+    that omit the offer fields never pay for them.
+
+    A course gets the larger of the 7-day first-enrollment discount (not on
+    courses the user already owns) and the active site-wide offer; the two
+    never stack. Every caller — catalog, course page, serializers,
+    checkout, batch quotes — prices through ``quote()``.
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self._loaded = False
+        self._first_enrolled_at = None
+        self._enrolled_course_ids = frozenset()
+        self._site_offer = False  # not loaded yet; None once loaded and absent
+
+    def _load(self):
+        self._loaded = True
+        user = self.user
+        if not user or not user.is_authenticated:
+            return
+
+        from .entitlements import get_entitlements
+
+        entitlements = get_entitlements(user.pk)
+        self._enrolled_course_ids = frozenset(entitlements.course_ids)
+        self._first_enrolled_at = entitlements.first_enrolled_at
+
+    @property
+    def first_enrolled_at(self):
+        if not self._loaded:
+            self._load()
+        return self._first_enrolled_at
+
+    @property
+    def enrolled_course_ids(self):
+        if not self._loaded:
+            self._load()
+        return self._enrolled_course_ids
+
+    @property
+    def site_offer(self):
+        if self._site_offer is False:
+            self._site_offer = get_active_offer()
+        return self._site_offer
+
+    @classmethod
+    def for_request(cls, request):
+        """Build the context once and memoize it on the request object."""
+        if request is None:
+            return cls()
+
+        context = getattr(request, "_offer_context", None)
+        if context is None:
+            context = cls(getattr(request, "user", None))
+            request._offer_context = context
+        return context
+
+    @property
+    def offer_end(self):
+        if not self.first_enrolled_at:
+            return None
+        return self.first_enrolled_at + OFFER_WINDOW
+
+    def first_enrollment_offer_for(self, course_id):
+        # ❌ no enrollment yet → no first-enrollment offer anywhere
+        if not self.first_enrolled_at:
+            return False
+
+        # ❌ already enrolled in THIS course → no offer
+        if course_id in self.enrolled_course_ids:
+            return False
+
+        return timezone.now() <= self.offer_end
+
+    def _best_discount(self, course_id):
+        """``(percent, source, offer_id)`` of the discount that applies, or None."""
+        best = None
+        if self.first_enrollment_offer_for(course_id):
+            best = (FIRST_ENROLLMENT_PERCENT, FIRST_ENROLLMENT, None)
+        site_offer = self.site_offer
+        if site_offer and (best is None or site_offer[2] > best[0]):
+            best = (site_offer[2], SITE_OFFER, site_offer[0])
+        return best
+
+    def quote(self, course_id, price):
+        price = Decimal(str(price))
+        best = self._best_discount(course_id)
+        if best is None:
+            return Quote(course_id, price, price)
+
+        percent, source, offer_id = best
+        return Quote(
+            course_id, price, apply_discount(price, percent), percent, source, offer_id,
+            self.offer_expires() if source == FIRST_ENROLLMENT else None,
+        )
+
+    def quotes(self, prices):
+        """Batch variant: ``[(course_id, price), ...]`` → quotes, resolved from memory."""
+        return [self.quote(course_id, price) for course_id, price in prices]
+
+    def quote_courses(self, course_ids):
+        """Quotes for course ids (one price query); unknown ids are skipped."""
+        from myapp.models import Course
+
+        prices = dict(Course.objects.filter(pk__in=course_ids).values_list("pk", "price"))
+        return self.quotes((course_id, prices[course_id]) for course_id in course_ids if course_id in prices)
+
+    def final_price(self, course):
+        return self.quote(course.pk, course.price).final_price
+
+    def has_offer_for(self, course_id):
+        return self._best_discount(course_id) is not None
+
+    def has_offer(self, course):
+        return self.has_offer_for(course.pk)
+
+    def discount_price(self, course):
+        quote = self.quote(course.pk, course.price)
+        return quote.final_price if quote.discounted else None
+
+    def offer_expires(self):
+        offer_end = self.offer_end
+        return offer_end.isoformat() if offer_end else None
+
+    def fingerprint(self):
+        """Everything that can change this user's offer fields (used in ETags)."""
+        site_offer = self.site_offer
+        site = f"{site_offer[0]}:{site_offer[2]}" if site_offer else "-"
+        if not self.first_enrolled_at:
+            return f"none|{site}"
+        active = timezone.now() <= self.offer_end
+        ids = ",".join(str(i) for i in sorted(self.enrolled_course_ids))
+        return f"{self.first_enrolled_at.isoformat()}|{int(active)}|{ids}|{site}"
+
+    def apply_to(self, row):
+        """
+        Overlay the per-user offer fields onto a pre-rendered course dict.
+        Only fields already present (i.e. not trimmed by ?fields=) are set;
+        the row must still carry ``OFFER_BASE_FIELDS`` — trim those after.
+        """
+        if "has_offer" in row:
+            row["has_offer"] = self.has_offer_for(row["id"])
+        if "discount_price" in row:
+            quote = self.quote(row["id"], row["price"])
+            row["discount_price"] = f"{quote.final_price}" if quote.discounted else None
+        if "offer_expires" in row:
+            row["offer_expires"] = self.offer_expires()
+        return row
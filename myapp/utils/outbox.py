@@ -0,0 +1,77 @@
+# myapp/utils/outbox.py
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+OUTBOX_BATCH_SIZE = 100
+MAX_ATTEMPTS = 10  # after this many broker failures an event is left for a human
+
+# topic → Celery task that consumes it; the event payload is the task's kwargs
+HANDLERS = {
+    "payment.succeeded": "myapp.tasks.send_payment_success_email",
+    "payment.webhook_received": "myapp.tasks.process_payment_webhook",
+    "enrollment.created": "myapp.tasks.refresh_course_page",
+    "course.changed": "myapp.tasks.refresh_course_page",
+    "task.assigned": "myapp.tasks.notify_task_assigned",
+}
+
+
+def publish(topic, **payload):
+    """
+    Record a side effect in the caller's transaction. Nothing reaches the
+    broker until ``relay_outbox`` runs after commit, so a rollback takes
+    the event with it and the transaction never waits on the broker.
+    """
+    from myapp.models import OutboxEvent
+
+    if topic not in HANDLERS:
+        raise ValueError(f"Unknown outbox topic: {topic}")
+    return OutboxEvent.objects.create(topic=topic, payload=payload)
+
+
+def relay_outbox(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Publish committed, unpublished events to Celery in id order,
+    ``batch_size`` per transaction. Rows are claimed with SKIP LOCKED so
+    several relays can run side by side. A failed publish is counted on
+    the row and retried on a later run. Returns ``(published, failed)``.
+    """
+    from myapp.models import OutboxEvent
+
+    published = failed = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                OutboxEvent.objects.filter(published_at__isnull=True, attempts__lt=MAX_ATTEMPTS, pk__gt=last_pk)
+                .order_by("pk")
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+            if not batch:
+                break
+
+            now = timezone.now()
+            for event in batch:
+                try:
+                    import_string(HANDLERS[event.topic]).apply_async(kwargs=event.payload)
+                except Exception as exc:  # broker down, unknown topic: keep the row, try again later
+                    event.attempts += 1
+                    event.last_error = f"{type(exc).__name__}: {exc}"
+                    failed += 1
+                else:
+                    event.published_at = now
+                    published += 1
+            OutboxEvent.objects.bulk_update(batch, ["published_at", "attempts", "last_error"])
+
+        last_pk = batch[-1].pk
+        if len(batch) < batch_size:
+            break
+    return published, failed
+
+
+def purge_outbox(older_than):
+    """Delete events published before ``older_than``."""
+    from myapp.models import OutboxEvent
+
+    return OutboxEvent.objects.filter(published_at__lt=older_than).delete()[0]
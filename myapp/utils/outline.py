@@ -0,0 +1,83 @@
+# myapp/utils/outline.py
+from django.core.cache import cache
+from django.db.models import F
+
+
+OUTLINE_TTL = 60 * 60 * 24  # safety net; lesson/module signals rebuild it
+
+# Modules by order, then lessons by order; lessons without a module last.
+OUTLINE_ORDER = (F("module__order").asc(nulls_last=True), "module_id", "order", "id")
+
+NAVIGATION_FIELDS = ("previous", "next", "position", "total", "module_position", "module_total")
+
+
+def course_outline_key(course_id):
+    return f"course_outline:{course_id}"
+
+
+def build_course_outline(course_id):
+    """
+    Flatten a course into its reading order with one query:
+
+    * ``lessons`` — lesson ids in order;
+    * ``modules`` — ``{"id", "title", "start", "end"}`` slices of ``lessons``
+      (``end`` exclusive; ``id`` None for lessons attached to the course only);
+    * ``index`` — lesson id → ``(position, module slot)``.
+    """
+    from myapp.models import Lesson
+
+    from .progress import lesson_course_q
+
+    rows = (
+        Lesson.objects.filter(lesson_course_q(course_id))
+        .order_by(*OUTLINE_ORDER)
+        .values_list("pk", "module_id", "module__title")
+    )
+
+    lessons, modules, index = [], [], {}
+    for position, (pk, module_id, module_title) in enumerate(rows):
+        if not modules or modules[-1]["id"] != module_id:
+            if modules:
+                modules[-1]["end"] = position
+            modules.append({"id": module_id, "title": module_title, "start": position, "end": position})
+        lessons.append(pk)
+        index[pk] = (position, len(modules) - 1)
+    if modules:
+        modules[-1]["end"] = len(lessons)
+
+    return {"course_id": course_id, "lessons": lessons, "modules": modules, "index": index}
+
+
+def rebuild_course_outline(course_id):
+    outline = build_course_outline(course_id)
+    cache.set(course_outline_key(course_id), outline, timeout=OUTLINE_TTL)
+    return outline
+
+
+def get_course_outline(course_id):
+    outline = cache.get(course_outline_key(course_id))
+    if outline is None:
+        outline = rebuild_course_outline(course_id)
+    return outline
+
+
+def drop_course_outline(course_id):
+    cache.delete(course_outline_key(course_id))
+
+
+def lesson_navigation(outline, lesson_id):
+    """Previous/next lesson ids and the lesson's place in the course — dict lookups only."""
+    entry = outline["index"].get(lesson_id)
+    if entry is None:
+        return None
+
+    position, slot = entry
+    lessons, module = outline["lessons"], outline["modules"][slot]
+    return {
+        "previous": lessons[position - 1] if position > 0 else None,
+        "next": lessons[position + 1] if position + 1 < len(lessons) else None,
+        "position": position + 1,
+        "total": len(lessons),
+        "module_position": position - module["start"] + 1,
+        "module_total": module["end"] - module["start"],
+    }
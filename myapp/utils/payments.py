@@ -0,0 +1,481 @@
+# myapp/utils/payments.py
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from razorpay.errors import SignatureVerificationError
+from razorpay.utility.utility import Utility
+
+
+logger = logging.getLogger(__name__)
+
+ORDER_CURRENCY = "INR"
+ORDER_REUSE_WINDOW = timedelta(minutes=30)  # a pending order is reused for this long
+CLIENT_SETTINGS = {"RAZORPAY_CLIENT_CLASS", "RAZOR_KEY_ID", "RAZOR_KEY_SECRET"}
+
+
+# ---------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _client(path, key_id, key_secret):
+    return import_string(path)(auth=(key_id, key_secret))
+
+
+def get_razorpay_client():
+    """
+    The Razorpay client named by ``settings.RAZORPAY_CLIENT_CLASS`` (the
+    real ``razorpay.Client`` by default, ``FakeRazorpayClient`` in tests),
+    built once per process.
+    """
+    return _client(settings.RAZORPAY_CLIENT_CLASS, settings.RAZOR_KEY_ID, settings.RAZOR_KEY_SECRET)
+
+
+@receiver(setting_changed)
+def _reset_client(setting, **kwargs):
+    if setting in CLIENT_SETTINGS:
+        _client.cache_clear()
+
+
+class FakeRazorpayClient:
+    """
+    In-memory stand-in for ``razorpay.Client``: the same ``order`` calls and
+    the real signature utility, no network. ``sign()`` produces the
+    signature checkout would hand back for a payment.
+    """
+
+    def __init__(self, auth=None, **options):
+        self.auth = auth
+        self.orders = {}
+        self.order = _FakeOrders(self)
+        self.utility = Utility(self)
+
+    def sign(self, order_id, payment_id):
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(str(self.auth[1]).encode(), message, hashlib.sha256).hexdigest()
+
+    def pay(self, order_id, status="captured", amount=None):
+        """Record a payment attempt against an order, as checkout would. Returns its id."""
+        order = self.orders[order_id]
+        payment_id = f"pay_fake{next(_FakeOrders._ids):010d}"
+        order.setdefault("payments", []).append({
+            "id": payment_id,
+            "entity": "payment",
+            "amount": order["amount"] if amount is None else amount,
+            "currency": order["currency"],
+            "status": status,
+            "order_id": order_id,
+        })
+        if status == "captured":
+            order.update(status="paid", amount_paid=order["amount"], amount_due=0)
+        return payment_id
+
+
+class _FakeOrders:
+    _ids = itertools.count(1)
+
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, data=None, **kwargs):
+        order_id = f"order_fake{next(self._ids):010d}"
+        order = {
+            "id": order_id,
+            "entity": "order",
+            "amount": data["amount"],
+            "amount_paid": 0,
+            "amount_due": data["amount"],
+            "currency": data.get("currency", ORDER_CURRENCY),
+            "receipt": data.get("receipt"),
+            "notes": data.get("notes", {}),
+            "status": "created",
+            "created_at": int(timezone.now().timestamp()),
+        }
+        self.client.orders[order_id] = order
+        return dict(order)
+
+    def fetch(self, order_id, data=None, **kwargs):
+        order = dict(self.client.orders[order_id])
+        order.pop("payments", None)
+        return order
+
+    def payments(self, order_id, data=None, **kwargs):
+        items = [dict(item) for item in self.client.orders[order_id].get("payments", [])]
+        return {"entity": "collection", "count": len(items), "items": items}
+
+
+# ---------------------------------------------------------------
+# Orders
+# ---------------------------------------------------------------
+
+def to_paise(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def order_idempotency_key(student_id, course_id, amount_paise, now=None):
+    """Receipt for one order claim: student, course, price and the claim time."""
+    raw = f"{student_id}:{course_id}:{amount_paise}:{(now or timezone.now()).timestamp()}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+
+def claim_pending_payment(student, course, amount, now=None):
+    """
+    The student's pending payment for this course and price from the last
+    ``ORDER_REUSE_WINDOW``, or a new one. A short transaction holding the
+    student's row lock is the only guard: concurrent checkouts by one
+    student queue here, other students are not blocked.
+    """
+    from myapp.models import Payment, User
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=student.pk).values_list("pk", flat=True).get()
+        payment = (
+            Payment.objects.filter(
+                student=student, course=course, amount=amount, status="pending",
+                created_at__gt=now - ORDER_REUSE_WINDOW,
+            )
+            .order_by("-created_at")
+            .first()
+        )
+        if payment is None:
+            payment = Payment.objects.create(
+                student=student, course=course, amount=amount,
+                idempotency_key=order_idempotency_key(student.pk, course.pk, to_paise(amount), now),
+            )
+    return payment
+
+
+def get_or_create_order(student, course, amount, now=None):
+    """
+    Return ``(payment, reused)`` for a pending Razorpay order. The Payment
+    is claimed (or found) and committed first; Razorpay is then called
+    outside any transaction, so a slow gateway holds no lock or connection
+    state. The order id is attached only if the claim has none yet — a
+    request that loses that race returns the winner's order (its own
+    unpaid order simply expires at Razorpay).
+    """
+    from myapp.models import Payment
+
+    payment = claim_pending_payment(student, course, amount, now)
+    if payment.order_id:
+        return payment, True
+
+    # No order yet: a fresh claim, or one whose earlier order call failed
+    order = get_razorpay_client().order.create({
+        "amount": to_paise(amount),
+        "currency": ORDER_CURRENCY,
+        "receipt": payment.idempotency_key,
+        "payment_capture": "1",
+        "notes": {"student_id": str(student.pk), "course_id": str(course.pk)},
+    })
+    if Payment.objects.filter(pk=payment.pk, order_id__isnull=True).update(order_id=order["id"]):
+        payment.order_id = order["id"]
+        return payment, False
+
+    payment.refresh_from_db(fields=["order_id"])
+    return payment, True
+
+
+# ---------------------------------------------------------------
+# Fulfilment (shared by the verify view and webhooks)
+# ---------------------------------------------------------------
+
+def fulfil_payment(payment_pk, payment_id):
+    """
+    Mark a payment successful, enroll (or renew) its student and record the
+    confirmation email in the outbox. Idempotent: a payment that already succeeded is
+    left alone. Returns ``(payment, fulfilled)``.
+    """
+    from myapp.models import Enrollment, Payment
+
+    from .entitlements import invalidate_entitlements
+    from .outbox import publish
+
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().select_related("student", "course").get(pk=payment_pk)
+        if payment.status == "success":
+            return payment, False
+
+        payment.payment_id = payment_id
+        payment.status = "success"
+        payment.save(update_fields=["payment_id", "status"])
+
+        student, course = payment.student, payment.course
+        enrollment, _ = Enrollment.objects.get_or_create(student=student, course=course)
+        enrollment.expires_on = timezone.now() + timedelta(days=course.course_duration_months * 30)
+        enrollment.save()
+        invalidate_entitlements(student.pk)  # the next gated request must see the purchase
+
+        publish(
+            "payment.succeeded",
+            username=student.username,
+            email=student.email,
+            course_title=course.title,
+            transaction_id=str(payment.transaction_id),
+            amount=str(payment.amount),
+            payment_date=timezone.now().strftime("%B %d, %Y"),
+        )
+    return payment, True
+
+
+def fail_payment(payment_pk):
+    from myapp.models import Payment
+
+    return Payment.objects.filter(pk=payment_pk, status="pending").update(status="failed")
+
+
+# ---------------------------------------------------------------
+# Webhooks
+# ---------------------------------------------------------------
+
+FULFIL_EVENTS = {"payment.captured", "order.paid"}
+FAIL_EVENTS = {"payment.failed"}
+
+
+def verify_webhook_signature(body, signature):
+    """Raises ``razorpay.errors.SignatureVerificationError`` on mismatch."""
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret or not signature:
+        raise SignatureVerificationError("Webhook secret or signature missing")
+    body = body.decode() if isinstance(body, bytes) else body
+    return get_razorpay_client().utility.verify_webhook_signature(body, signature, secret)
+
+
+def webhook_entities(payload):
+    """``(order_id, payment_id, amount_paise)`` from a webhook payload."""
+    entity = (payload.get("payload", {}).get("payment") or {}).get("entity") or {}
+    order = (payload.get("payload", {}).get("order") or {}).get("entity") or {}
+    return (
+        entity.get("order_id") or order.get("id") or "",
+        entity.get("id") or "",
+        entity.get("amount", order.get("amount_paid")),
+    )
+
+
+def store_webhook_event(event_id, payload):
+    """Persist a verified delivery once per event id. Returns ``(event, created)``."""
+    from myapp.models import PaymentWebhookEvent
+
+    order_id, payment_id, _ = webhook_entities(payload)
+    return PaymentWebhookEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={
+            "event": payload.get("event", ""),
+            "order_id": order_id,
+            "payment_id": payment_id,
+            "payload": payload,
+        },
+    )
+
+
+def process_webhook_event(event_pk):
+    """Apply one stored webhook delivery; every outcome is recorded on the row."""
+    from myapp.models import Payment, PaymentWebhookEvent
+
+    event = PaymentWebhookEvent.objects.get(pk=event_pk)
+    if event.status != "received":
+        return event.status
+
+    order_id, payment_id, amount = webhook_entities(event.payload)
+    status, error = "ignored", ""
+    payment = Payment.objects.filter(order_id=order_id).first() if order_id else None
+
+    if event.event in FULFIL_EVENTS | FAIL_EVENTS and payment is None:
+        status, error = "failed", f"no payment for order {order_id!r}"
+    elif event.event in FULFIL_EVENTS:
+        if Payment.objects.filter(payment_id=payment_id, status="success").exists():
+            status = "duplicate"  # already fulfilled by the verify view or an earlier event
+        elif amount is not None and int(amount) != to_paise(payment.amount):
+            status, error = "failed", f"amount {amount} does not match order amount {to_paise(payment.amount)}"
+        else:
+            _, fulfilled = fulfil_payment(payment.pk, payment_id)
+            status = "processed" if fulfilled else "duplicate"
+    elif event.event in FAIL_EVENTS:
+        fail_payment(payment.pk)
+        status = "processed"
+
+    PaymentWebhookEvent.objects.filter(pk=event.pk).update(
+        status=status, error=error, processed_at=timezone.now()
+    )
+    return status
+
+
+class FakeWebhookSender:
+    """
+    Local stand-in for Razorpay's webhook deliveries: builds signed
+    payment.captured / payment.failed bodies and the headers Razorpay sends.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, secret=None):
+        self.secret = secret or settings.RAZORPAY_WEBHOOK_SECRET
+
+    def payment_event(self, event, order_id, payment_id, amount_paise, status="captured"):
+        return {
+            "entity": "event",
+            "event": event,
+            "contains": ["payment"],
+            "payload": {
+                "payment": {
+                    "entity": {
+                        "id": payment_id,
+                        "entity": "payment",
+                        "amount": amount_paise,
+                        "currency": ORDER_CURRENCY,
+                        "status": status,
+                        "order_id": order_id,
+                    }
+                }
+            },
+            "created_at": int(timezone.now().timestamp()),
+        }
+
+    def sign(self, body):
+        return hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+    def request(self, payload, event_id=None):
+        """``(body bytes, extra headers)`` for ``APIClient.post(..., content_type="application/json")``."""
+        body = json.dumps(payload).encode()
+        headers = {
+            "HTTP_X_RAZORPAY_SIGNATURE": self.sign(body),
+            "HTTP_X_RAZORPAY_EVENT_ID": event_id or f"evt_fake{next(self._ids):010d}",
+        }
+        return body, headers
+
+
+# ---------------------------------------------------------------
+# Reconciliation of stale pending payments
+# ---------------------------------------------------------------
+
+RECONCILE_AFTER = timedelta(minutes=30)  # verify/webhook had their chance by then
+ABANDON_AFTER = timedelta(hours=24)  # unpaid orders older than this are settled as failed
+RECONCILE_BATCH_SIZE = 100
+RECONCILE_WORKERS = 4
+RECONCILE_RATE = 10  # Razorpay calls per second, across all workers
+
+
+class RateLimiter:
+    """Spaces calls ``1 / rate`` seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+
+def _fetch_order_payments(client, limiter, order_id):
+    """``(items, error)``; runs in a worker thread and touches no database."""
+    limiter.wait()
+    try:
+        return client.order.payments(order_id).get("items", []), None
+    except Exception as exc:  # one bad order must not stop the batch
+        return None, f"{type(exc).__name__}: {exc}"
+
+
+def _settlement(row, items, now):
+    """``("success", payment_id)``, ``("failed", None)`` or ``(None, None)`` to leave it pending."""
+    for item in items or ():
+        if item.get("status") == "captured" and int(item.get("amount", -1)) == to_paise(row["amount"]):
+            return "success", item["id"]
+    if row["created_at"] <= now - ABANDON_AFTER:
+        return "failed", None
+    return None, None
+
+
+def reconcile_pending_payments(
+    batch_size=RECONCILE_BATCH_SIZE, workers=RECONCILE_WORKERS, rate=RECONCILE_RATE, now=None,
+):
+    """
+    Settle pending payments older than ``RECONCILE_AFTER`` from Razorpay's
+    view of their orders: a captured payment for the full amount enrolls
+    the student (``fulfil_payment``); an order still unpaid after
+    ``ABANDON_AFTER`` is marked failed; anything else stays pending.
+
+    Rows are walked in ``(created_at, id)`` keyset order over the partial
+    index on pending rows. Each batch's order lookups run in a thread pool
+    of ``workers``, throttled to ``rate`` calls per second; settling happens
+    back on this thread. Per-batch metrics are logged; totals are returned.
+    """
+    from myapp.models import Payment
+
+    now = now or timezone.now()
+    client, limiter = get_razorpay_client(), RateLimiter(rate)
+    stale = Payment.objects.filter(status="pending", created_at__lt=now - RECONCILE_AFTER)
+    totals = {"batches": 0, "checked": 0, "succeeded": 0, "failed": 0, "pending": 0, "errors": 0, "seconds": 0.0}
+    cursor = None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            started = time.monotonic()
+            rows = stale
+            if cursor is not None:
+                rows = rows.filter(Q(created_at__gt=cursor[0]) | Q(created_at=cursor[0], pk__gt=cursor[1]))
+            batch = list(rows.order_by("created_at", "pk").values("pk", "order_id", "amount", "created_at")[:batch_size])
+            if not batch:
+                break
+
+            with_orders = [row for row in batch if row["order_id"]]
+            fetched = dict(zip(
+                (row["pk"] for row in with_orders),
+                pool.map(lambda row: _fetch_order_payments(client, limiter, row["order_id"]), with_orders),
+            ))
+
+            metrics = {"batch": totals["batches"] + 1, "checked": len(batch),
+                       "succeeded": 0, "failed": 0, "pending": 0, "errors": 0}
+            for row in batch:
+                items, error = fetched.get(row["pk"], ([], None))
+                if error:
+                    metrics["errors"] += 1
+                    logger.warning("reconcile: order %s of payment %s: %s", row["order_id"], row["pk"], error)
+                    continue
+                outcome, payment_id = _settlement(row, items, now)
+                if outcome == "success":
+                    fulfil_payment(row["pk"], payment_id)
+                    metrics["succeeded"] += 1
+                elif outcome == "failed":
+                    metrics["failed"] += fail_payment(row["pk"])
+                else:
+                    metrics["pending"] += 1
+
+            metrics["seconds"] = round(time.monotonic() - started, 3)
+            logger.info(
+                "reconcile batch %(batch)d: %(checked)d checked, %(succeeded)d succeeded, %(failed)d failed, "
+                "%(pending)d still pending, %(errors)d errors in %(seconds).3fs",
+                metrics, extra={"metrics": metrics},
+            )
+            totals["batches"] += 1
+            for key in ("checked", "succeeded", "failed", "pending", "errors", "seconds"):
+                totals[key] += metrics[key]
+
+            if len(batch) < batch_size:
+                break
+            cursor = (batch[-1]["created_at"], batch[-1]["pk"])
+
+    totals["seconds"] = round(totals["seconds"], 3)
+    return totals
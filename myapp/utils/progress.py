@@ -0,0 +1,215 @@
+# myapp/utils/progress.py
+from django.db.models import Count, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, Least, Round
+
+from .course_stats import apply_stats_delta, get_stats
+
+
+TASK_STATUS_COUNTERS = {"approved": "approved_tasks", "rejected": "rejected_tasks"}
+
+
+def lesson_course_id(lesson):
+    """
+    A lesson belongs to its own ``course`` or, for module-only lessons, to
+    the module's course. Every progress count goes through this one rule.
+    """
+    if lesson.course_id:
+        return lesson.course_id
+    if not lesson.module_id:
+        return None
+
+    from myapp.models import Lesson, Module
+
+    if Lesson.module.is_cached(lesson):  # select_related("module")
+        return lesson.module.course_id
+    return Module.objects.filter(pk=lesson.module_id).values_list("course_id", flat=True).first()
+
+
+def lesson_course_q(course_id, prefix=""):
+    return Q(**{f"{prefix}course_id": course_id}) | Q(
+        **{f"{prefix}course__isnull": True, f"{prefix}module__course_id": course_id}
+    )
+
+
+def progress_expression(lesson_total, task_total):
+    """
+    Overall progress as an SQL expression over an Enrollment row's counters:
+    the mean of lesson % and approved-task %, with the course totals baked
+    in as constants.
+    """
+    lessons = F("completed_lessons") * Value(100.0 / lesson_total) if lesson_total else Value(0.0)
+    tasks = F("approved_tasks") * Value(100.0 / task_total) if task_total else Value(0.0)
+    return Least(Round((lessons + tasks) / Value(2.0), 2), Value(100.0))
+
+
+def refresh_progress(course_id, student_id=None):
+    """Rewrite ``Enrollment.progress`` from the counters in one UPDATE."""
+    from myapp.models import Course, Enrollment
+
+    course = Course.objects.select_related("stats").filter(pk=course_id).first()
+    if course is None:
+        return
+    stats = get_stats(course)
+
+    enrollments = Enrollment.objects.filter(course_id=course_id)
+    if student_id is not None:
+        enrollments = enrollments.filter(student_id=student_id)
+    enrollments.update(progress=progress_expression(stats.lesson_count, stats.task_count))
+    schedule_certificates(course_id, student_id)
+
+
+def schedule_certificates(course_id, student_id=None):
+    """Queue certificates for enrollments this refresh brought to 100%."""
+    from django.db import transaction
+
+    from myapp.tasks import issue_course_certificates
+
+    from .certificates import completed_without_certificate
+
+    student_ids = list(completed_without_certificate(course_id, student_id).values_list("student_id", flat=True))
+    if student_ids:
+        transaction.on_commit(lambda: issue_course_certificates.delay(course_id, student_ids))
+
+
+def apply_progress_delta(student_id, course_id, **deltas):
+    """Add ``deltas`` to one enrollment's counters, then refresh its progress."""
+    from myapp.models import Enrollment
+
+    updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not student_id or not course_id or not updates:
+        return
+    if Enrollment.objects.filter(student_id=student_id, course_id=course_id).update(**updates):
+        refresh_progress(course_id, student_id=student_id)
+
+
+def recount_completed_lessons(student_id, course_ids):
+    """
+    Reset one student's ``completed_lessons`` in ``course_ids`` from a
+    grouped count, then refresh progress. For bulk inserts, which skip the
+    LessonCompletion signals.
+    """
+    from myapp.models import Enrollment, LessonCompletion
+
+    counts = dict(
+        LessonCompletion.objects.filter(student_id=student_id)
+        .annotate(course=Coalesce("lesson__course_id", "lesson__module__course_id"))
+        .filter(course__in=course_ids)
+        .values("course").annotate(n=Count("id"))
+        .values_list("course", "n")
+    )
+    for course_id in course_ids:
+        Enrollment.objects.filter(student_id=student_id, course_id=course_id).update(
+            completed_lessons=counts.get(course_id, 0)
+        )
+        refresh_progress(course_id, student_id=student_id)
+
+
+def apply_course_total_delta(course_id, **deltas):
+    """A lesson/task was added or removed: every enrollment's % moves."""
+    if not course_id:
+        return
+    apply_stats_delta(course_id, **deltas)
+    refresh_progress(course_id)
+
+
+def task_status_delta(status, sign):
+    field = TASK_STATUS_COUNTERS.get(status)
+    return {field: sign} if field else {}
+
+
+def completion_bitmap(student_id, course_id):
+    """
+    The course outline (modules by order, then lessons by order; lessons
+    without a module last) with the student's completion state, from one
+    query: ``(lesson_ids, "0110…")`` where character i is lesson_ids[i].
+    """
+    from myapp.models import Lesson, LessonCompletion
+
+    from .outline import OUTLINE_ORDER
+
+    rows = (
+        Lesson.objects.filter(lesson_course_q(course_id))
+        .annotate(done=Exists(LessonCompletion.objects.filter(student_id=student_id, lesson=OuterRef("pk"))))
+        .order_by(*OUTLINE_ORDER)
+        .values_list("pk", "done")
+    )
+    lesson_ids, bits = [], []
+    for pk, done in rows:
+        lesson_ids.append(pk)
+        bits.append("1" if done else "0")
+    return lesson_ids, "".join(bits)
+
+
+def progress_summary(enrollment):
+    """
+    The progress payload for one enrollment, computed from its counters and
+    the course totals (``select_related("course__stats")``) — no queries.
+    """
+    stats = get_stats(enrollment.course)
+    total_lessons, total_tasks = stats.lesson_count, stats.task_count
+
+    lesson_progress = (enrollment.completed_lessons / total_lessons * 100) if total_lessons else 0
+    task_progress = (enrollment.approved_tasks / total_tasks * 100) if total_tasks else 0
+    pending_tasks = total_tasks - (enrollment.approved_tasks + enrollment.rejected_tasks)
+
+    return {
+        "course_progress": round((lesson_progress + task_progress) / 2, 2),
+        "lesson_progress": round(lesson_progress, 2),
+        "task_progress": round(task_progress, 2),
+        "completed_lessons": enrollment.completed_lessons,
+        "total_lessons": total_lessons,
+        "completed_tasks": enrollment.approved_tasks,
+        "rejected_tasks": enrollment.rejected_tasks,
+        "pending_tasks": max(pending_tasks, 0),
+        "total_tasks": total_tasks,
+        "expires_on": enrollment.expires_on.isoformat() if enrollment.expires_on else None,
+    }
+
+
+def rebuild_progress_counters(course_ids=None):
+    """
+    Recompute lesson/task totals and every enrollment's counters from the
+    source tables, then rewrite ``progress``. Returns the enrollment count.
+    """
+    from myapp.models import Course, CourseStats, DailyTask, Enrollment, Lesson, LessonCompletion, TaskSubmission
+
+    courses = Course.objects.all()
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    ids = list(courses.values_list("pk", flat=True))
+
+    updated = 0
+    for course_id in ids:
+        lesson_ids = Lesson.objects.filter(lesson_course_q(course_id)).values("pk")
+        CourseStats.objects.get_or_create(course_id=course_id)
+        CourseStats.objects.filter(course_id=course_id).update(
+            lesson_count=Lesson.objects.filter(pk__in=lesson_ids).count(),
+            task_count=DailyTask.objects.filter(course_id=course_id).count(),
+        )
+
+        completed = dict(
+            LessonCompletion.objects.filter(lesson__in=lesson_ids)
+            .values("student_id").annotate(n=Count("id")).values_list("student_id", "n")
+        )
+        submissions = {
+            row["student_id"]: row
+            for row in TaskSubmission.objects.filter(task__course_id=course_id)
+            .values("student_id")
+            .annotate(
+                approved=Count("id", filter=Q(status="approved")),
+                rejected=Count("id", filter=Q(status="rejected")),
+            )
+        }
+
+        enrollments = list(Enrollment.objects.filter(course_id=course_id).only("pk", "student_id"))
+        for enrollment in enrollments:
+            row = submissions.get(enrollment.student_id, {})
+            enrollment.completed_lessons = completed.get(enrollment.student_id, 0)
+            enrollment.approved_tasks = row.get("approved", 0)
+            enrollment.rejected_tasks = row.get("rejected", 0)
+        Enrollment.objects.bulk_update(
+            enrollments, ["completed_lessons", "approved_tasks", "rejected_tasks"], batch_size=500
+        )
+        refresh_progress(course_id)
+        updated += len(enrollments)
+    return updated
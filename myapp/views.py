@@ -20,6 +20,7 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework import filters
 from rest_framework.decorators import action
 from django.db.models import Count, Q, Avg
+from django.db.models.functions import Coalesce
 from rest_framework import status
 import razorpay
 from django.conf import settings
@@ -27,8 +28,12 @@ from django.shortcuts import get_object_or_404
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from django.shortcuts import redirect
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_vary_headers
+import hashlib
+import json
 import os
+from operator import attrgetter
 from googleapiclient.http import MediaFileUpload
 from google.oauth2.credentials import Credentials
 from django.core.exceptions import PermissionDenied
@@ -45,17 +50,37 @@ from datetime import datetime
 
 
 from .models import (
-    ChatRoom, LessonCompletion, Notification, Question, StudentQuizAttempt, User, Course, Enrollment, DailyTask, TaskSubmission, Offer, Feedback, Payment, Profile,
-    Module, Lesson, Quiz,  LiveSession,Message,
+    ChatRoom, LessonCompletion, Notification, Question, StudentQuizAttempt, User, Course, Enrollment, DailyTask, TaskSubmission, Feedback, Payment, Profile,
+    Module, Lesson, Quiz,  LiveSession,Message, CourseAnalytics,
 )
 from .serializers import (
     ChatRoomSerializer, MessageSerializer, NotificationSerializer, OptionSerializer, QuestionSerializer, RegisterSerializer, StudentQuizAttemptSerializer, UserSerializer, CourseSerializer, EnrollmentSerializer,
     DailyTaskSerializer, TaskSubmissionSerializer, FeedbackSerializer,
     PaymentSerializer, ModuleSerializer, LessonSerializer,
-    QuizSerializer,  LiveSessionSerializer,
-    ProfileSerializer
+    QuizSerializer,  LiveSessionSerializer, InstructorDirectorySerializer, CourseAnalyticsSerializer,
+    LessonCompletionSyncSerializer,
+    ProfileSerializer, visible_fields,
 )
 from .permissions import IsInstructor, IsAdmin
+from .search import MAX_RESULTS as MAX_SEARCH_RESULTS, search_courses, suggest_index
+from .pagination import (
+    EnrollmentKeysetPagination, InstructorKeysetPagination, KeysetPagination, SubmissionKeysetPagination,
+)
+from .utils.course_stats import get_stats
+from .utils.offers import OFFER_BASE_FIELDS, OFFER_FIELDS, OfferContext
+from .utils.outline import NAVIGATION_FIELDS, get_course_outline, lesson_navigation
+from .utils.progress import completion_bitmap, lesson_course_id, progress_summary, recount_completed_lessons
+from .utils.analytics import compute_course_analytics
+from .utils.access import ACCESS_ACTIVE, ACCESS_EXPIRED, ACCESS_NONE, with_access_state
+from .utils.entitlements import Entitlements, invalidate_entitlements
+from .utils.certificates import get_certificate_verification
+from .utils.outbox import publish
+from .utils.payments import (
+    ORDER_CURRENCY, claim_pending_payment, fulfil_payment, get_or_create_order, get_razorpay_client, store_webhook_event, to_paise,
+    verify_webhook_signature,
+)
+from .utils.catalog import etag_matches, get_catalog_entry, make_etag
+from .utils.course_page import absolutize_media, get_course_page
 from rest_framework.parsers import MultiPartParser, FormParser
 
 from myapp import serializers
@@ -146,12 +171,81 @@ class ProfileView(APIView):
 # =======================================
 
 class CourseListView(generics.ListAPIView):
-    queryset = Course.objects.all()
+    queryset = Course.objects.select_related("instructor", "stats")
     serializer_class = CourseSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
 
     def get_serializer_context(self):
-        return {"request": self.request}
+        return {
+            "request": self.request,
+            "offer_context": OfferContext.for_request(self.request),
+        }
+
+    def _build_anonymous_page(self, fields=None):
+        paginator = self.paginator
+        page = paginator.paginate_queryset(self.get_queryset(), self.request, view=self)
+        kwargs = {} if fields is None else {"fields": fields}
+        data = CourseSerializer(
+            page,
+            many=True,
+            context={"request": self.request, "offer_context": OfferContext()},
+            **kwargs,
+        ).data
+        return paginator.get_paginated_payload(data), paginator.get_headers()
+
+    def list(self, request, *args, **kwargs):
+        scope = request.GET.urlencode()
+
+        if not request.user.is_authenticated:
+            # ✅ The anonymous catalog is rendered once per catalog version (and
+            # page) and served as pre-rendered bytes; signals bump the version.
+            entry = get_catalog_entry(request, self._build_anonymous_page, scope=scope)
+            if etag_matches(request, entry.etag):
+                response = HttpResponseNotModified()
+            else:
+                response = HttpResponse(entry.body, content_type="application/json")
+                for header, value in entry.headers.items():
+                    response[header] = value
+            response["ETag"] = entry.etag
+            patch_vary_headers(response, ("Authorization",))
+            return response
+
+        # ✅ Logged-in users reuse the cached base rows; only the offer
+        # fields are recomputed (from the request's OfferContext), and not
+        # even that when ?fields=/omit= trimmed them away.
+        visible = visible_fields(CourseSerializer, request.query_params)
+        wants_offers = any(field in visible for field in OFFER_FIELDS)
+
+        # ✅ The offer overlay reads id/price: if the client trimmed them, the
+        # base rows keep them (separately cached) and they are dropped after.
+        hidden = [field for field in OFFER_BASE_FIELDS if field not in visible] if wants_offers else []
+        if hidden:
+            entry = get_catalog_entry(
+                request, lambda: self._build_anonymous_page(fields=visible + hidden), scope=f"{scope}|base"
+            )
+        else:
+            entry = get_catalog_entry(request, self._build_anonymous_page, scope=scope)
+
+        offer_context, etag = None, entry.etag
+        if wants_offers:
+            offer_context = OfferContext.for_request(request)
+            etag = make_etag(entry.etag, request.user.pk, offer_context.fingerprint())
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            payload = entry.payload()
+            rows = payload["results"] if isinstance(payload, dict) else payload
+            if offer_context is not None:
+                for row in rows:
+                    offer_context.apply_to(row)
+                    for field in hidden:
+                        del row[field]
+            response = Response(payload, headers=entry.headers)
+        response["ETag"] = etag
+        patch_vary_headers(response, ("Authorization",))
+        return response
 
 
 
@@ -190,34 +284,32 @@ class PaymentCreateView(generics.CreateAPIView):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    @transaction.atomic
     def perform_create(self, serializer):
-        student = self.request.user
         course = serializer.validated_data['course']
-        amount = serializer.validated_data['amount']
 
-        # Apply offer if exists
-        active_offer = Offer.objects.filter(is_active=True).order_by('-created_at').first()
-        if active_offer and active_offer.discount_percent > 0:
-            discount = (active_offer.discount_percent / 100) * float(amount)
-            amount = float(amount) - discount
-
-        payment = serializer.save(student=student, amount=amount)
-        if payment.status == 'success':
-            Enrollment.objects.get_or_create(student=student, course=course)
+        # ✅ Server-side price from the shared pricing service (Decimal); the
+        # payment starts pending and only Razorpay verification enrolls
+        amount = OfferContext.for_request(self.request).final_price(course)
+        serializer.save(student=self.request.user, amount=amount)
 
 
 # views.py
 class EnrollmentListView(generics.ListAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = EnrollmentKeysetPagination
 
     def get_queryset(self):
-        return Enrollment.objects.filter(student=self.request.user)
+        return Enrollment.objects.filter(student=self.request.user).select_related(
+            "student", "course", "course__instructor", "course__stats"
+        )
 
     def get_serializer_context(self):
         # ✅ ensures request gets into EnrollmentSerializer → CourseSerializer
-        return {"request": self.request}
+        return {
+            "request": self.request,
+            "offer_context": OfferContext.for_request(self.request),
+        }
 
 
 
@@ -403,7 +495,7 @@ class FeedbackCreateView(generics.CreateAPIView):
             raise ValidationError({"course": "Invalid course ID."})
 
         # Must be enrolled
-        if not Enrollment.objects.filter(student=user, course=course).exists():
+        if not Entitlements.for_request(self.request).is_enrolled(course.pk):
             raise ValidationError({"detail": "You must be enrolled in this course to leave a review."})
 
         # One review per student
@@ -446,10 +538,11 @@ class FeedbackDeleteView(generics.DestroyAPIView):
 class CourseFeedbackListView(generics.ListAPIView):
     serializer_class = FeedbackSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         course_id = self.kwargs.get("course_id")
-        return Feedback.objects.filter(course_id=course_id).order_by('-created_at')
+        return Feedback.objects.filter(course_id=course_id).select_related("student")
 
 
 
@@ -463,20 +556,26 @@ class CourseDetailView(generics.RetrieveAPIView):
     permission_classes = [permissions.AllowAny]
 
     def retrieve(self, request, *args, **kwargs):
-        course = self.get_object()
-
-        modules = Module.objects.filter(course=course).order_by("order")
-        feedbacks = Feedback.objects.filter(course=course)
-
-        course_data = CourseSerializer(course, context={'request': request}).data
-        module_data = ModuleSerializer(modules, many=True, context={'request': request}).data
-        feedbacks_data = FeedbackSerializer(feedbacks, many=True, context={'request': request}).data
-
-        return Response({
-            "course": course_data,
-            "modules": module_data,   # ⬅️ RETURN MODULES
-            "reviews": feedbacks_data,
-        })
+        course_id = self.kwargs["pk"]
+
+        # ✅ One cache read: the page document (course, modules + lessons,
+        # rating summary, first reviews page) is rebuilt in the background
+        # whenever the course, its modules/lessons or its reviews change.
+        document = get_course_page(course_id)
+        if document is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        # ✅ Only the per-user offer fields are computed per request; the page
+        # document is never trimmed by ?fields=, so id/price are always there
+        OfferContext.for_request(request).apply_to(document["course"])
+        absolutize_media(document, request)
+
+        cursor = document.pop("reviews_next_cursor")
+        document["reviews_next"] = (
+            request.build_absolute_uri(f"/api/courses/{course_id}/reviews/?cursor={cursor}")
+            if cursor else None
+        )
+        return Response(document)
 
 
 
@@ -485,26 +584,138 @@ class CourseDetailView(generics.RetrieveAPIView):
 # =======================================
 
 class CourseSearchView(generics.ListAPIView):
-    queryset = Course.objects.all()
+    """
+    Ranked full-text search: ?search=<text> (prefix-matched, best first),
+    optional ?ordering=price|-price|created_at|-created_at and ?limit=.
+    """
+    queryset = Course.objects.select_related("instructor", "stats")
     serializer_class = CourseSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'description', 'instructor__username']
     ordering_fields = ['price', 'created_at']
-    ordering = ['-created_at']
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["offer_context"] = OfferContext.for_request(self.request)
+        return context
+
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get("search") or request.query_params.get("q", "")
+        try:
+            limit = min(int(request.query_params.get("limit", 50)), MAX_SEARCH_RESULTS)
+        except ValueError:
+            limit = 50
+
+        courses = search_courses(self.get_queryset(), text, limit=max(limit, 1))
+
+        ordering = request.query_params.get("ordering", "")
+        if ordering.lstrip("-") in self.ordering_fields:
+            courses.sort(key=attrgetter(ordering.lstrip("-")), reverse=ordering.startswith("-"))
+
+        serializer = self.get_serializer(courses, many=True)
+        return Response(serializer.data)
+
+
+class PriceQuoteView(APIView):
+    """
+    Batch prices for the catalog and checkout: ``?course_ids=1,2,3`` →
+    one quote per course for the current user (anonymous users get the
+    site-wide offer only). One price query; offers resolve from cache.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_ids = 100
+
+    def get(self, request):
+        raw = request.query_params.get("course_ids", "")
+        try:
+            course_ids = list(dict.fromkeys(int(part) for part in raw.split(",") if part.strip()))
+        except ValueError:
+            return Response({"error": "course_ids must be comma-separated integers"}, status=400)
+        if not course_ids:
+            return Response({"error": "course_ids is required"}, status=400)
+        if len(course_ids) > self.max_ids:
+            return Response({"error": f"At most {self.max_ids} course ids per request"}, status=400)
+
+        quotes = OfferContext.for_request(request).quote_courses(course_ids)
+        found = {quote.course_id for quote in quotes}
+        return Response({
+            "quotes": [quote.as_dict() for quote in quotes],
+            "missing": [course_id for course_id in course_ids if course_id not in found],
+        })
+
+
+class CourseSuggestView(APIView):
+    """
+    Typeahead for the search box: ?q=<prefix>&limit=<n> → top course ids and
+    titles, answered from the in-process SuggestIndex (no query per keystroke).
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []  # anonymous by design: skip JWT decoding
+
+    def get(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", 8)), 20))
+        except ValueError:
+            limit = 8
+
+        results = suggest_index.suggest(request.query_params.get("q", ""), limit=limit)
+        response = Response({"results": results})
+        response["Cache-Control"] = "public, max-age=60"
+        return response
 
 
 class InstructorListView(generics.ListAPIView):
-    queryset = User.objects.filter(role='instructor', is_approved=True)
-    serializer_class = UserSerializer
+    """
+    Public instructor directory: compact cards with course/student/rating
+    totals summed from CourseStats in the page query itself. Pages are
+    cached per catalog version, which course (re)assignment, reviews and
+    instructor profile edits bump; enrollments only age out via the TTL.
+    """
+    serializer_class = InstructorDirectorySerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = InstructorKeysetPagination
+    cache_timeout = 60 * 5
+
+    def get_queryset(self):
+        return User.objects.filter(role='instructor', is_approved=True).annotate(
+            course_count=Count("course"),
+            student_count=Coalesce(Sum("course__stats__enrollment_count"), 0),
+            review_total=Coalesce(Sum("course__stats__review_count"), 0),
+            rating_total=Coalesce(Sum("course__stats__rating_sum"), 0),
+        )
+
+    def _build_page(self):
+        page = self.paginate_queryset(self.get_queryset())
+        data = self.get_serializer(page, many=True).data
+        return self.paginator.get_paginated_payload(data), self.paginator.get_headers()
+
+    def list(self, request, *args, **kwargs):
+        entry = get_catalog_entry(
+            request, self._build_page,
+            scope=f"instructors|{request.GET.urlencode()}", timeout=self.cache_timeout,
+        )
+        if etag_matches(request, entry.etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry.body, content_type="application/json")
+            for header, value in entry.headers.items():
+                response[header] = value
+        response["ETag"] = entry.etag
+        return response
 
 class InstructorEnrollmentListView(generics.ListAPIView):
     serializer_class = EnrollmentSerializer
     permission_classes = [IsInstructor]
+    pagination_class = EnrollmentKeysetPagination
 
     def get_queryset(self):
-        return Enrollment.objects.filter(course__instructor=self.request.user)
+        return Enrollment.objects.filter(course__instructor=self.request.user).select_related(
+            "student", "course", "course__instructor", "course__stats"
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["offer_context"] = OfferContext.for_request(self.request)
+        return context
 
 class InstructorCourseListView(generics.ListAPIView):
     serializer_class = CourseSerializer
@@ -512,11 +723,38 @@ class InstructorCourseListView(generics.ListAPIView):
 
     def get_queryset(self):
         # Only show courses created by admin AND assigned to this instructor
-        return Course.objects.filter(instructor=self.request.user, created_by_admin=True)
+        return Course.objects.filter(
+            instructor=self.request.user, created_by_admin=True
+        ).select_related("instructor", "stats")
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["offer_context"] = OfferContext.for_request(self.request)
+        return context
+
+
+class InstructorCourseAnalyticsView(APIView):
+    """
+    Cohort analytics for one of the instructor's courses: progress
+    histogram, module completion funnel and task approval rates.
+
+    GET serves the stored rollup (nightly Celery beat job); POST recomputes
+    it now. A course that was never rolled up is computed on first GET.
+    """
+    permission_classes = [IsInstructor]
 
+    def _course(self, request, course_id):
+        return get_object_or_404(Course, pk=course_id, instructor=request.user)
+
+    def get(self, request, course_id):
+        course = self._course(request, course_id)
+        analytics = CourseAnalytics.objects.filter(course=course).first() or compute_course_analytics(course.pk)
+        return Response(CourseAnalyticsSerializer(analytics).data)
+
+    def post(self, request, course_id):
+        course = self._course(request, course_id)
+        return Response(CourseAnalyticsSerializer(compute_course_analytics(course.pk)).data)
 
-# Initialize Razorpay client
-razorpay_client = razorpay.Client(auth=(settings.RAZOR_KEY_ID, settings.RAZOR_KEY_SECRET))
 
 class CreateRazorpayOrderView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -530,41 +768,40 @@ class CreateRazorpayOrderView(APIView):
             course = Course.objects.get(id=course_id)
             student = request.user
 
-            # ✅ Use consistent offer logic (matching frontend CourseSerializer)
-            final_price = course.get_final_price(user=request.user)
+            # ✅ Same pricing service as the catalog and the batch quote endpoint
+            final_price = OfferContext.for_request(request).final_price(course)
 
-            if not final_price:
+            if final_price is None:
                 return Response({"error": "Price calculation failed."}, status=400)
 
-            amount = int(float(final_price) * 100)    # Razorpay uses paise
-
-            print("✔ Final price for payment:", final_price)
-            print("✔ Razorpay order amount:", amount)
-
-            # ✅ Create Razorpay order
-            order = razorpay_client.order.create({
-                "amount": amount,
-                "currency": "INR",
-                "payment_capture": "1",
-            })
-
-            # ✅ Save payment record locally
-            Payment.objects.create(
-                student=student,
-                course=course,
-                amount=final_price,
-                order_id=order["id"],
-                status="pending"
-            )
+            # ✅ A 100% offer: nothing to charge (Razorpay rejects zero-amount
+            # orders), so record a free payment and enroll right away
+            if final_price <= 0:
+                payment = claim_pending_payment(student, course, final_price)
+                payment, _ = fulfil_payment(payment.pk, payment_id=None)
+                return Response({
+                    "order_id": None,
+                    "amount": 0,
+                    "currency": ORDER_CURRENCY,
+                    "course_title": course.title,
+                    "final_price": final_price,
+                    "enrolled": True,
+                    "transaction_id": str(payment.transaction_id),
+                }, status=200)
+
+            # ✅ Reuse this student's pending order for the same price (double clicks, retries)
+            payment, reused = get_or_create_order(student, course, final_price)
+            amount = to_paise(payment.amount)    # Razorpay uses paise
 
             # ✅ Return order info to frontend
             return Response({
-                "order_id": order["id"],
+                "order_id": payment.order_id,
                 "amount": amount,
-                "currency": "INR",
+                "currency": ORDER_CURRENCY,
                 "key": settings.RAZOR_KEY_ID,
                 "course_title": course.title,
-                "final_price": final_price
+                "final_price": final_price,
+                "reused": reused,
             }, status=200)
 
         except Course.DoesNotExist:
@@ -578,10 +815,6 @@ class CreateRazorpayOrderView(APIView):
 
 
 
-# views.py
-from myapp.tasks import send_payment_success_email
-
-
 class VerifyRazorpayPaymentView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -602,35 +835,12 @@ class VerifyRazorpayPaymentView(APIView):
                 "razorpay_payment_id": razorpay_payment_id,
                 "razorpay_signature": razorpay_signature,
             }
-            razorpay_client.utility.verify_payment_signature(params_dict)
+            get_razorpay_client().utility.verify_payment_signature(params_dict)
 
-            # ✅ Find the payment record
-            payment = get_object_or_404(Payment, order_id=razorpay_order_id)
-            payment.payment_id = razorpay_payment_id
-            payment.status = "success"
-            payment.save()
-
-            # ✅ Enroll the student automatically
-            student = request.user
+            # ✅ Find the payment record, then enroll + email (shared with the webhook)
+            payment = get_object_or_404(Payment, order_id=razorpay_order_id, student=request.user)
+            payment, _ = fulfil_payment(payment.pk, razorpay_payment_id)
             course = payment.course
-            enrollment, created = Enrollment.objects.get_or_create(student=student, course=course)
-
-            # Always calculate/refresh expiry
-            enrollment.expires_on = timezone.now() + timedelta(days=course.course_duration_months * 30)            
-            enrollment.save()
-
-            
-            payment_date = timezone.now().strftime("%B %d, %Y")
-
-            # 📧 Send Email via Celery (ASYNC — FAST)
-            send_payment_success_email.delay(
-                username=student.username,
-                email=student.email,
-                course_title=course.title,
-                transaction_id=payment.transaction_id,
-                amount=str(payment.amount),
-                payment_date=payment_date,
-            )
 
             # ✅ Return confirmation
             return Response({
@@ -648,6 +858,34 @@ class VerifyRazorpayPaymentView(APIView):
 
 
 
+class RazorpayWebhookView(APIView):
+    """
+    Razorpay → us, independent of the browser: verify the signature, store
+    the raw event once per event id and acknowledge. Enrollment happens in
+    the process_payment_webhook task, queued through the outbox.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        body = request.body
+        try:
+            verify_webhook_signature(body, request.headers.get("X-Razorpay-Signature"))
+            payload = json.loads(body)
+        except razorpay.errors.SignatureVerificationError:
+            return Response({"error": "Invalid webhook signature"}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        event_id = request.headers.get("X-Razorpay-Event-Id") or hashlib.sha256(body).hexdigest()
+        with transaction.atomic():
+            event, created = store_webhook_event(event_id, payload)
+            if created:
+                publish("payment.webhook_received", event_pk=event.pk)
+        return Response({"status": "received" if created else "duplicate"}, status=status.HTTP_200_OK)
+
+
+
 # In views.py
 class TaskSubmissionListView(generics.ListAPIView):
     """
@@ -655,6 +893,7 @@ class TaskSubmissionListView(generics.ListAPIView):
     """
     serializer_class = TaskSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SubmissionKeysetPagination
 
     def get_queryset(self):
         user = self.request.user
@@ -701,9 +940,12 @@ class TaskSubmissionReviewView(generics.UpdateAPIView):
 class StudentTaskSubmissionListView(generics.ListAPIView):
     serializer_class = TaskSubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SubmissionKeysetPagination
 
     def get_queryset(self):
-        return TaskSubmission.objects.filter(student=self.request.user)
+        return TaskSubmission.objects.filter(student=self.request.user).select_related(
+            "student", "task", "task__course"
+        )
     
 
 
@@ -714,56 +956,48 @@ class StudentCourseProgressView(APIView):
     def get(self, request, course_id):
         user = request.user
 
-        # ✅ Ensure user is enrolled
-        enrollment = Enrollment.objects.filter(student=user, course_id=course_id).first()
+        # ✅ Gate on the cached entitlements, then one row: the enrollment's
+        # counters plus the course totals (kept current by signals, so
+        # reading never writes).
+        access = Entitlements.for_request(request).state(course_id)
+        if access == ACCESS_NONE:
+            return Response({"detail": "Not enrolled in this course"}, status=403)
+        if access == ACCESS_EXPIRED:
+            return Response({"expired": True, "message": "Your course access has expired."}, status=403)
+
+        enrollment = (
+            Enrollment.objects.select_related("course__stats")
+            .filter(student=user, course_id=course_id)
+            .first()
+        )
         if not enrollment:
             return Response({"detail": "Not enrolled in this course"}, status=403)
 
-        # ✅ Count total lessons inside ALL modules of this course
-        total_lessons = Lesson.objects.filter(module__course_id=course_id).count()
+        return Response(progress_summary(enrollment))
 
-        # ✅ Count completed lessons from LessonCompletion model
-        completed_lessons = LessonCompletion.objects.filter(
-            student=user,
-            lesson__module__course_id=course_id
-        ).count()
-
-        # ✅ Daily tasks progress
-        total_tasks = DailyTask.objects.filter(course_id=course_id).count()
-        completed_tasks = TaskSubmission.objects.filter(
-            student=user, task__course_id=course_id, status="approved"
-        ).count()
-        rejected_tasks = TaskSubmission.objects.filter(
-            student=user, task__course_id=course_id, status="rejected"
-        ).count()
-        pending_tasks = total_tasks - (completed_tasks + rejected_tasks)
-
-        # ✅ % Progress calculations
-        lesson_progress = (completed_lessons / total_lessons * 100) if total_lessons else 0
-        task_progress = (completed_tasks / total_tasks * 100) if total_tasks else 0
-
-        # ✅ Overall course progress
-        course_progress = round((lesson_progress + task_progress) / 2, 2)
-
-        # ✅ Update enrollment progress
-        enrollment.progress = course_progress
-        enrollment.save(update_fields=["progress"])
-
-        if enrollment.expires_on and enrollment.expires_on < timezone.now():
-            return Response({"expired": True, "message": "Your course access has expired."}, status=403)
 
-        return Response({
-            "course_progress": course_progress,
-            "lesson_progress": round(lesson_progress, 2),
-            "task_progress": round(task_progress, 2),
-            "completed_lessons": completed_lessons,
-            "total_lessons": total_lessons,
-            "completed_tasks": completed_tasks,
-            "rejected_tasks": rejected_tasks,
-            "pending_tasks": max(pending_tasks, 0),
-            "total_tasks": total_tasks,
-            "expires_on": enrollment.expires_on.isoformat() if enrollment.expires_on else None,
-        })
+class StudentProgressOverviewView(APIView):
+    """
+    Dashboard: progress for every enrollment of the current student in one
+    query (stored counters + course totals), however many courses they have.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        enrollments = (
+            with_access_state(Enrollment.objects.filter(student=request.user))
+            .select_related("course__stats")
+            .order_by("-enrolled_on", "-id")
+        )
+        return Response([
+            {
+                "course_id": enrollment.course_id,
+                "course_title": enrollment.course.title,
+                "expired": enrollment.access_expired,
+                **progress_summary(enrollment),
+            }
+            for enrollment in enrollments
+        ])
 
 
 
@@ -880,18 +1114,21 @@ class LessonDetailView(APIView):
 
     def get(self, request, lesson_id):
         try:
-            lesson = Lesson.objects.get(id=lesson_id)
+            lesson = Lesson.objects.select_related("module").get(id=lesson_id)
         except Lesson.DoesNotExist:
             return Response({"error": "Lesson not found"}, status=404)
-        # Expiry check
+        course_id = lesson_course_id(lesson)
+        # Expiry check (sweeper flag / expires_on, evaluated in the query)
         user = request.user
         if user.is_authenticated and user.role == 'student':
-            enrollment = Enrollment.objects.filter(student=user, course=lesson.module.course).first()
-            if enrollment and enrollment.expires_on and enrollment.expires_on < timezone.now():
+            if Entitlements.for_request(request).state(course_id) == ACCESS_EXPIRED:
                 return Response({"expired": True, "message": "Your course access has expired."}, status=403)
 
-        serializer = LessonSerializer(lesson, context={"request": request})
-        return Response(serializer.data)
+        data = LessonSerializer(lesson, context={"request": request}).data
+        # ✅ previous / next / position from the cached course outline
+        navigation = lesson_navigation(get_course_outline(course_id), lesson.pk) if course_id else None
+        data.update(navigation or dict.fromkeys(NAVIGATION_FIELDS))
+        return Response(data)
 
 
 
@@ -1162,6 +1399,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     serializer_class = NotificationSerializer
     authentication_classes = [JWTAuthentication]  # ✅ explicit
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         return Notification.objects.filter(recipient=self.request.user).order_by('-created_at')
@@ -1187,42 +1425,129 @@ class MarkLessonCompletedView(APIView):
             return Response({"detail": "Lesson not found"}, status=404)
 
         # ✅ Ensure student is enrolled & get the enrollment object first
-        try:
-            enrollment = Enrollment.objects.get(student=user, course=lesson.course)
-        except Enrollment.DoesNotExist:
-            return Response({"detail": "You are not enrolled in this course."}, status=403)
-
-        # ✅ Check expiry AFTER enrollment is defined
-        if enrollment.expires_on and enrollment.expires_on < timezone.now():
+        # (module-only lessons belong to their module's course)
+        course_id = lesson_course_id(lesson)
+        access = Entitlements.for_request(request).state(course_id)
+        if access == ACCESS_EXPIRED:
             return Response({"detail": "Course access expired"}, status=403)
+        if access != ACCESS_ACTIVE:
+            return Response({"detail": "You are not enrolled in this course."}, status=403)
 
-        # ✅ Mark lesson as completed
+        # ✅ Mark lesson as completed (signals bump the enrollment's counters)
         completion, created = LessonCompletion.objects.get_or_create(
             student=user,
             lesson=lesson
         )
 
-        # ✅ Calculate progress
-        total_lessons = Lesson.objects.filter(course=lesson.course).count()
-        completed_lessons = LessonCompletion.objects.filter(
-            student=user,
-            lesson__course=lesson.course
-        ).count()
-
-        progress_percent = (completed_lessons / total_lessons) * 100
-
-        # ✅ Update enrollment progress
-        enrollment.progress = progress_percent
-        enrollment.save()
+        progress = Enrollment.objects.filter(student=user, course_id=course_id).values_list("progress", flat=True).first()
 
         return Response({
             "completed": True,
             "created": created,
-            "progress": progress_percent
+            "progress": float(progress or 0)
         }, status=200)
 
 
 
+class LessonCompletionSyncView(APIView):
+    """
+    Replay of completions queued offline:
+    {"completions": [{"lesson": 12, "completed_at": "..."}, ...]}.
+
+    Accepted lessons are inserted with one bulk INSERT (duplicates ignored)
+    and each affected enrollment is recounted once, instead of one request
+    and recount per lesson. Returns progress per touched course plus the
+    lessons that were refused and why.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = LessonCompletionSyncSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        now = timezone.now()
+
+        # last write per lesson wins; never accept a time in the future
+        completed_at = {}
+        for item in serializer.validated_data["completions"]:
+            completed_at[item["lesson"]] = min(item.get("completed_at") or now, now)
+
+        lesson_courses = {
+            pk: course_id or module_course_id
+            for pk, course_id, module_course_id in Lesson.objects.filter(pk__in=completed_at)
+            .values_list("pk", "course_id", "module__course_id")
+        }
+
+        entitlements = Entitlements.for_request(request)
+        accepted, rejected, course_ids = [], [], set()
+        for lesson_id, when in completed_at.items():
+            course_id = lesson_courses.get(lesson_id)
+            access = entitlements.state(course_id) if course_id else None
+            if access == ACCESS_ACTIVE:
+                accepted.append(LessonCompletion(student=user, lesson_id=lesson_id, completed_at=when))
+                course_ids.add(course_id)
+            else:
+                reason = {None: "not_found", ACCESS_EXPIRED: "expired"}.get(access, "not_enrolled")
+                rejected.append({"lesson": lesson_id, "reason": reason})
+
+        with transaction.atomic():
+            LessonCompletion.objects.bulk_create(accepted, ignore_conflicts=True)
+            recount_completed_lessons(user.pk, course_ids)
+
+        enrollments = (
+            Enrollment.objects.filter(student=user, course_id__in=course_ids)
+            .select_related("course__stats")
+        )
+        return Response({
+            "accepted": len(accepted),  # includes lessons that were already completed
+            "rejected": rejected,
+            "progress": [
+                {"course_id": enrollment.course_id, **progress_summary(enrollment)}
+                for enrollment in enrollments
+            ],
+        })
+
+
+class CourseCompletionMapView(APIView):
+    """
+    Sidebar checkmarks for a whole course in one call (replaces one
+    complete-status request per lesson): the outline's lesson ids plus a
+    bitmap string aligned with them.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, course_id):
+        if not Entitlements.for_request(request).is_enrolled(course_id):
+            return Response({"detail": "Not enrolled in this course"}, status=403)
+
+        lesson_ids, bitmap = completion_bitmap(request.user.pk, course_id)
+        return Response({
+            "course_id": course_id,
+            "lessons": lesson_ids,
+            "completed": bitmap,
+            "completed_count": bitmap.count("1"),
+        })
+
+
+class CertificateVerifyView(APIView):
+    """
+    Public lookup behind the QR code on every certificate PDF. Cached per
+    certificate id (unknown ids briefly too), so scans never hit the DB twice.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request, certificate_id):
+        record = get_certificate_verification(certificate_id)
+        if record is None:
+            return Response({"valid": False, "error": "Certificate not found"}, status=404)
+
+        data = {"valid": True, **record}
+        if data["pdf"]:
+            data["pdf"] = request.build_absolute_uri(data["pdf"])
+        return Response(data)
+
+
 class LessonCompletionStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -1240,20 +1565,16 @@ class InstructorDashboardView(APIView):
         if user.role != "instructor":
             return Response({"detail": "Not authorized"}, status=403)
 
-        # ✅ Fetch courses assigned to instructor
-        courses = Course.objects.filter(instructor=user)
-        total_courses = courses.count()
-
-        # ✅ Count total students across all allocated courses
-        total_students = Enrollment.objects.filter(course__instructor=user).count()
-
-        # ✅ Average rating across all instructor’s courses
-        avg_rating = (
-            Feedback.objects.filter(course__instructor=user).aggregate(Avg("rating"))["rating__avg"] or 0
-        )
+        # ✅ Fetch courses assigned to instructor, with their counters (one query)
+        courses = list(Course.objects.filter(instructor=user).select_related("stats"))
+        stats = {c.id: get_stats(c) for c in courses}
+        total_courses = len(courses)
 
-        # ✅ Feedback count (number of reviews)
-        feedback_count = Feedback.objects.filter(course__instructor=user).count()
+        # ✅ Totals come from the CourseStats counters, not aggregates
+        total_students = sum(s.enrollment_count for s in stats.values())
+        feedback_count = sum(s.review_count for s in stats.values())
+        rating_sum = sum(s.rating_sum for s in stats.values())
+        avg_rating = rating_sum / feedback_count if feedback_count else 0
 
         # ✅ Course details
         course_data = [
@@ -1262,7 +1583,7 @@ class InstructorDashboardView(APIView):
                 "title": c.title,
                 "description": c.description,
                 "image": c.image.url if c.image else "",
-                "enrolled_students": Enrollment.objects.filter(course=c).count(),
+                "enrolled_students": stats[c.id].enrollment_count,
             }
             for c in courses
         ]